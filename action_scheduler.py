@@ -0,0 +1,86 @@
+import time
+import itertools
+from collections import deque
+
+from trade import open_trade, partial_close_trade, modify_trade
+
+# Action priorities: lower is sent first
+PRIORITY_CLOSE = 0
+PRIORITY_MODIFY = 1
+PRIORITY_OPEN = 2
+
+
+class ActionScheduler:
+    """
+    Collects the trade actions decided during one cycle and sends them together with flush().
+    All SL/TP changes queued for the same order are merged into a single modification, a close
+    cancels any modification of the same order, and actions go out closes first, then
+    modifications, then new orders. Pacing is left to the client's rate limiter; the round-trip
+    of every action (including time spent waiting for a token) is kept in `latencies`.
+    """
+
+    def __init__(self, history=1000):
+        self._actions = {}  # (kind, key) -> action
+        self._seq = itertools.count()
+        self.latencies = deque(maxlen=history)  # (kind, order, seconds, throttle seconds, status)
+
+    def __len__(self):
+        return len(self._actions)
+
+    def close(self, symbol, order_id, close_volume, cmd):
+        self._actions.pop(('modify', order_id), None)
+        self._actions[('close', order_id)] = {
+            'priority': PRIORITY_CLOSE, 'kind': 'close', 'order': order_id,
+            'symbol': symbol, 'volume': close_volume, 'cmd': cmd
+        }
+
+    def modify(self, order_id, symbol, volume, current_sl, current_tp, sl=None, tp=None):
+        """
+        Queue a change of SL and/or TP. Fields left as None keep the value of an earlier change
+        queued this cycle, or current_sl/current_tp when there is none.
+        """
+        if ('close', order_id) in self._actions:
+            return
+        action = self._actions.setdefault(('modify', order_id), {
+            'priority': PRIORITY_MODIFY, 'kind': 'modify', 'order': order_id,
+            'symbol': symbol, 'volume': volume, 'sl': current_sl, 'tp': current_tp
+        })
+        if sl is not None:
+            action['sl'] = sl
+        if tp is not None:
+            action['tp'] = tp
+
+    def open(self, symbol, volume, price, latest_close, offset, tp_value, sl_value, order_type='market'):
+        self._actions[('open', next(self._seq))] = {
+            'priority': PRIORITY_OPEN, 'kind': 'open', 'order': None, 'symbol': symbol,
+            'args': (volume, price, latest_close, offset, tp_value, sl_value, order_type)
+        }
+
+    def _send(self, client, action):
+        if action['kind'] == 'close':
+            return partial_close_trade(client, action['symbol'], action['order'], action['volume'], action['cmd'])
+        if action['kind'] == 'modify':
+            return modify_trade(client, action['order'], 0, action['sl'], action['tp'], action['volume'], action['symbol'])
+        return open_trade(client, action['symbol'], *action['args'])['response']
+
+    def take(self):
+        """Remove and return every queued action, in the order they are to be sent."""
+        # sorted() is stable, so actions of equal priority keep the order they were queued in
+        actions = sorted(self._actions.values(), key=lambda action: action['priority'])
+        self._actions = {}
+        return actions
+
+    def send(self, client, action):
+        """Send one action taken from take() and record its latency. Returns the response."""
+        start = time.perf_counter()
+        response = self._send(client, action)
+        latency = time.perf_counter() - start
+        status = bool(response and response.get('status'))
+        self.latencies.append((action['kind'], action['order'], latency, getattr(client, 'lastThrottle', 0.0), status))
+        print(f"{action['kind'].capitalize()} {action['order'] or action['symbol']}: "
+              f"{'ok' if status else 'failed'} in {latency * 1000:.0f} ms. Response: {response}")
+        return response
+
+    def flush(self, client):
+        """Send every queued action in priority order. Returns a list of (action, response)."""
+        return [(action, self.send(client, action)) for action in self.take()]
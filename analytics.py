@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+TRADING_DAYS_PER_YEAR = 252
+# Resampled profits processed per chunk by monte_carlo_drawdowns; the chunk buffers are reused, so
+# this bounds memory and keeps each pass over a chunk in cache
+MONTE_CARLO_CHUNK_ELEMENTS = 1 << 20
+
+
+def trade_arrays(trade_history):
+    """
+    Closed trades of a backtest as arrays, ordered by close time: open_ms, close_ms, profit,
+    is_long and hour (UTC hour of the open time, like the UTC days of daily_pnl).
+    """
+    trades = [trade for trade in trade_history if trade['status'] == 'closed']
+    arrays = {
+        'open_ms': np.array([trade['open_ms'] for trade in trades], dtype=np.int64),
+        'close_ms': np.array([trade['close_ms'] for trade in trades], dtype=np.int64),
+        'profit': np.array([trade['profit'] for trade in trades], dtype=float),
+        'is_long': np.array([trade['type'] == 'long' for trade in trades], dtype=bool),
+    }
+    arrays['hour'] = arrays['open_ms'] // HOUR_MS % 24
+    order = np.argsort(arrays['close_ms'], kind='stable')
+    return {name: values[order] for name, values in arrays.items()}
+
+
+def equity_curve(profits, initial=0.0):
+    """Equity after each trade, starting from `initial`."""
+    return initial + np.cumsum(np.asarray(profits, dtype=float))
+
+
+def drawdowns(equity, initial=0.0):
+    """Distance below the running equity peak after each trade; the starting equity counts as a peak."""
+    equity = np.asarray(equity, dtype=float)
+    peaks = np.maximum.accumulate(np.concatenate(([initial], equity)))[1:]
+    return peaks - equity
+
+
+def max_drawdown(profits):
+    """Largest peak-to-trough fall of the cumulative equity of `profits`."""
+    if len(profits) == 0:
+        return 0.0
+    return float(drawdowns(equity_curve(profits)).max())
+
+
+def daily_pnl(close_ms, profits):
+    """
+    Profit per trading day (UTC) from the first to the last close. Weekdays without trades count as
+    zero; weekend days are left out unless a trade closed on them, so the series matches the
+    TRADING_DAYS_PER_YEAR annualization of sharpe_ratio and sortino_ratio.
+    """
+    close_ms = np.asarray(close_ms, dtype=np.int64)
+    if len(close_ms) == 0:
+        return np.array([])
+    days = close_ms // DAY_MS
+    offsets = days - days.min()
+    pnl = np.bincount(offsets, weights=profits)
+    # 1970-01-01, day 0 of the epoch, was a Thursday (weekday 3 counting from Monday)
+    weekday = (days.min() + np.arange(len(pnl)) + 3) % 7 < 5
+    return pnl[weekday | (np.bincount(offsets) > 0)]
+
+
+def sharpe_ratio(returns, periods_per_year=TRADING_DAYS_PER_YEAR):
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) < 2:
+        return 0.0
+    std = returns.std(ddof=1)
+    return float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0
+
+
+def sortino_ratio(returns, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """Like sharpe_ratio, but only returns below zero count as risk (downside deviation)."""
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) < 2:
+        return 0.0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    return float(returns.mean() / downside * np.sqrt(periods_per_year)) if downside > 0 else 0.0
+
+
+def exposure(open_ms, close_ms, start_ms=None, end_ms=None):
+    """
+    Fraction of [start_ms, end_ms] with at least one trade open. Overlapping trades are merged, so
+    the result is at most 1. The span defaults to the first open and the last close.
+    """
+    open_ms = np.asarray(open_ms, dtype=np.int64)
+    close_ms = np.asarray(close_ms, dtype=np.int64)
+    if len(open_ms) == 0:
+        return 0.0
+    start_ms = int(open_ms.min()) if start_ms is None else start_ms
+    end_ms = int(close_ms.max()) if end_ms is None else end_ms
+    if end_ms <= start_ms:
+        return 0.0
+    order = np.argsort(open_ms, kind='stable')
+    starts = np.clip(open_ms[order], start_ms, end_ms)
+    ends = np.maximum.accumulate(np.clip(close_ms[order], start_ms, end_ms))
+    # A trade starts a new merged interval when it opens after every earlier trade has closed
+    new = np.concatenate(([True], starts[1:] > ends[:-1]))
+    first = np.flatnonzero(new)
+    last = np.concatenate((first[1:], [len(starts)])) - 1
+    return float((ends[last] - starts[first]).sum() / (end_ms - start_ms))
+
+
+def hourly_stats(hours, profits):
+    """Trades, total and mean profit and win rate by hour of the day (UTC) the trade was opened."""
+    hours = np.asarray(hours, dtype=np.int64)
+    profits = np.asarray(profits, dtype=float)
+    trades = np.bincount(hours, minlength=24)
+    total = np.bincount(hours, weights=profits, minlength=24)
+    wins = np.bincount(hours, weights=profits > 0, minlength=24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table = pd.DataFrame({
+            'trades': trades,
+            'profit': total,
+            'mean_profit': total / trades,
+            'win_rate': wins / trades,
+        })
+    table.index.name = 'hour'
+    return table[table['trades'] > 0]
+
+
+def monte_carlo_drawdowns(profits, resamples=100_000, replace=True, seed=None):
+    """
+    Max drawdown of `resamples` reorderings of the trade sequence: bootstrap draws with replacement,
+    or random permutations with replace=False. Each chunk of resamples is a 2-D array whose rows are
+    accumulated into equity and running peaks with ufuncs, so no Python loop runs per resample.
+    """
+    profits = np.asarray(profits, dtype=float)
+    n = len(profits)
+    result = np.zeros(resamples)
+    if n == 0:
+        return result
+    rng = np.random.default_rng(seed)
+    rows = min(resamples, max(1, MONTE_CARLO_CHUNK_ELEMENTS // n))
+    equity = np.empty((rows, n))
+    peaks = np.empty((rows, n))
+    for start in range(0, resamples, rows):
+        count = min(rows, resamples - start)
+        sample, peak = equity[:count], peaks[:count]
+        if replace:
+            np.take(profits, rng.integers(0, n, size=(count, n)), out=sample)
+        else:
+            sample[:] = profits
+            rng.permuted(sample, axis=1, out=sample)
+        np.cumsum(sample, axis=1, out=sample)
+        np.maximum.accumulate(sample, axis=1, out=peak)
+        # The starting equity of 0 is the first peak
+        np.maximum(peak, 0.0, out=peak)
+        np.subtract(peak, sample, out=peak)
+        peak.max(axis=1, out=result[start:start + count])
+    return result
+
+
+def drawdown_confidence(drawdowns, levels=(0.5, 0.9, 0.95, 0.99)):
+    """{level: max drawdown not exceeded in that fraction of the resamples}."""
+    return dict(zip(levels, np.quantile(drawdowns, levels).tolist()))
+
+
+def analyze(trade_history, start_ms=None, end_ms=None):
+    """Summary statistics of a backtest's trade_history; start_ms/end_ms bound the exposure span."""
+    trades = trade_arrays(trade_history)
+    profits = trades['profit']
+    wins = profits[profits > 0]
+    losses = profits[profits <= 0]
+    daily = daily_pnl(trades['close_ms'], profits)
+    gross_loss = -losses.sum()
+    return {
+        'total_profit': float(profits.sum()),
+        'num_trades': len(profits),
+        'win_trades': len(wins),
+        'loss_trades': len(losses),
+        'win_rate': len(wins) / len(profits) if len(profits) else 0,
+        'max_drawdown': max_drawdown(profits),
+        'profit_factor': float(wins.sum() / gross_loss) if gross_loss > 0 else float('inf') if len(wins) else 0.0,
+        'avg_win': float(wins.mean()) if len(wins) else 0.0,
+        'avg_loss': float(losses.mean()) if len(losses) else 0.0,
+        'sharpe': sharpe_ratio(daily),
+        'sortino': sortino_ratio(daily),
+        'exposure': exposure(trades['open_ms'], trades['close_ms'], start_ms, end_ms),
+        'long_profit': float(profits[trades['is_long']].sum()),
+        'short_profit': float(profits[~trades['is_long']].sum()),
+    }
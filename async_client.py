@@ -0,0 +1,121 @@
+import asyncio
+import itertools
+import json
+import ssl
+import time
+
+from journal import ASYNC_REQUEST, ASYNC_RESPONSE
+from metrics import REQUEST_SECONDS, REQUEST_THROTTLE_SECONDS, REQUEST_ERRORS
+from xAPIConnector import (DEFAULT_XAPI_ADDRESS, DEFAULT_XAPI_PORT, API_MESSAGE_TERMINATOR, TokenBucket,
+                           baseCommand, logger)
+
+# StreamReader buffer limit; chart replies can be several MB
+READ_LIMIT = 64 * 1024 * 1024
+
+
+class AsyncAPIClient(object):
+    """
+    asyncio counterpart of APIClient. Every request gets a unique customTag, which xAPI echoes back,
+    so several requests can be in flight on one connection and each reply resolves the coroutine
+    that sent it. Requests still pass through a TokenBucket, shared with other clients if given.
+    """
+
+    def __init__(self, address=DEFAULT_XAPI_ADDRESS, port=DEFAULT_XAPI_PORT, encrypt=True, rateLimiter=None, journal=None):
+        self.address = address
+        self.port = port
+        self.encrypt = encrypt
+        self.rateLimiter = rateLimiter if rateLimiter is not None else TokenBucket()
+        self._tags = itertools.count(1)
+        self._pending = {}
+        self._reader = None
+        self._writer = None
+        self._readTask = None
+        self._sendLock = None
+        self.journal = journal
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.encrypt else None
+        self._reader, self._writer = await asyncio.open_connection(self.address, self.port, ssl=context, limit=READ_LIMIT)
+        self._sendLock = asyncio.Lock()
+        self._readTask = asyncio.ensure_future(self._readLoop())
+        logger.info("Async socket connected")
+        return self
+
+    async def _readLoop(self):
+        try:
+            while True:
+                frame = await self._reader.readuntil(API_MESSAGE_TERMINATOR)
+                frame = frame[:-len(API_MESSAGE_TERMINATOR)].strip()
+                if not frame:
+                    continue
+                if self.journal is not None:
+                    self.journal.record(ASYNC_RESPONSE, frame)
+                resp = json.loads(frame.decode('utf-8'))
+                logger.info('Received: ' + str(resp))
+                future = self._pending.pop(resp.get('customTag'), None)
+                if future is None and self._pending:
+                    # Untagged reply (should not happen): xAPI answers in order, so it belongs to the oldest request
+                    future = self._pending.pop(next(iter(self._pending)))
+                if future is not None and not future.done():
+                    future.set_result(resp)
+        except Exception as e:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("socket connection broken: %s" % e))
+            self._pending.clear()
+
+    @property
+    def connected(self):
+        # The read loop ends when the connection breaks
+        return self._readTask is not None and not self._readTask.done()
+
+    async def execute(self, dictionary):
+        if not self.connected:
+            raise ConnectionError("socket connection broken")
+        command = dictionary.get('command')
+        tag = str(next(self._tags))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tag] = future
+        tagged = dict(dictionary, customTag=tag)
+        msg = json.dumps(tagged).encode('utf-8')
+        if self.journal is not None:
+            # Recorded with the tag, so a replay can pair each reply with its request
+            self.journal.record_sent(ASYNC_REQUEST, tagged, msg)
+        try:
+            # The lock keeps tokens and bytes on the wire in the same order
+            async with self._sendLock:
+                wait = self.rateLimiter.reserve()
+                REQUEST_THROTTLE_SECONDS.observe(wait, command)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                # Started after the rate limiter, like APIClient.execute
+                start = time.perf_counter()
+                self._writer.write(msg)
+                await self._writer.drain()
+            logger.info('Sent: ' + str(msg))
+            resp = await future
+        except Exception as e:
+            REQUEST_ERRORS.inc(command, type(e).__name__)
+            raise
+        finally:
+            # The read loop pops answered tags; this drops the ones a failed send or a cancelled
+            # caller leaves behind
+            self._pending.pop(tag, None)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, command)
+        if not resp.get('status', True):
+            REQUEST_ERRORS.inc(command, resp.get('errorCode'))
+        return resp
+
+    async def commandExecute(self, commandName, arguments=None):
+        return await self.execute(baseCommand(commandName, arguments))
+
+    async def disconnect(self):
+        if self._readTask is not None:
+            self._readTask.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+
@@ -4,16 +4,24 @@ import os
 import math
 import traceback
 import pandas as pd
+import numpy as np
 
-from fetch_data import get_last_period_prices, get_current_positions, seconds_until_next_minute, get_historical_data
-from file_ops import write_to_csv
-from indicators import calculate_macd, calculate_atr, calculate_rsi, calculate_vwap, calculate_sma
+from fetch_data import get_last_period_prices, get_current_positions, seconds_until_next_minute, get_historical_bars
+from file_ops import write_to_csv, get_log_writer
+from indicators import calculate_macd, calculate_atr, calculate_rsi, calculate_vwap, calculate_sma, \
+    calculate_macd_series, calculate_rsi_series, calculate_vwap_series, calculate_sma_series
 from login import login_to_xtb
 from trade import open_trade, close_all_trades, close_trade
+from fill_engine import SimulatedClock, FillEngine
+from analytics import analyze, trade_arrays, max_drawdown, hourly_stats, monte_carlo_drawdowns, drawdown_confidence
 from datetime import datetime, timedelta
 
+# Pending orders are dropped when not filled within this many seconds of being placed
+PENDING_ORDER_EXPIRY = 300
+
+
 class TradingBot:
-    def __init__(self, client, symbol, crossover_threshold=0.1, atr_threshold=1, profit_threshold=15, second_profit_threshold=40, loss_threshold=-20, trailing_multiplier=2.0, volume=0.01, leverage=20, point_value=22.27):
+    def __init__(self, client, symbol, crossover_threshold=0.1, atr_threshold=1, profit_threshold=15, second_profit_threshold=40, loss_threshold=-20, trailing_multiplier=2.0, volume=0.01, leverage=20, point_value=22.27, histogram_delta=0.01, tp_atr_multiple=1.0, sl_atr_multiple=2.0, clock=None):
         self.volume = volume
         self.client = client
         self.retry_attempts = 3
@@ -25,16 +33,28 @@ class TradingBot:
         self.second_profit_threshold = second_profit_threshold
         self.loss_threshold = loss_threshold
         self.trailing_multiplier = trailing_multiplier
+        self.histogram_delta = histogram_delta
+        self.tp_atr_multiple = tp_atr_multiple
+        self.sl_atr_multiple = sl_atr_multiple
         self.prev_histogram = None
         self.trade_just_opened = False
         self.last_trade_action = 'None'
-        self.data_log = pd.DataFrame()
+        # Rows are buffered and written by a background thread; nothing is created until the first row
+        self.data_log = get_log_writer(os.path.join('logs', f'backtest_log_{symbol}.csv'))
         self.open_trades = []
         self.pending_orders = []
         self.trade_history = []
+        # Order times and expiry follow bar time; run_backtest moves the clock to each bar
+        self.clock = clock if clock is not None else SimulatedClock()
+        self.bar_index = 0
+        # First and last bar time (ms) of the last run_backtest, the span exposure is measured over
+        self.backtest_span = (None, None)
         self.leverage = leverage
         self.point_value = point_value
-        self.prices, self.latest_open, self.latest_close, self.highs, self.lows, self.volume_data, self.positions = self.fetch_and_prepare_data()
+        # Without a client (e.g. sweep workers) the bot only runs run_backtest on bars it is given
+        self.positions = None
+        if client is not None:
+            self.prices, self.latest_open, self.latest_close, self.highs, self.lows, self.volume_data, self.positions = self.fetch_and_prepare_data()
 
     def fetch_and_prepare_data(self):
         # Fetch 1-minute data
@@ -74,11 +94,11 @@ class TradingBot:
         volume = self.volume
         atr_value = self.atr_value
 
-        tp_value = (entry_price + 1.0 * atr_value + 0.5) if position_type == 'long' else (entry_price - 1.0 * atr_value - 0.5)
-        sl_value = (entry_price - 2.0 * atr_value) if position_type == 'long' else (entry_price + 2.0 * atr_value)
+        tp_value = (entry_price + self.tp_atr_multiple * atr_value + 0.5) if position_type == 'long' else (entry_price - self.tp_atr_multiple * atr_value - 0.5)
+        sl_value = (entry_price - self.sl_atr_multiple * atr_value) if position_type == 'long' else (entry_price + self.sl_atr_multiple * atr_value)
         trade_direction = volume if position_type == 'long' else -volume
 
-        current_time = datetime.now()
+        current_time = self.clock.now()
 
         if order_type == 'market':
             self.open_trades.append({
@@ -88,7 +108,10 @@ class TradingBot:
                 'sl': sl_value,
                 'volume': volume,
                 'open_time': current_time,
-                'status': 'open'
+                'open_ms': self.clock_ms(),
+                'status': 'open',
+                'bar': self.bar_index,
+                'placed_bar': self.bar_index
             })
             print(f"Simulated {position_type} position opened at {entry_price}, TP: {tp_value}, SL: {sl_value}")
         elif order_type == 'pending':
@@ -99,17 +122,24 @@ class TradingBot:
                 'sl': sl_value,
                 'volume': volume,
                 'status': 'pending',
-                'order_time': current_time
+                'order_time': current_time,
+                'bar': self.bar_index,
+                'placed_bar': self.bar_index
             })
             print(f"Simulated pending {position_type} order set at {entry_price}, TP: {tp_value}, SL: {sl_value}")
 
+    def clock_ms(self):
+        # Epoch ms straight from a SimulatedClock; converting now() back would go through local time
+        ms = getattr(self.clock, 'ms', None)
+        return ms if ms is not None else int(self.clock.now().timestamp() * 1000)
+
     def check_pending_orders(self):
-        current_time = datetime.now()
+        current_time = self.clock.now()
         new_pending_orders = []
 
         for order in self.pending_orders:
             # Check if order is older than 5 minutes
-            if (current_time - order['order_time']).total_seconds() > 300:
+            if (current_time - order['order_time']).total_seconds() > PENDING_ORDER_EXPIRY:
                 print(f"Pending {order['type']} order at {order['entry_price']} expired.")
                 continue  # Skip adding this order to new_pending_orders
 
@@ -118,6 +148,8 @@ class TradingBot:
                    (order['type'] == 'short' and self.latest_high >= order['entry_price'] >= self.latest_low):
                     order['status'] = 'open'
                     order['open_time'] = current_time
+                    order['open_ms'] = self.clock_ms()
+                    order['bar'] = self.bar_index
                     order['entry_price'] = self.latest_close
                     self.open_trades.append(order)
                     print(f"Pending {order['type']} order triggered at {self.latest_close}")
@@ -126,6 +158,14 @@ class TradingBot:
 
         self.pending_orders = new_pending_orders
 
+    def mark_to_market(self, close_price):
+        """Close every trade still open at close_price and the clock's time, e.g. at the end of a test segment."""
+        for trade in self.open_trades:
+            if trade['status'] == 'open':
+                trade['marked_to_market'] = True
+                self.close_position(trade, close_price)
+        self.open_trades = []
+
     def update_trailing_stop(self, trade):
         atr_value = self.atr_value  # Use the current ATR value for trailing stop adjustment
         if trade['type'] == 'long':
@@ -141,7 +181,8 @@ class TradingBot:
 
         trade['status'] = 'closed'
         trade['close_price'] = close_price
-        trade['close_time'] = datetime.now()
+        trade['close_time'] = self.clock.now()
+        trade['close_ms'] = self.clock_ms()
 
         if trade['type'] == 'long':
             trade['profit'] = (close_price - trade['entry_price']) * trade['volume'] * self.point_value * self.leverage
@@ -173,64 +214,189 @@ class TradingBot:
             'Short Profits': self.positions['short_profits'],
             'Trade Executed': self.last_trade_action
         }
-        new_entry = pd.DataFrame([data])
-        self.data_log = pd.concat([self.data_log, new_entry], ignore_index=True)
-        if len(self.data_log) % 5 == 0:
-            self.data_log.to_csv('C:/Users/Asus/OneDrive/Pulpit/Rozne/Python/XTB/_script/excel/trading_log.csv',
-                                 index=False)
-            print("Data log saved to Excel.")
+        self.data_log.write(data)
+
+    def prepare_indicator_series(self, close_prices, high_prices, low_prices, volume):
+        """
+        Compute every indicator once over the full history, so the bar loop only has to read index i.
+        All indicators are causal, so series[i] equals the value computed on the prefix [:i + 1].
+        """
+        macd, signal, histogram = calculate_macd_series(close_prices)
+        return {
+            'macd': macd.to_numpy(),
+            'signal': signal.to_numpy(),
+            'histogram': histogram.to_numpy(),
+            'atr': calculate_atr(high_prices, low_prices, close_prices).to_numpy(),
+            'sma': calculate_sma_series(close_prices, period=20),
+            'rsi': calculate_rsi_series(close_prices, window=15).to_numpy(),
+            'vwap': calculate_vwap_series(close_prices, volume),
+        }
+
+    def recompute_indicators(self):
+        macd, signal, histogram = calculate_macd(self.prices)
+        atr_value = calculate_atr(self.highs, self.lows, self.prices).iloc[-1]
+        sma = calculate_sma(self.prices, period=20)
+        price_df = pd.DataFrame(self.prices, columns=['close'])
+        rsi = calculate_rsi(price_df, window=15)
+        vwap = calculate_vwap(self.prices, self.volume_data)
+
+        self.macd = macd
+        self.signal = signal
+        self.histogram = histogram
+        self.atr_value = atr_value
+        self.sma = sma
+        self.rsi = rsi
+        self.vwap = vwap
 
-    def backtest(self, start, end, period=1):
-        close_prices, open_prices, high_prices, low_prices, volume = get_historical_data(self.client, self.symbol, period, start, end)
+    def load_precomputed_indicators(self, indicators, i):
+        self.macd = indicators['macd'][i]
+        self.signal = indicators['signal'][i]
+        self.histogram = indicators['histogram'][i]
+        self.atr_value = indicators['atr'][i]
+        self.sma = None if np.isnan(indicators['sma'][i]) else indicators['sma'][i]
+        self.rsi = indicators['rsi'][i]
+        self.vwap = indicators['vwap'][i]
+
+    def backtest(self, start, end, period=1, vectorized=True, store=None, monte_carlo=0):
+        # With a BarStore only the missing ranges are requested and the columns come back as array views
+        if store is not None:
+            bars = store.get_range(self.client, self.symbol, period, start, end)
+        else:
+            bars = get_historical_bars(self.client, self.symbol, period, start, end)
 
-        if not close_prices:
+        if bars is None or len(bars['close']) == 0:
             print("No historical data retrieved.")
             return
 
         print(f"Backtesting from {datetime.fromtimestamp(start / 1000)} to {datetime.fromtimestamp(end / 1000)}")
 
+        return self.run_backtest(bars['close'], bars['open'], bars['high'], bars['low'], bars['vol'], vectorized,
+                                 timestamps=bars['ctm'], monte_carlo=monte_carlo)
+
+    def run_backtest(self, close_prices, open_prices, high_prices, low_prices, volume, vectorized=True,
+                     timestamps=None, fill_engine=True, monte_carlo=0):
+        """
+        Replay the strategy over the given bars. timestamps (bar open times in ms) drive the clock used
+        for order times and pending-order expiry; without them bars are taken to be one minute apart.
+        vectorized=False keeps the original per-bar recomputation, which is O(n^2) over the history.
+        With vectorized=True and fill_engine=True, fills, TP/SL exits and expiries are resolved by a
+        FillEngine after the signal pass instead of being checked bar by bar.
+        monte_carlo is passed on to output_backtest_results.
+        """
+        if timestamps is None:
+            timestamps = np.arange(len(close_prices), dtype=np.int64) * 60000
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        use_engine = vectorized and fill_engine
+        if vectorized:
+            close_arr = np.asarray(close_prices, dtype=float)
+            high_arr = np.asarray(high_prices, dtype=float)
+            low_arr = np.asarray(low_prices, dtype=float)
+            volume_arr = np.asarray(volume, dtype=float)
+            indicators = self.prepare_indicator_series(close_arr, high_arr, low_arr, volume_arr)
+        timestamp_list = timestamps.tolist()
+        if timestamp_list:
+            self.backtest_span = (timestamp_list[0], timestamp_list[-1])
+
         for i in range(len(close_prices)):
+            self.bar_index = i
+            self.clock.set_ms(timestamp_list[i])
             self.latest_close = close_prices[i]
             self.latest_open = open_prices[i]
             self.latest_high = high_prices[i]
             self.latest_low = low_prices[i]
-            self.highs = high_prices[:i + 1]
-            self.lows = low_prices[:i + 1]
-            self.volume_data = volume[:i + 1]
-            self.prices = close_prices[:i + 1]
-
-            macd, signal, histogram = calculate_macd(self.prices)
-            atr_value = calculate_atr(self.highs, self.lows, self.prices)
-            sma = calculate_sma(self.prices, period=20)
-            price_df = pd.DataFrame(self.prices, columns=['close'])
-            rsi = calculate_rsi(price_df, window=15)
-            vwap = calculate_vwap(self.prices, self.volume_data)
-
-            self.macd = macd
-            self.signal = signal
-            self.histogram = histogram
-            self.atr_value = atr_value
-            self.sma = sma
-            self.rsi = rsi
-            self.vwap = vwap
-
-            self.check_pending_orders()
 
-            self.simulate_trading_logic(i)
-
-        self.output_backtest_results()
+            if vectorized:
+                # Views, not copies
+                self.highs = high_arr[:i + 1]
+                self.lows = low_arr[:i + 1]
+                self.volume_data = volume_arr[:i + 1]
+                self.prices = close_arr[:i + 1]
+                self.load_precomputed_indicators(indicators, i)
+            else:
+                self.highs = high_prices[:i + 1]
+                self.lows = low_prices[:i + 1]
+                self.volume_data = volume[:i + 1]
+                self.prices = close_prices[:i + 1]
+                self.recompute_indicators()
+
+            if use_engine:
+                self.simulate_signals(i)
+            else:
+                self.check_pending_orders()
+                self.simulate_trading_logic(i)
+
+        if use_engine:
+            self.resolve_fills(FillEngine(high_arr, low_arr, close_arr, indicators['atr'], timestamps,
+                                          self.trailing_multiplier, PENDING_ORDER_EXPIRY * 1000))
+
+        return self.output_backtest_results(monte_carlo)
+
+    def resolve_fills(self, engine):
+        """
+        Play every order placed during the signal pass through its whole life at once: trigger,
+        trailing stop and exit. trade_history ends up in the order the bar-by-bar loop would produce.
+        """
+        closes = engine.closes.tolist()
+        timestamps = engine.timestamps.tolist()
+        # Market orders are already open; pending ones open on their trigger bar. Within a bar the loop
+        # appends triggered orders before orders opened at market, hence the sequence numbers.
+        opened = [(trade['bar'], seq, trade) for seq, trade in enumerate(self.open_trades, len(self.pending_orders))]
+        still_pending = []
+        if self.pending_orders:
+            bars, expired = engine.trigger_bars([order['entry_price'] for order in self.pending_orders],
+                                                [order['bar'] for order in self.pending_orders])
+            for seq, (order, bar, is_expired) in enumerate(zip(self.pending_orders, bars.tolist(), expired.tolist())):
+                if bar < 0:
+                    if is_expired:
+                        print(f"Pending {order['type']} order at {order['entry_price']} expired.")
+                    else:
+                        still_pending.append(order)
+                    continue
+                self.clock.set_ms(timestamps[bar])
+                order['status'] = 'open'
+                order['open_time'] = self.clock.now()
+                order['open_ms'] = self.clock_ms()
+                order['bar'] = bar
+                order['entry_price'] = closes[bar]
+                print(f"Pending {order['type']} order triggered at {closes[bar]}")
+                opened.append((bar, seq, order))
+
+        still_open = []
+        if opened:
+            opened.sort(key=lambda item: (item[0], item[1]))
+            trades = [trade for _, _, trade in opened]
+            exits, stops = engine.exit_bars([trade['type'] == 'long' for trade in trades], [trade['tp'] for trade in trades],
+                                            [trade['sl'] for trade in trades], [bar for bar, _, _ in opened])
+            closed = []
+            # Trades opened earlier (or earlier in the list on the same bar) come first within an exit bar
+            for position, (trade, exit_bar, stop) in enumerate(zip(trades, exits.tolist(), stops.tolist())):
+                trade['sl'] = stop
+                if exit_bar < 0:
+                    still_open.append(trade)
+                else:
+                    closed.append((exit_bar, position, trade))
+            for exit_bar, _, trade in sorted(closed, key=lambda item: item[:2]):
+                self.clock.set_ms(timestamps[exit_bar])
+                self.close_position(trade, closes[exit_bar])
+        self.pending_orders = still_pending
+        self.open_trades = still_open
 
     def simulate_trading_logic(self, index):
-        if self.atr_value > 1:
+        self.simulate_signals(index)
+        self.manage_open_trades()
+
+    def simulate_signals(self, index):
+        if self.atr_value > self.atr_threshold:
             if self.prev_histogram is not None:
-                if self.histogram > (self.prev_histogram + 0.01):
+                if self.histogram > (self.prev_histogram + self.histogram_delta):
                     print(f"Simulated long trade at {self.latest_close} on bar {index}")
                     self.open_position('long', 'pending', self.latest_close + 1 * self.atr_value)
-                elif self.histogram < (self.prev_histogram - 0.01):
+                elif self.histogram < (self.prev_histogram - self.histogram_delta):
                     print(f"Simulated short trade at {self.latest_close} on bar {index}")
                     self.open_position('short', 'pending', self.latest_close - 1 * self.atr_value)
             self.prev_histogram = self.histogram
 
+    def manage_open_trades(self):
         for trade in self.open_trades:
             if trade['status'] == 'open':
                 self.update_trailing_stop(trade)
@@ -241,35 +407,46 @@ class TradingBot:
                     if self.latest_low <= trade['tp'] or self.latest_high >= trade['sl']:
                         self.close_position(trade, self.latest_close)
 
-    def output_backtest_results(self):
-        total_profit = sum(trade['profit'] for trade in self.trade_history)
-        num_trades = len(self.trade_history)
-        win_trades = sum(1 for trade in self.trade_history if trade['profit'] > 0)
-        loss_trades = sum(1 for trade in self.trade_history if trade['profit'] <= 0)
-        win_rate = win_trades / num_trades if num_trades > 0 else 0
-        max_drawdown = self.calculate_max_drawdown()
+        # Closed trades already live in trade_history; dropping them keeps the per-bar loop short
+        self.open_trades = [trade for trade in self.open_trades if trade['status'] == 'open']
 
-        print(f"Backtesting complete. Results:")
-        print(f"Total Profit: {total_profit}")
-        print(f"Number of Trades: {num_trades}")
-        print(f"Winning Trades: {win_trades}")
-        print(f"Losing Trades: {loss_trades}")
-        print(f"Win Rate: {win_rate:.2%}")
-        print(f"Max Drawdown: {max_drawdown}")
+    def backtest_results(self):
+        return analyze(self.trade_history, *self.backtest_span)
 
-    def calculate_max_drawdown(self):
-        peak = -float('inf')
-        trough = float('inf')
-        max_drawdown = 0
+    def output_backtest_results(self, monte_carlo=0):
+        """
+        Print and return backtest_results(). With monte_carlo=N the trade sequence is also resampled N
+        times and the drawdown quantiles are added as 'drawdown_confidence'.
+        """
+        results = self.backtest_results()
 
-        for trade in self.trade_history:
-            if trade['status'] == 'closed':
-                peak = max(peak, trade['profit'])
-                trough = min(trough, trade['profit'])
-                drawdown = peak - trough
-                max_drawdown = max(max_drawdown, drawdown)
+        print(f"Backtesting complete. Results:")
+        print(f"Total Profit: {results['total_profit']}")
+        print(f"Number of Trades: {results['num_trades']}")
+        print(f"Winning Trades: {results['win_trades']}")
+        print(f"Losing Trades: {results['loss_trades']}")
+        print(f"Win Rate: {results['win_rate']:.2%}")
+        print(f"Max Drawdown: {results['max_drawdown']}")
+        print(f"Profit Factor: {results['profit_factor']:.2f}")
+        print(f"Average Win / Loss: {results['avg_win']:.2f} / {results['avg_loss']:.2f}")
+        print(f"Long / Short Profit: {results['long_profit']:.2f} / {results['short_profit']:.2f}")
+        print(f"Sharpe / Sortino (daily, annualised): {results['sharpe']:.2f} / {results['sortino']:.2f}")
+        print(f"Exposure: {results['exposure']:.2%}")
+
+        trades = trade_arrays(self.trade_history)
+        if len(trades['profit']):
+            print("Profit by hour opened (UTC):")
+            print(hourly_stats(trades['hour'], trades['profit']).to_string(float_format='%.2f'))
+        if monte_carlo and len(trades['profit']):
+            confidence = drawdown_confidence(monte_carlo_drawdowns(trades['profit'], monte_carlo))
+            results['drawdown_confidence'] = confidence
+            print(f"Max Drawdown over {monte_carlo} resampled trade sequences:")
+            for level, value in confidence.items():
+                print(f"  {level:.0%}: {value:.2f}")
+        return results
 
-        return max_drawdown
+    def calculate_max_drawdown(self):
+        return max_drawdown(trade_arrays(self.trade_history)['profit'])
 
 # Main execution logic for backtesting
 if __name__ == "__main__":
@@ -280,4 +457,4 @@ if __name__ == "__main__":
         bot = TradingBot(client, "US500", 0.01, 1)
         start_time = int(datetime(2024, 5, 17, 15, 30).timestamp() * 1000)
         end_time = int(datetime(2024, 5, 17, 21, 17).timestamp() * 1000)
-        bot.backtest(start_time, end_time)
\ No newline at end of file
+        bot.backtest(start_time, end_time, monte_carlo=100_000)
\ No newline at end of file
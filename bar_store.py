@@ -0,0 +1,146 @@
+import io
+import os
+import time
+import numpy as np
+
+from bars import BAR_COLUMNS
+from fetch_data import get_historical_bars
+
+
+class BarStore:
+    """
+    Local cache of chart bars, one directory per (symbol, period) holding one .npy file per column.
+    Reads are memory-mapped, so get_range returns views into the files rather than copies.
+    A coverage file records which [start, end] ranges were already requested, so weekends and
+    other empty stretches are not fetched again. A merge only writes the rows from the first new
+    bar onwards, so extending the history costs O(new bars), not O(history).
+    """
+
+    def __init__(self, root='bar_store'):
+        self.root = root
+        self._maps = {}
+
+    def _dir(self, symbol, period):
+        return os.path.join(self.root, f"{symbol}_{period}")
+
+    def _load(self, symbol, period):
+        key = (symbol, period)
+        if key not in self._maps:
+            directory = self._dir(symbol, period)
+            if os.path.isfile(os.path.join(directory, 'coverage.npy')):
+                columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in BAR_COLUMNS}
+                coverage = np.load(os.path.join(directory, 'coverage.npy'))
+            else:
+                columns = {name: np.empty(0, dtype=np.int64 if name == 'ctm' else float) for name in BAR_COLUMNS}
+                coverage = np.empty((0, 2), dtype=np.int64)
+            self._maps[key] = (columns, coverage)
+        return self._maps[key]
+
+    def _save(self, symbol, period, columns, coverage, first=0):
+        """
+        Write rows [first:] of every column (the rows before are already on disk) and replace the
+        coverage file. Coverage goes last, so ranges are only marked fetched once their bars are written.
+        """
+        directory = self._dir(symbol, period)
+        os.makedirs(directory, exist_ok=True)
+        # Forget our maps so the next _load maps the new lengths
+        self._maps.pop((symbol, period), None)
+        for name in BAR_COLUMNS:
+            self._write_tail(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(columns[name]), first)
+        self._write_tail(os.path.join(directory, 'coverage.npy'), np.ascontiguousarray(coverage), 0)
+
+    @staticmethod
+    def _write_tail(path, values, first):
+        """
+        Make the .npy file at path hold `values`, writing only values[first:] over the stored rows. The
+        header written by np.save leaves room for the shape to grow, so it is rewritten in place, after
+        the data: an interrupted append leaves the old shape, and the extra bytes are ignored.
+        """
+        if first > 0 and os.path.isfile(path):
+            with open(path, 'r+b') as f:
+                version = np.lib.format.read_magic(f)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+                shape, _, dtype = read_header(f)
+                offset = f.tell()
+                header = io.BytesIO()
+                np.lib.format.write_array_header_1_0(header, np.lib.format.header_data_from_array_1_0(values))
+                if dtype == values.dtype and len(header.getvalue()) == offset and shape[0] >= first:
+                    f.seek(offset + first * values.itemsize)
+                    f.write(values[first:].tobytes())
+                    f.seek(0)
+                    f.write(header.getvalue())
+                    return
+        # New file, rewrite from the first row, or a header that cannot be updated in place
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp_path, path)
+
+    def missing_ranges(self, symbol, period, start, end):
+        _, coverage = self._load(symbol, period)
+        gaps = []
+        cursor = start
+        for covered_start, covered_end in coverage:
+            if covered_end < cursor:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > cursor:
+                gaps.append((int(cursor), int(covered_start)))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            gaps.append((int(cursor), int(end)))
+        return gaps
+
+    def merge(self, symbol, period, bars, start, end):
+        columns, coverage = self._load(symbol, period)
+
+        # Bars later in the concatenation win, so freshly fetched values replace stored ones
+        ctm = np.concatenate([columns['ctm'], bars['ctm']])
+        order = np.argsort(ctm, kind='stable')
+        ctm = ctm[order]
+        keep = np.ones(len(ctm), dtype=bool)
+        keep[:-1] = ctm[1:] != ctm[:-1]
+        merged = {name: np.concatenate([columns[name], bars[name]])[order][keep] for name in BAR_COLUMNS}
+        # Stored rows before the first fetched bar are unchanged, so only the rows from there on are written
+        first = int(np.searchsorted(columns['ctm'], np.min(bars['ctm']))) if len(bars['ctm']) else len(columns['ctm'])
+
+        ranges = coverage
+        if end >= start:
+            ranges = np.vstack([coverage, np.array([[start, end]], dtype=np.int64)])
+        if len(ranges) == 0:
+            self._save(symbol, period, merged, ranges, first)
+            return
+        ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+        merged_ranges = [list(ranges[0])]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged_ranges[-1][1]:
+                merged_ranges[-1][1] = max(merged_ranges[-1][1], range_end)
+            else:
+                merged_ranges.append([range_start, range_end])
+
+        self._save(symbol, period, merged, np.array(merged_ranges, dtype=np.int64), first)
+
+    def get_range(self, client, symbol, period, start, end):
+        """
+        Bars with start <= ctm <= end as a dict of read-only array views. Missing ranges are fetched
+        through client first; pass client=None to read whatever is stored (offline).
+
+        The views map the store's files, and a later merge writes those files in place: release the
+        arrays of earlier calls (del them) before fetching into the same (symbol, period) again.
+        Rows they cover may be rewritten under them, and on Windows a file cannot be replaced
+        while any view of it is alive.
+        """
+        if client is not None:
+            # The bar that is still forming is never marked as covered, so it is refreshed next time
+            last_closed = int(time.time() * 1000) - period * 60 * 1000
+            for gap_start, gap_end in self.missing_ranges(symbol, period, start, end):
+                bars = get_historical_bars(client, symbol, period, gap_start, gap_end)
+                if bars is None:
+                    break
+                self.merge(symbol, period, bars, gap_start, min(gap_end, last_closed))
+
+        columns, _ = self._load(symbol, period)
+        lo = np.searchsorted(columns['ctm'], start, side='left')
+        hi = np.searchsorted(columns['ctm'], end, side='right')
+        return {name: values[lo:hi] for name, values in columns.items()}
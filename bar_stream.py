@@ -0,0 +1,134 @@
+import time
+import threading
+from bars import Bars, BAR_COLUMNS
+from fetch_data import get_historical_bars
+
+
+class CandleBuilder:
+    """
+    Builds OHLC bars of `period` minutes from ticks. Completed bars are kept in a Bars ring buffer;
+    the forming bar is a dict with the same keys ('ctm', 'open', 'high', 'low', 'close', 'vol').
+    Volume is the tick count, since the tick stream carries no traded volume.
+    """
+
+    def __init__(self, period, maxlen=1000):
+        self.period = period
+        self.period_ms = period * 60 * 1000
+        self.bars = Bars(maxlen)
+        self.current = None
+
+    def _finalize(self):
+        bar, self.current = self.current, None
+        self.bars.append(bar)
+        return bar
+
+    def add_tick(self, price, timestamp):
+        """Add one tick; returns the list of bars this tick closed (at most one)."""
+        start = timestamp - timestamp % self.period_ms
+        closed = []
+        if self.current is not None and start > self.current['ctm']:
+            closed.append(self._finalize())
+        if self.current is None:
+            if self.bars.last_ctm is not None and start <= self.bars.last_ctm:
+                return closed  # late tick for a bar that is already closed
+            self.current = {'ctm': start, 'open': price, 'high': price, 'low': price, 'close': price, 'vol': 1}
+        else:
+            self.current['high'] = max(self.current['high'], price)
+            self.current['low'] = min(self.current['low'], price)
+            self.current['close'] = price
+            self.current['vol'] += 1
+        return closed
+
+    def close_due(self, now_ms):
+        """Close the forming bar once the clock has passed its end, even if no new tick came in."""
+        if self.current is not None and now_ms >= self.current['ctm'] + self.period_ms:
+            return [self._finalize()]
+        return []
+
+    def merge_bars(self, bars):
+        """Insert completed bars (e.g. from a REST backfill) that are newer than the last stored one."""
+        for bar in bars:
+            if self.bars.last_ctm is not None and bar['ctm'] <= self.bars.last_ctm:
+                continue
+            if self.current is not None and bar['ctm'] >= self.current['ctm']:
+                # The forming bar went stale while disconnected; the REST bar is complete
+                self.current = None
+            self.bars.append(bar)
+
+    def history(self, n=None):
+        """The last n (default: all) completed bars as a dict of arrays, like DeltaChartFetcher returns."""
+        # Copies: the stream thread keeps appending after the caller releases the pipeline lock
+        return {name: self.bars.window(name, n).copy() for name in BAR_COLUMNS}
+
+
+class BarPipeline:
+    """
+    Turns an APIStreamClient tick stream into bar-close events. Pass on_tick as the stream client's
+    tickFun; on_bar_close(period, bar) is called for every completed bar, either on the first tick
+    of the next bar or from a timer `grace` seconds after the bar boundary, whichever comes first.
+    REST is only used by backfill(), to fill the bars missed while the stream was down.
+    """
+
+    def __init__(self, symbol, periods=(1, 5), on_bar_close=None, maxlen=1000, grace=0.05):
+        self.symbol = symbol
+        self.builders = {period: CandleBuilder(period, maxlen) for period in periods}
+        self.on_bar_close = on_bar_close
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._running = False
+        self._timer = None
+
+    def on_tick(self, msg):
+        data = msg['data']
+        if data['symbol'] != self.symbol or data.get('level', 0) != 0:
+            return
+        with self._lock:
+            closed = [(period, bar) for period, builder in self.builders.items()
+                      for bar in builder.add_tick(data['bid'], data['timestamp'])]
+        self._dispatch(closed)
+
+    def _dispatch(self, closed):
+        if self.on_bar_close is None:
+            return
+        for period, bar in closed:
+            self.on_bar_close(period, bar)
+
+    def _close_due(self):
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            closed = [(period, bar) for period, builder in self.builders.items() for bar in builder.close_due(now_ms)]
+        self._dispatch(closed)
+
+    def _run_timer(self):
+        step = min(self.builders) * 60
+        while self._running:
+            time.sleep(step - time.time() % step + self.grace)
+            self._close_due()
+
+    def start(self):
+        self._running = True
+        self._timer = threading.Thread(target=self._run_timer, daemon=True)
+        self._timer.start()
+
+    def stop(self):
+        self._running = False
+
+    def backfill(self, client, bars_needed=60):
+        """Fetch completed bars newer than the last one held, for every period."""
+        now_ms = int(time.time() * 1000)
+        for period, builder in self.builders.items():
+            with self._lock:
+                last = builder.bars.last_ctm if len(builder.bars) else now_ms - bars_needed * builder.period_ms
+            fetched = get_historical_bars(client, self.symbol, period, last + builder.period_ms, now_ms)
+            if fetched is None:
+                continue
+            bars = [{'ctm': int(ctm), 'open': o, 'high': h, 'low': l, 'close': c, 'vol': v}
+                    for ctm, o, h, l, c, v in zip(fetched['ctm'], fetched['open'].tolist(), fetched['high'].tolist(),
+                                                  fetched['low'].tolist(), fetched['close'].tolist(), fetched['vol'].tolist())
+                    if ctm + builder.period_ms <= now_ms]
+            with self._lock:
+                builder.merge_bars(bars)
+
+    def history(self, period, n=None):
+        with self._lock:
+            return self.builders[period].history(n)
@@ -0,0 +1,76 @@
+import numpy as np
+
+BAR_COLUMNS = ('ctm', 'open', 'high', 'low', 'close', 'vol')
+
+
+class Bars:
+    """
+    Fixed-capacity ring buffer of OHLCV bars in preallocated NumPy columns (ctm as int64, the rest
+    float64). Every value is written twice, at i and i + capacity, so the last n bars are always one
+    contiguous slice: window() returns views, never copies, and memory stays at 2 * capacity rows.
+    Views show the buffer as it is; they are only meaningful until the next append.
+    """
+
+    __slots__ = ('capacity', '_columns', '_pos', '_count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._columns = {name: np.zeros(2 * capacity, dtype=np.int64 if name == 'ctm' else np.float64)
+                         for name in BAR_COLUMNS}
+        self._pos = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _write(self, index, bar):
+        for name, column in self._columns.items():
+            column[index] = column[index + self.capacity] = bar[name]
+
+    def append(self, bar):
+        """Add a bar (mapping with BAR_COLUMNS keys) after the last one, dropping the oldest when full."""
+        self._write(self._pos, bar)
+        self._pos = (self._pos + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def replace_last(self, bar):
+        """Overwrite the newest bar, e.g. with a fresher copy of a bar that was still forming."""
+        if not self._count:
+            raise IndexError("replace_last on empty Bars")
+        self._write((self._pos - 1) % self.capacity, bar)
+
+    def update(self, bar):
+        """Replace the last bar if it has the same ctm, append if newer, ignore if older."""
+        last = self.last_ctm
+        if last is not None and bar['ctm'] == last:
+            self.replace_last(bar)
+        elif last is None or bar['ctm'] > last:
+            self.append(bar)
+
+    def extend(self, bars):
+        """update() for each row of a dict of arrays (e.g. fetch_data.decode_rate_infos output)."""
+        for values in zip(*(np.asarray(bars[name]).tolist() for name in BAR_COLUMNS)):
+            self.update(dict(zip(BAR_COLUMNS, values)))
+
+    @property
+    def last_ctm(self):
+        if not self._count:
+            return None
+        return int(self._columns['ctm'][(self._pos - 1) % self.capacity])
+
+    def window(self, name, n=None):
+        """View of the last n (default: all held) values of one column, oldest first."""
+        n = self._count if n is None else min(n, self._count)
+        end = self._pos + self.capacity
+        return self._columns[name][end - n:end]
+
+    def arrays(self, n=None):
+        """Views of the last n bars of every column, as a dict like decode_rate_infos returns."""
+        return {name: self.window(name, n) for name in BAR_COLUMNS}
+
+    ctm = property(lambda self: self.window('ctm'))
+    open = property(lambda self: self.window('open'))
+    high = property(lambda self: self.window('high'))
+    low = property(lambda self: self.window('low'))
+    close = property(lambda self: self.window('close'))
+    vol = property(lambda self: self.window('vol'))
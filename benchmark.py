@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import socket
+import time
+import platform
+import contextlib
+from datetime import datetime
+from threading import Thread
+
+import numpy as np
+import pandas as pd
+
+import indicators
+from backtesting import TradingBot as BacktestBot
+from fetch_data import decode_rate_infos, decode_last_period_prices
+from xAPIConnector import JsonSocket, APIClient, TokenBucket, loginCommand
+from sim_server import SimulatedXAPIServer, MarketModel, DIGITS
+
+RESULTS_PATH = 'benchmark_results.json'
+BASELINE_PATH = 'benchmark_baseline.json'
+# A benchmark fails when it is this much slower than its baseline
+TOLERANCE = 0.5
+
+
+def chart_payload(bars):
+    # Synthetic getChartRangeRequest reply with `bars` rateInfos, terminated like a real xAPI message
+    rate_infos = [{"ctm": 1715900000000 + 60000 * i, "ctmString": "May 17, 2024, 1:00:00 AM", "open": 527012.0 + i % 50,
+                   "close": -3.0, "high": 4.0, "low": -6.0, "vol": 112.0} for i in range(bars)]
+    reply = {"status": True, "returnData": {"digits": 2, "rateInfos": rate_infos}}
+    return json.dumps(reply).encode('utf-8') + b'\n\n'
+
+
+def legacy_read(conn, bytesSize=4096):
+    # The JsonSocket._read implementation before the framing layer, kept for comparison
+    decoder = json.JSONDecoder()
+    received = ''
+    while True:
+        received += conn.recv(bytesSize).decode()
+        try:
+            resp, size = decoder.raw_decode(received)
+            return resp
+        except ValueError:
+            continue
+
+
+def time_read(payload, read):
+    server, client = socket.socketpair()
+    sender = Thread(target=server.sendall, args=(payload,))
+    sender.start()
+    start = time.perf_counter()
+    resp = read(client)
+    elapsed = time.perf_counter() - start
+    sender.join()
+    server.close()
+    client.close()
+    assert len(resp["returnData"]["rateInfos"]) > 0
+    return elapsed
+
+
+def json_socket_read(conn):
+    sock = JsonSocket('localhost', 0)
+    sock.socket.close()
+    sock.socket = sock.conn = conn
+    return sock._read()
+
+
+def bench_stream_frames(counts=(1000, 10000)):
+    """JsonSocket framing of many small messages arriving together, like a burst of stream ticks."""
+    results = {}
+    for count in counts:
+        tick = {"command": "tickPrices", "data": {"symbol": "US500", "ask": 5012.72, "bid": 5012.22, "high": 5012.72,
+                                                  "low": 5012.22, "level": 0, "timestamp": 1715900000000, "quoteId": 1}}
+        payload = (json.dumps(tick).encode('utf-8') + b'\n\n') * count
+
+        def read_all(conn):
+            sock = JsonSocket('localhost', 0)
+            sock.socket.close()
+            sock.socket = sock.conn = conn
+            for _ in range(count):
+                sock._read()
+            return {"returnData": {"rateInfos": [None]}}
+
+        seconds = min(time_read(payload, read_all) for _ in range(3))
+        results[f"json_socket.frames[count={count}]"] = seconds
+        print(f"JsonSocket._read {count:>6} tick frames: {count / seconds:,.0f} frames/s")
+    return results
+
+
+def bench_json_socket(sizes=(1000, 10000, 50000), legacy_limit=10000):
+    results = []
+    for bars in sizes:
+        payload = chart_payload(bars)
+        megabytes = len(payload) / 1e6
+        elapsed = min(time_read(payload, json_socket_read) for _ in range(3))
+        row = {"bars": bars, "megabytes": round(megabytes, 2), "seconds": elapsed, "mb_per_s": megabytes / elapsed}
+        if bars <= legacy_limit:
+            legacy = time_read(payload, legacy_read)
+            row["legacy_seconds"] = legacy
+            row["legacy_mb_per_s"] = megabytes / legacy
+        results.append(row)
+        print(f"JsonSocket._read {bars:>6} bars ({megabytes:.2f} MB): {row['mb_per_s']:.1f} MB/s"
+              + (f", legacy {row['legacy_mb_per_s']:.1f} MB/s" if "legacy_seconds" in row else ""))
+    return results
+
+
+def best_time(fn, repeat=5, min_time=0.05):
+    """Best per-call time of fn() over `repeat` rounds, each looping long enough to be measurable."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 10
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def synthetic_bars(n, seed=0):
+    # Random-walk OHLCV series with the value ranges of US500 1m bars
+    rng = np.random.default_rng(seed)
+    close = 5000 + np.cumsum(rng.normal(0, 1.5, n))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 1.0, n))
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.integers(10, 500, n).astype(float)
+    return {'open': open_, 'high': high, 'low': low, 'close': close, 'vol': volume}
+
+
+def stream(indicator, rows):
+    for row in rows:
+        indicator.update(*row)
+
+
+def chart_response(bars, period=1):
+    # Decoded-JSON chart reply, as APIClient.execute returns it
+    end = 1715900000000
+    rate_infos = MarketModel().rate_infos('US500', period, end - bars * period * 60000, end - 1)
+    return {'status': True, 'returnData': {'digits': DIGITS, 'rateInfos': rate_infos}}
+
+
+def bench_indicators(lengths=(100, 1000, 10000)):
+    results = {}
+    for n in lengths:
+        bars = synthetic_bars(n)
+        close, high, low, vol = bars['close'], bars['high'], bars['low'], bars['vol']
+        close_list = close.tolist()
+        atr = indicators.calculate_atr(high, low, close)
+        cases = {
+            'calculate_atr': lambda: indicators.calculate_atr(high, low, close),
+            'calculate_supertrend': lambda: indicators.calculate_supertrend(high, low, close, atr),
+            'calculate_supertrend_grid': lambda: indicators.calculate_supertrend_grid(
+                high, low, close, [(period, multiplier) for period in (7, 10, 14) for multiplier in (2, 3)]),
+            'calculate_ema': lambda: indicators.calculate_ema(close, 12),
+            'calculate_macd': lambda: indicators.calculate_macd(close_list),
+            'calculate_macd_series': lambda: indicators.calculate_macd_series(close_list),
+            'calculate_vwap': lambda: indicators.calculate_vwap(close, vol),
+            'calculate_vwap_series': lambda: indicators.calculate_vwap_series(close, vol),
+            'calculate_sma': lambda: indicators.calculate_sma(close_list),
+            'calculate_sma_series': lambda: indicators.calculate_sma_series(close),
+            'calculate_bollinger_bands': lambda: indicators.calculate_bollinger_bands(close_list),
+            'calculate_rsi': lambda: indicators.calculate_rsi(close_list),
+            'calculate_rsi_series': lambda: indicators.calculate_rsi_series(close_list),
+        }
+        # Streaming indicators: cost of feeding the whole series one bar at a time
+        inputs = {'StreamingEMA': [(price,) for price in close_list], 'StreamingVWAP': list(zip(close_list, vol.tolist())),
+                  'StreamingATR': list(zip(high.tolist(), low.tolist(), close_list))}
+        inputs['StreamingSupertrend'] = inputs['StreamingATR']
+        for name in ('StreamingMACD', 'StreamingSMA', 'StreamingBollingerBands', 'StreamingRSI'):
+            inputs[name] = inputs['StreamingEMA']
+        for name, rows in inputs.items():
+            factory = (lambda: indicators.StreamingEMA(12)) if name == 'StreamingEMA' else getattr(indicators, name)
+            cases[f'{name}.update'] = lambda factory=factory, rows=rows: stream(factory(), rows)
+        for name, fn in cases.items():
+            if name == 'calculate_supertrend' and n > 1000:
+                continue  # pure-Python loop over a pandas Series; the grid version covers long series
+            results[f'indicators.{name}[n={n}]'] = best_time(fn)
+            print(f"{name:>32} n={n:>6}: {results[f'indicators.{name}[n={n}]'] * 1000:9.3f} ms")
+    return results
+
+
+def bench_decode(sizes=(60, 1000, 10000)):
+    results = {}
+    for bars in sizes:
+        response = chart_response(bars)
+        for name, fn in (('decode_rate_infos', decode_rate_infos), ('decode_last_period_prices', decode_last_period_prices)):
+            key = f'decode.{name}[bars={bars}]'
+            results[key] = best_time(lambda: fn(response))
+            print(f"{name:>32} bars={bars:>6}: {results[key] * 1000:9.3f} ms")
+    return results
+
+
+def bench_backtest(sizes=(1000, 5000)):
+    results = {}
+    for n in sizes:
+        bars = synthetic_bars(n)
+        def run():
+            bot = BacktestBot(None, 'US500')
+            bot.run_backtest(bars['close'].tolist(), bars['open'].tolist(), bars['high'].tolist(),
+                             bars['low'].tolist(), bars['vol'].tolist())
+        # The backtest prints every simulated trade
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            seconds = best_time(run, repeat=3, min_time=0)
+        results[f'backtest.run_backtest[bars={n}]'] = seconds
+        print(f"{'run_backtest':>32} bars={n:>6}: {seconds:9.3f} s ({n / seconds:,.0f} bars/s)")
+    return results
+
+
+def run_suite(quick=False):
+    results = {}
+    results.update(bench_indicators((100, 1000) if quick else (100, 1000, 10000)))
+    results.update(bench_decode((60, 1000) if quick else (60, 1000, 10000)))
+    for row in bench_json_socket((1000, 10000) if quick else (1000, 10000, 50000), legacy_limit=0):
+        results[f"json_socket._read[bars={row['bars']}]"] = row['seconds']
+    results.update(bench_stream_frames((1000,) if quick else (1000, 10000)))
+    results.update(bench_backtest((1000,) if quick else (1000, 5000)))
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'platform': platform.platform(), 'time': datetime.now().isoformat()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Names of benchmarks more than `tolerance` slower than the baseline, with both timings."""
+    regressions = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base and seconds > base * (1 + tolerance):
+            regressions.append((name, base, seconds))
+    return regressions
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def bench_client(requests=500, latency=0.0, jitter=0.0, chart_bars=60):
+    """Round-trip latency and throughput of APIClient against the local simulated xAPI server."""
+    sim = SimulatedXAPIServer(latency=latency, jitter=jitter, chart_bars=chart_bars).start()
+    try:
+        # No rate limit here: the point is what the client and socket layer can do
+        client = APIClient(sim.address, sim.port, encrypt=False, rateLimiter=TokenBucket(rate=1e9, burst=1e9))
+        client.execute(loginCommand('bench', 'bench'))
+        request = {"command": "getChartLastRequest", "arguments": {"info": {"symbol": "US500", "period": 1, "start": 0}}}
+        timings = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            sent = time.perf_counter()
+            client.execute(request)
+            timings.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - start
+        client.disconnect()
+    finally:
+        sim.stop()
+    row = {"requests": requests, "latency": latency, "jitter": jitter, "chart_bars": chart_bars,
+           "requests_per_s": requests / elapsed, "p50_ms": percentile(timings, 0.5) * 1000,
+           "p99_ms": percentile(timings, 0.99) * 1000, "max_ms": max(timings) * 1000}
+    print(f"APIClient {chart_bars} bars, latency {latency * 1000:.0f}+-{jitter * 1000:.0f} ms: "
+          f"{row['requests_per_s']:.0f} req/s, p50 {row['p50_ms']:.2f} ms, p99 {row['p99_ms']:.2f} ms")
+    return row
+
+
+if __name__ == "__main__":
+    # python benchmark.py [--quick] [--save-baseline] [--tolerance=0.5] [--client]
+    if "--client" in sys.argv:
+        bench_client()
+        bench_client(requests=200, latency=0.005, jitter=0.002)
+        sys.exit(0)
+
+    results = run_suite(quick="--quick" in sys.argv)
+    with open(RESULTS_PATH, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results saved to {RESULTS_PATH}")
+
+    if "--save-baseline" in sys.argv or not os.path.exists(BASELINE_PATH):
+        # Timings are machine-specific, so no baseline is shipped: the first run on a machine records
+        # one, and every later run is checked against it
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+    else:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)['results']
+        tolerance = next((float(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--tolerance=')), TOLERANCE)
+        regressions = compare(results, baseline, tolerance)
+        for name, base, seconds in regressions:
+            print(f"REGRESSION {name}: {base * 1000:.3f} ms -> {seconds * 1000:.3f} ms ({seconds / base:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {BASELINE_PATH} (tolerance {tolerance:.0%})")
@@ -1,5 +1,6 @@
 from xAPIConnector import *
 import time
+import asyncio
 import os
 import numpy as np
 import pandas as pd
@@ -7,12 +8,15 @@ import math
 import csv
 import datetime
 
-def get_last_period_prices(client, symbol, period):
-    period_in_seconds = 60 * period * 60 * 1000  # Adjusted for variable periods
+from bars import Bars, BAR_COLUMNS
+from resample import MultiTimeframeResampler, align_start
+
+def chart_last_request(symbol, period, bars=60, start=None):
+    period_in_seconds = bars * period * 60 * 1000  # Adjusted for variable periods
     now = int(time.time() * 1000)
-    from_timestamp = now - period_in_seconds
+    from_timestamp = now - period_in_seconds if start is None else start
 
-    response = client.execute({
+    return {
         "command": "getChartLastRequest",
         "arguments": {
             "info": {
@@ -21,8 +25,9 @@ def get_last_period_prices(client, symbol, period):
                 "start": from_timestamp,
             }
         }
-    })
+    }
 
+def decode_last_period_prices(response):
     if response['status']:
         digits = response['returnData']['digits']
         rate_infos = response['returnData']['rateInfos']
@@ -40,10 +45,83 @@ def get_last_period_prices(client, symbol, period):
         print(f"Failed to retrieve price data. Error: {response.get('errorCode')} - {response.get('errorDescr')}")
         return [], None, None, [], []
 
+def get_last_period_prices(client, symbol, period):
+    return decode_last_period_prices(client.execute(chart_last_request(symbol, period)))
+
+def get_last_period_bars(client, symbol, period, bars=60):
+    # Like get_last_period_prices, but as a dict of arrays with bar timestamps (see decode_rate_infos)
+    return decode_rate_infos(client.execute(chart_last_request(symbol, period, bars)))
+
+class DeltaChartFetcher:
+    """
+    Keeps the last `capacity` bars per (symbol, period) and, after the first full request, only asks
+    getChartLastRequest for bars starting at the last one held. That bar may have been still forming,
+    so it is replaced in place; newer bars are appended and the oldest fall off the Bars ring buffer.
+
+    `resample` lists periods (in minutes) built from every 1m history: the first reply seeds a
+    resample.MultiTimeframeResampler and later replies feed it only their new bars, so resampled()
+    costs nothing per cycle beyond the bars that arrived.
+    """
+
+    def __init__(self, capacity=400, resample=()):
+        self.capacity = capacity
+        self.resample = tuple(resample)
+        self.histories = {}
+        self.resamplers = {}
+
+    def request(self, symbol, period):
+        history = self.histories.get((symbol, period))
+        if not history:
+            return chart_last_request(symbol, period, bars=self.capacity)
+        return chart_last_request(symbol, period, start=history.last_ctm)
+
+    def apply(self, symbol, period, response):
+        """Merge a reply to request(); returns the history as array views, or None if the request failed."""
+        bars = decode_rate_infos(response)
+        if bars is None:
+            return None
+        history = self.histories.get((symbol, period))
+        if history is None:
+            history = self.histories[(symbol, period)] = Bars(self.capacity)
+        history.extend(bars)
+        if period == 1 and self.resample:
+            self._resample(symbol, history, bars)
+        return history.arrays()
+
+    def _resample(self, symbol, history, bars):
+        resampler = self.resamplers.get(symbol)
+        if resampler is None:
+            # Enough bars to cover the 1m history; the first bucket starts at a period boundary, so it is complete
+            resampler = self.resamplers[symbol] = MultiTimeframeResampler(
+                self.resample, maxlen=self.capacity // min(self.resample) + 1)
+            history_bars = history.arrays()
+            for minutes, single in resampler.resamplers.items():
+                single.seed(align_start(history_bars, minutes))
+            return
+        for values in zip(*(np.asarray(bars[name]).tolist() for name in BAR_COLUMNS)):
+            resampler.update(dict(zip(BAR_COLUMNS, values)))
+
+    def resampled(self, symbol, minutes):
+        """Bars of `minutes` (one of `resample`) built from the 1m history, the partial one last, as array views."""
+        return self.resamplers[symbol].arrays(minutes)
+
+    def update(self, client, symbol, period):
+        return self.apply(symbol, period, client.execute(self.request(symbol, period)))
+
+    def arrays(self, symbol, period):
+        history = self.histories.get((symbol, period))
+        return history.arrays() if history is not None else Bars(1).arrays()
+
+OPEN_TRADES_REQUEST = {"command": "getTrades", "arguments": {"openedOnly": True}}
+
 # Function to get current open positions and their counts
-def get_current_positions(client):
-    trades_response = client.execute({"command": "getTrades", "arguments": {"openedOnly": True}})
+def get_current_positions(client, symbol=None):
+    return decode_positions(client.execute(OPEN_TRADES_REQUEST), symbol)
+
+def decode_positions(trades_response, symbol=None):
     trades = trades_response.get("returnData", [])
+    if symbol is not None:
+        trades = [trade for trade in trades if trade.get("symbol") == symbol]
 
     positions = {
         'long': False,
@@ -73,6 +151,22 @@ def get_current_positions(client):
 
     return positions
 
+def split_positions_by_symbol(trades_response, symbols):
+    # One getTrades reply shared by all symbols instead of one request per symbol
+    return {symbol: decode_positions(trades_response, symbol) for symbol in symbols}
+
+
+
+async def fetch_cycle_data_async(client, symbol, chart_fetcher):
+    """
+    The requests of one decision cycle (1m chart delta and open trades) sent together over an
+    AsyncAPIClient. Returns the 1m history from chart_fetcher (a DeltaChartFetcher) and the positions dict.
+    """
+    response_1m, trades_response = await asyncio.gather(
+        client.execute(chart_fetcher.request(symbol, 1)),
+        client.execute(OPEN_TRADES_REQUEST),
+    )
+    return chart_fetcher.apply(symbol, 1, response_1m), decode_positions(trades_response, symbol)
 
 
 def seconds_until_next_minute():
@@ -87,7 +181,57 @@ def seconds_until_next_minute():
 
 
 ############################################ Historical Data ############################################
-def get_historical_data(client, symbol, period, start, end):
+def get_historical_bars(client, symbol, period, start, end):
+    """
+    Same request as get_historical_data, decoded straight into NumPy arrays and including the bar
+    timestamps ('ctm', ms). Returns None when the request fails.
+    """
+    return decode_rate_infos(client.execute({
+        "command": "getChartRangeRequest",
+        "arguments": {
+            "info": {
+                "symbol": symbol,
+                "period": period,
+                "start": start,
+                "end": end
+            }
+        }
+    }))
+
+
+def decode_rate_infos(response):
+    # Chart reply -> dict of arrays ('ctm', 'open', 'close', 'high', 'low', 'vol') with decoded prices
+    if not response['status']:
+        print(f"Failed to retrieve chart data. Error: {response.get('errorCode')} - {response.get('errorDescr')}")
+        return None
+
+    digits = response['returnData']['digits']
+    rate_infos = response['returnData']['rateInfos']
+    scale = 10 ** digits
+
+    ctm = np.array([bar['ctm'] for bar in rate_infos], dtype=np.int64)
+    raw_open = np.array([bar['open'] for bar in rate_infos], dtype=float)
+    raw_close = np.array([bar['close'] for bar in rate_infos], dtype=float)
+    raw_high = np.array([bar['high'] for bar in rate_infos], dtype=float)
+    raw_low = np.array([bar['low'] for bar in rate_infos], dtype=float)
+
+    open_prices = raw_open / scale
+    return {
+        'ctm': ctm,
+        'open': open_prices,
+        'close': (raw_open + raw_close) / scale,
+        'high': open_prices + raw_high / scale,
+        'low': open_prices + raw_low / scale,
+        'vol': np.array([bar['vol'] for bar in rate_infos], dtype=float),
+    }
+
+
+def get_historical_data(client, symbol, period, start, end, store=None):
+    # With a BarStore only the missing ranges are requested and the columns come back as array views
+    if store is not None:
+        bars = store.get_range(client, symbol, period, start, end)
+        return bars['close'], bars['open'], bars['high'], bars['low'], bars['vol']
+
     response = client.execute({
         "command": "getChartRangeRequest",
         "arguments": {
@@ -7,18 +7,22 @@ import math
 import csv
 import datetime
 
-def write_to_csv(row, filepath='C:\\Users\\Asus\\OneDrive\\Pulpit\\Rozne\\Python\\XTB\\_script\\excel\\trading_log.csv'):
-    # Check if the file exists
-    file_exists = os.path.isfile(filepath)
+from log_writer import LogWriter
 
-    with open(filepath, 'a', newline='') as f:
-        writer = csv.writer(f)
+TRADE_LOG_COLUMNS = ['Timestamp', '1min_Open', '1min_Close', '1min_MACD', '1min_Signal',
+                     'VWAP', 'ATR', 'Position', 'Event', 'Direction', 'TP', 'Offset']
 
-        # If the file does not exist, write the header row first
-        if not file_exists:
-            writer.writerow(['Timestamp', '1min_Open', '1min_Close', '1min_MACD', '1min_Signal',
-                             'VWAP', 'ATR', 'Position', 'Event', 'Direction', 'TP', 'Offset'])
+# One buffered writer per log path, shared by every caller
+_writers = {}
 
-        # Write the actual row
-        writer.writerow(row)
 
+def get_log_writer(filepath, columns=None, **kwargs):
+    writer = _writers.get(filepath)
+    if writer is None:
+        writer = _writers[filepath] = LogWriter(filepath, columns=columns, **kwargs)
+    return writer
+
+
+def write_to_csv(row, filepath=os.path.join('logs', 'trading_log.csv')):
+    # Rows are buffered and appended in batches by a background thread, with daily/size rotation
+    get_log_writer(filepath, TRADE_LOG_COLUMNS).write(row)
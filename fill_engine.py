@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import numpy as np
+
+# Bars scanned in the first look-ahead window for a TP/SL hit; the window doubles until one is found
+FIRST_WINDOW = 64
+
+
+class SimulatedClock:
+    """
+    Backtest clock: now() is the open time of the bar being processed, set with set_ms(). Any object
+    with a now() method can be injected instead, e.g. datetime itself for wall-clock time.
+    """
+
+    def __init__(self, start_ms=0):
+        self.set_ms(start_ms)
+
+    def set_ms(self, ms):
+        self.ms = int(ms)
+        self._now = datetime.fromtimestamp(self.ms / 1000)
+
+    def now(self):
+        return self._now
+
+
+class FillEngine:
+    """
+    Resolves all orders of a backtest against the bar arrays at once instead of bar by bar.
+    A pending order's trigger bar is the first bar after it was placed whose low-high range
+    contains the entry price, within the expiry window. An open trade's exit bar is the first bar
+    at or after its open where high/low reach TP or the trailing SL. The trailing SL path (running
+    max of close - k * ATR for longs, running min of close + k * ATR for shorts) comes from one ufunc
+    accumulate along each row. Every order is a row of one 2-D look-ahead window, so each call is a
+    handful of NumPy operations however many orders there are. Semantics match
+    backtesting.TradingBot.check_pending_orders and simulate_trading_logic.
+    """
+
+    def __init__(self, highs, lows, closes, atr, timestamps, trailing_multiplier, expiry_ms):
+        self.highs = np.asarray(highs, dtype=float)
+        self.lows = np.asarray(lows, dtype=float)
+        self.closes = np.asarray(closes, dtype=float)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        # NaN ATR (warm-up) leaves the stop where it is, like max()/min() with a NaN second argument
+        self.long_trail = self.closes - trailing_multiplier * np.asarray(atr, dtype=float)
+        self.short_trail = self.closes + trailing_multiplier * np.asarray(atr, dtype=float)
+        self.expiry_ms = expiry_ms
+
+    def trigger_bars(self, entry_prices, placed):
+        """
+        For pending orders placed on bars `placed`: the bar each one fills on (-1 if none) and
+        whether the unfilled ones expired (False means still pending at the end of the data).
+        """
+        entry_prices = np.asarray(entry_prices, dtype=float)
+        placed = np.asarray(placed, dtype=np.int64)
+        n = len(self.timestamps)
+        ends = np.searchsorted(self.timestamps, self.timestamps[placed] + self.expiry_ms, side='right')
+        width = int((ends - placed - 1).max()) if len(placed) else 0
+        bars = np.full(len(placed), -1, dtype=np.int64)
+        if width > 0:
+            index = placed[:, None] + 1 + np.arange(width)
+            valid = index < ends[:, None]
+            index = np.minimum(index, n - 1)
+            entry = entry_prices[:, None]
+            hits = valid & (self.lows[index] <= entry) & (entry <= self.highs[index])
+            filled = hits.any(axis=1)
+            bars[filled] = placed[filled] + 1 + hits[filled].argmax(axis=1)
+        expired = (bars < 0) & (ends < n)
+        return bars, expired
+
+    def exit_bars(self, is_long, tps, sls, opened):
+        """
+        For trades opened on bars `opened`: the bar each one exits on (-1 if still open at the end)
+        and its trailing stop on that bar (or on the last bar).
+        """
+        is_long = np.asarray(is_long, dtype=bool)
+        tps = np.asarray(tps, dtype=float)
+        stops = np.array(sls, dtype=float)
+        starts = np.array(opened, dtype=np.int64)
+        n = len(self.closes)
+        bars = np.full(len(starts), -1, dtype=np.int64)
+        active = np.flatnonzero(starts < n)
+        window = FIRST_WINDOW
+        while active.size:
+            index = starts[active, None] + np.arange(window)
+            valid = index < n
+            index = np.minimum(index, n - 1)
+            longs = is_long[active, None]
+            trail = np.where(valid, np.where(longs, self.long_trail[index], self.short_trail[index]), np.nan)
+            trail = np.concatenate((stops[active, None], trail), axis=1)
+            path = np.where(longs, np.fmax.accumulate(trail, axis=1), np.fmin.accumulate(trail, axis=1))[:, 1:]
+            highs, lows, tp = self.highs[index], self.lows[index], tps[active, None]
+            hits = valid & np.where(longs, (highs >= tp) | (lows <= path), (lows <= tp) | (highs >= path))
+            found = hits.any(axis=1)
+            first = hits.argmax(axis=1)
+            rows = np.arange(len(active))
+            # Invalid columns carry the last stop forward, so the last column is the stop so far
+            stops[active] = np.where(found, path[rows, first], path[:, -1])
+            bars[active[found]] = starts[active[found]] + first[found]
+            active = active[~found]
+            starts[active] += window
+            active = active[starts[active] < n]
+            window *= 2
+        return bars, stops
@@ -0,0 +1,70 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+INDICATOR_CACHE_LOOKUPS = REGISTRY.counter('indicator_cache_lookups_total',
+                                           'Indicator cache lookups by result (hit, tail, miss)', ('result',))
+
+
+class IndicatorCache:
+    """
+    LRU cache of streaming indicator state (see indicators.Streaming*), keyed by
+    (symbol, period, indicator, params, last closed bar ctm, closed bar count).
+
+    The last bar passed to get() is the forming bar; every bar before it is closed and final. On a
+    miss a fresh indicator is seeded with the closed bars and kept as the entry's finalized state.
+    While no new bar closes, lookups share that key: an unchanged forming bar returns the stored
+    result, a changed one copies the finalized state and runs one update() for the tail bar.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.tail_updates = 0
+        self.misses = 0
+
+    def get(self, symbol, period, indicator, params, ctm, *columns):
+        """
+        indicator(*params).update() for the last bar of `columns` (e.g. highs, lows, closes, in the
+        order the indicator's seed()/update() take them), where ctm are the bar times.
+        """
+        closed = len(ctm) - 1
+        key = (symbol, period, indicator.__name__, params, int(ctm[-2]) if closed else None, closed)
+        tail = tuple(float(column[-1]) for column in columns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                INDICATOR_CACHE_LOOKUPS.inc('miss')
+                state = indicator(*params)
+                state.seed(*(column[:-1] for column in columns))
+                entry = self._entries[key] = [state, None, None]
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+                if entry[1] == tail:
+                    self.hits += 1
+                    INDICATOR_CACHE_LOOKUPS.inc('hit')
+                    return entry[2]
+                self.tail_updates += 1
+                INDICATOR_CACHE_LOOKUPS.inc('tail')
+            # The finalized state is never updated in place, so the next forming-bar change starts from it again
+            result = copy.deepcopy(entry[0]).update(*tail)
+            entry[1], entry[2] = tail, result
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by every bot in the process; keys carry the symbol, so bots never see each other's entries
+INDICATOR_CACHE = IndicatorCache()
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from collections import deque
 
 def calculate_atr(highs, lows, closes, period=14):
     df = pd.DataFrame({'High': highs, 'Low': lows, 'Close': closes})
@@ -48,21 +49,71 @@ def calculate_supertrend(highs, lows, closes, atr, multiplier=3):
     return supertrend, supertrend_direction
 
 
+def calculate_supertrend_grid(highs, lows, closes, params):
+    """
+    Supertrend for many (atr_period, multiplier) pairs in one pass over the bars.
+    Returns (supertrend, direction), each of shape (len(params), len(closes)); row k equals
+    calculate_supertrend(highs, lows, closes, calculate_atr(highs, lows, closes, period), multiplier)
+    for params[k] = (period, multiplier).
+    """
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+    periods = np.array([period for period, _ in params])
+    multipliers = np.array([multiplier for _, multiplier in params], dtype=float)
+
+    # One ATR per distinct period, laid out bar-major so each step of the loop reads a contiguous row
+    atr = np.empty((len(closes), len(params)))
+    for period in np.unique(periods):
+        atr[:, periods == period] = calculate_atr(highs, lows, closes, period=int(period)).to_numpy()[:, None]
+
+    hl2 = ((highs + lows) / 2)[:, None]
+    upper_band = hl2 + (multipliers * atr)
+    lower_band = hl2 - (multipliers * atr)
+
+    supertrend = np.zeros((len(closes), len(params)))
+    supertrend_direction = np.zeros((len(closes), len(params)))
+    if len(closes) == 0:
+        return supertrend.T, supertrend_direction.T
+
+    supertrend[0] = lower_band[0]
+    supertrend_direction[0] = np.where(closes[0] > upper_band[0], 1, -1)
+
+    for i in range(1, len(closes)):
+        prev_supertrend = supertrend[i - 1]
+        prev_direction = supertrend_direction[i - 1]
+        # np.where mirrors the builtin max/min used by calculate_supertrend, including on ties
+        rising = np.where(prev_supertrend > lower_band[i], prev_supertrend, lower_band[i])
+        falling = np.where(prev_supertrend < upper_band[i], prev_supertrend, upper_band[i])
+        current = np.where(prev_direction == 1, rising, falling)
+
+        direction = np.where(closes[i] > current, 1, np.where(closes[i] < current, -1, prev_direction))
+        supertrend[i] = np.where(direction != prev_direction, prev_supertrend, current)
+        supertrend_direction[i] = direction
+
+    return supertrend.T, supertrend_direction.T
+
+
 def calculate_ema(prices, period):
     prices_series = pd.Series(prices)
     ema = prices_series.ewm(span=period, adjust=False).mean()
     return ema
 
-def calculate_macd(prices):
-    if not prices:
-        return None, None, None
-
+def calculate_macd_series(prices):
     ema_12 = calculate_ema(prices, 12)
     ema_26 = calculate_ema(prices, 26)
     macd_line = ema_12 - ema_26
     signal_line = macd_line.ewm(span=9, adjust=False).mean()
     histogram = macd_line - signal_line
 
+    return macd_line, signal_line, histogram
+
+def calculate_macd(prices):
+    if len(prices) == 0:
+        return None, None, None
+
+    macd_line, signal_line, histogram = calculate_macd_series(prices)
+
     return macd_line.iloc[-1], signal_line.iloc[-1], histogram.iloc[-1]
 
 def calculate_vwap(prices, volume_data):
@@ -72,11 +123,32 @@ def calculate_vwap(prices, volume_data):
     vwap = np.sum(np.array(prices) * np.array(volume_data)) / np.sum(volume_data)
     return vwap
 
+def calculate_vwap_series(prices, volume_data):
+    # Running VWAP at every bar; equal to calculate_vwap on each prefix up to float rounding
+    prices = np.asarray(prices, dtype=float)
+    volume_data = np.asarray(volume_data, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.cumsum(prices * volume_data) / np.cumsum(volume_data)
+
 def calculate_sma(prices, period=20):
     if len(prices) < period:
         return None
     return sum(prices[-period:]) / period
 
+def calculate_sma_series(prices, period=20):
+    # Windows are summed left to right like the builtin sum, so every value matches calculate_sma exactly.
+    # Bars before the first full window are NaN.
+    prices = np.asarray(prices, dtype=float)
+    sma = np.full(len(prices), np.nan)
+    if len(prices) < period:
+        return sma
+    windows = np.lib.stride_tricks.sliding_window_view(prices, period)
+    total = windows[:, 0].copy()
+    for k in range(1, period):
+        total += windows[:, k]
+    sma[period - 1:] = total / period
+    return sma
+
 def calculate_bollinger_bands(prices, period=20):
     sma = sum(prices[-period:]) / period
     standard_deviation = (sum([(price - sma) ** 2 for price in prices[-period:]]) / period) ** 0.5
@@ -85,6 +157,9 @@ def calculate_bollinger_bands(prices, period=20):
     return upper_band, sma, lower_band
 
 def calculate_rsi(prices, window=14):
+    return calculate_rsi_series(prices, window).iloc[-1]
+
+def calculate_rsi_series(prices, window=14):
     df = pd.DataFrame(prices, columns=['close'])
     delta = df['close'].diff()
     gain = (delta.where(delta > 0, 0)).fillna(0)
@@ -95,4 +170,294 @@ def calculate_rsi(prices, window=14):
 
     rs = avg_gain / avg_loss
     rsi = 100 - (100 / (1 + rs))
-    return rsi.iloc[-1]
\ No newline at end of file
+    return rsi
+
+
+############################################ Streaming Indicators ############################################
+# Stateful versions of the functions above. update() takes one new bar and costs O(1) (O(period) at most),
+# seed() bulk-loads history with the same arguments as the matching calculate_* function.
+
+
+class StreamingEMA:
+    # Same recursion as pandas ewm(span=period, adjust=False), so values match calculate_ema exactly
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value = None
+
+    def update(self, price):
+        if self.value is None or self.value != self.value:
+            self.value = float(price)
+        elif self.value != price:
+            old_wt = 1. - self.alpha
+            self.value = (old_wt * self.value + self.alpha * price) / (old_wt + self.alpha)
+        return self.value
+
+    def seed(self, prices):
+        for price in prices:
+            self.update(price)
+        return self.value
+
+
+class StreamingMACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast_ema = StreamingEMA(fast)
+        self.slow_ema = StreamingEMA(slow)
+        self.signal_ema = StreamingEMA(signal)
+        self.macd = None
+        self.signal = None
+        self.histogram = None
+
+    def update(self, price):
+        self.macd = self.fast_ema.update(price) - self.slow_ema.update(price)
+        self.signal = self.signal_ema.update(self.macd)
+        self.histogram = self.macd - self.signal
+        return self.macd, self.signal, self.histogram
+
+    def seed(self, prices):
+        for price in prices:
+            self.update(price)
+        return self.macd, self.signal, self.histogram
+
+
+class _CompensatedSum:
+    # Running sum with Neumaier (improved Kahan) compensation: values added and later subtracted again
+    # leave no drift, so a sliding window can be kept up to date in O(1) per bar
+    __slots__ = ('total', 'compensation')
+
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, value):
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    @property
+    def value(self):
+        return self.total + self.compensation
+
+
+class StreamingSMA:
+    # O(1) per bar: a compensated running sum of the window, shifted by the first price seen so the
+    # sum stays small; matches calculate_sma to rounding error
+    def __init__(self, period=20):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.pivot = None
+        self.window_sum = _CompensatedSum()
+        self.value = None
+
+    def update(self, price):
+        if self.pivot is None:
+            self.pivot = price
+        if len(self.window) == self.period:
+            self.window_sum.add(-self.window[0])
+        shifted = price - self.pivot
+        self.window.append(shifted)
+        self.window_sum.add(shifted)
+        self.value = self.pivot + self.window_sum.value / self.period if len(self.window) == self.period else None
+        return self.value
+
+    def seed(self, prices):
+        for price in list(prices)[-self.period:]:
+            self.update(price)
+        return self.value
+
+
+class StreamingBollingerBands:
+    # Returns None until a full window has been seen. O(1) per bar: compensated running sums of the
+    # shifted prices and of their squares give the mean and the (population) variance. The pivot is
+    # moved to the window mean once per `period` bars (amortized O(1)), so prices drifting away from
+    # it never make the squares large enough to cancel
+    def __init__(self, period=20):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.pivot = None
+        self.window_sum = _CompensatedSum()
+        self.square_sum = _CompensatedSum()
+        self.since_rebase = 0
+        self.value = None
+
+    def _rebase(self):
+        shift = self.window_sum.value / len(self.window)
+        self.pivot += shift
+        self.window = deque((value - shift for value in self.window), maxlen=self.period)
+        self.window_sum = _CompensatedSum()
+        self.square_sum = _CompensatedSum()
+        for value in self.window:
+            self.window_sum.add(value)
+            self.square_sum.add(value * value)
+        self.since_rebase = 0
+
+    def update(self, price):
+        if self.pivot is None:
+            self.pivot = price
+        self.since_rebase += 1
+        if self.since_rebase > self.period:
+            self._rebase()
+        if len(self.window) == self.period:
+            oldest = self.window[0]
+            self.window_sum.add(-oldest)
+            self.square_sum.add(-oldest * oldest)
+        shifted = price - self.pivot
+        self.window.append(shifted)
+        self.window_sum.add(shifted)
+        self.square_sum.add(shifted * shifted)
+        if len(self.window) < self.period:
+            self.value = None
+            return self.value
+        mean = self.window_sum.value / self.period
+        # Rounding can leave a flat window slightly below zero
+        variance = max(self.square_sum.value / self.period - mean * mean, 0.0)
+        sma = self.pivot + mean
+        standard_deviation = variance ** 0.5
+        self.value = (sma + (standard_deviation * 2), sma, sma - (standard_deviation * 2))
+        return self.value
+
+    def seed(self, prices):
+        for price in list(prices)[-self.period:]:
+            self.update(price)
+        return self.value
+
+
+class StreamingATR:
+    # Running mean of the true range over the last `period` bars, like calculate_atr (min_periods=1); the
+    # compensated sum keeps ranges that left the window from drifting the mean
+    def __init__(self, period=14):
+        self.period = period
+        self.ranges = deque(maxlen=period)
+        self.range_sum = _CompensatedSum()
+        self.prev_close = None
+        self.value = None
+
+    def update(self, high, low, close):
+        true_range = high - low
+        if self.prev_close is not None:
+            true_range = max(true_range, abs(high - self.prev_close), abs(low - self.prev_close))
+        if len(self.ranges) == self.period:
+            self.range_sum.add(-self.ranges[0])
+        self.ranges.append(true_range)
+        self.range_sum.add(true_range)
+        self.prev_close = close
+        self.value = self.range_sum.value / len(self.ranges)
+        return self.value
+
+    def seed(self, highs, lows, closes):
+        for high, low, close in zip(highs, lows, closes):
+            self.update(high, low, close)
+        return self.value
+
+
+class StreamingRSI:
+    # Simple-average RSI like calculate_rsi; the first bar counts as a zero change, as in the pandas version.
+    # Compensated sums bring the averages back to exactly zero once a window has no gains (or losses)
+    def __init__(self, window=14):
+        self.window = window
+        self.gains = deque(maxlen=window)
+        self.losses = deque(maxlen=window)
+        self.gain_sum = _CompensatedSum()
+        self.loss_sum = _CompensatedSum()
+        self.prev_price = None
+        self.value = None
+
+    def update(self, price):
+        delta = 0.0 if self.prev_price is None else price - self.prev_price
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if len(self.gains) == self.window:
+            self.gain_sum.add(-self.gains[0])
+            self.loss_sum.add(-self.losses[0])
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.gain_sum.add(gain)
+        self.loss_sum.add(loss)
+        self.prev_price = price
+
+        avg_gain = self.gain_sum.value / len(self.gains)
+        avg_loss = self.loss_sum.value / len(self.losses)
+        if avg_loss == 0:
+            self.value = 100.0 if avg_gain > 0 else float('nan')
+        else:
+            self.value = 100 - (100 / (1 + avg_gain / avg_loss))
+        return self.value
+
+    def seed(self, prices):
+        for price in prices:
+            self.update(price)
+        return self.value
+
+
+class StreamingVWAP:
+    # window=None accumulates from the first bar; otherwise only the last `window` bars count
+    def __init__(self, window=None):
+        self.window = window
+        self.bars = deque(maxlen=window) if window else None
+        self.price_volume = 0.0
+        self.total_volume = 0.0
+        self.value = None
+
+    def update(self, price, volume):
+        if self.bars is not None:
+            if len(self.bars) == self.window:
+                old_price, old_volume = self.bars[0]
+                self.price_volume -= old_price * old_volume
+                self.total_volume -= old_volume
+            self.bars.append((price, volume))
+        self.price_volume += price * volume
+        self.total_volume += volume
+        self.value = self.price_volume / self.total_volume if self.total_volume else None
+        return self.value
+
+    def seed(self, prices, volume_data):
+        for price, volume in zip(prices, volume_data):
+            self.update(price, volume)
+        return self.value
+
+
+class StreamingSupertrend:
+    # Same band recursion as calculate_supertrend, driven by a StreamingATR
+    def __init__(self, atr_period=14, multiplier=3):
+        self.atr = StreamingATR(atr_period)
+        self.multiplier = multiplier
+        self.supertrend = None
+        self.direction = None
+
+    def update(self, high, low, close):
+        atr = self.atr.update(high, low, close)
+        hl2 = (high + low) / 2
+        upper_band = hl2 + (self.multiplier * atr)
+        lower_band = hl2 - (self.multiplier * atr)
+
+        if self.supertrend is None:
+            self.supertrend = lower_band
+            self.direction = 1 if close > upper_band else -1
+            return self.supertrend, self.direction
+
+        prev_supertrend, prev_direction = self.supertrend, self.direction
+        if prev_direction == 1:
+            supertrend = max(lower_band, prev_supertrend)
+        else:
+            supertrend = min(upper_band, prev_supertrend)
+
+        if close > supertrend:
+            direction = 1
+        elif close < supertrend:
+            direction = -1
+        else:
+            direction = prev_direction
+
+        if direction != prev_direction:
+            supertrend = prev_supertrend
+
+        self.supertrend, self.direction = supertrend, direction
+        return self.supertrend, self.direction
+
+    def seed(self, highs, lows, closes):
+        for high, low, close in zip(highs, lows, closes):
+            self.update(high, low, close)
+        return self.supertrend, self.direction
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import atexit
+import struct
+import threading
+from datetime import datetime
+
+# Record kinds: channel (request/response socket, stream socket or async request socket) and direction
+REQUEST = 0
+RESPONSE = 1
+STREAM_SENT = 2
+STREAM_MESSAGE = 3
+# AsyncAPIClient requests carry a customTag and their replies may arrive in any order
+ASYNC_REQUEST = 4
+ASYNC_RESPONSE = 5
+
+MAGIC = b'XJRN\x01'
+FILE_HEADER = struct.Struct('<qq')  # wall clock and monotonic clock at open, both in ns
+RECORD_HEADER = struct.Struct('<BqI')  # kind, monotonic ns, payload length
+
+# Requests answered out of band; a replay skips them when the bot did not ask for them
+UNSOLICITED_COMMANDS = ('login', 'logout', 'ping')
+
+# Stream commands -> APIStreamClient callback names
+STREAM_CALLBACKS = {'tickPrices': 'tickFun', 'trade': 'tradeFun', 'balance': 'balanceFun',
+                    'tradeStatus': 'tradeStatusFun', 'profit': 'profitFun', 'news': 'newsFun'}
+
+
+class Journal:
+    """
+    Append-only binary record of everything sent and received on the xAPI sockets. Each record is
+    a fixed header (kind, monotonic timestamp, length) followed by the raw JSON frame, so recording
+    costs one struct.pack and one buffered write. Pass it as `journal=` to APIClient, APIStreamClient
+    or AsyncAPIClient; login passwords are masked before they are written.
+    """
+
+    def __init__(self, path, buffering=1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._file = open(path, 'wb', buffering=buffering)
+        self._file.write(MAGIC + FILE_HEADER.pack(time.time_ns(), time.monotonic_ns()))
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def record(self, kind, payload):
+        """Append one raw frame (bytes)."""
+        header = RECORD_HEADER.pack(kind, time.monotonic_ns(), len(payload))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(header + payload)
+
+    def record_sent(self, kind, obj, msg):
+        """Append an outgoing message, given both as the dict and as its encoded JSON."""
+        if obj.get('command') == 'login':
+            msg = json.dumps(dict(obj, arguments=dict(obj.get('arguments', {}), password='***'))).encode('utf-8')
+        self.record(kind, msg)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_journal(path):
+    """Yield (kind, wall-clock time in ns, payload bytes) for every record in a journal file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a journal file")
+    wall_ns, mono_ns = FILE_HEADER.unpack_from(data, len(MAGIC))
+    offset = len(MAGIC) + FILE_HEADER.size
+    # A truncated last record (process killed mid-write) is ignored
+    while offset + RECORD_HEADER.size <= len(data):
+        kind, ts, size = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if offset + size > len(data):
+            break
+        yield kind, wall_ns + ts - mono_ns, data[offset:offset + size]
+        offset += size
+
+
+class ReplayClient:
+    """
+    Stands in for APIClient and answers execute() with the responses recorded in a journal, in order
+    and without waiting, so a session replays deterministically at full speed. Stream messages
+    recorded before a response are passed to the callbacks given to set_stream_handlers() first,
+    keeping the original interleaving. now() is the recorded time of the last reply, for use as the
+    bot's clock. execute() raises EOFError once the journal is exhausted, and ConnectionError where the
+    recorded request got no reply because its connection was lost.
+    """
+
+    def __init__(self, path, strict=True):
+        self.path = path
+        self.strict = strict
+        self._records = list(read_journal(path))
+        self._cursor = 0
+        self._handlers = {}
+        self._time_ns = self._records[0][1] if self._records else time.time_ns()
+        self.rateLimiter = None
+        self.lastThrottle = 0.0
+        self.totalThrottle = 0.0
+
+    def set_stream_handlers(self, **handlers):
+        """Callbacks named like APIStreamClient's (tickFun=..., tradeFun=..., profitFun=..., ...)."""
+        self._handlers = {command: handlers[name] for command, name in STREAM_CALLBACKS.items() if handlers.get(name)}
+
+    def _dispatch(self, payload):
+        msg = json.loads(payload)
+        handler = self._handlers.get(msg.get('command'))
+        if handler is not None:
+            handler(msg)
+
+    def _next(self, kind):
+        while self._cursor < len(self._records):
+            record_kind, ts, payload = self._records[self._cursor]
+            self._cursor += 1
+            if record_kind == kind:
+                self._time_ns = ts
+                return json.loads(payload)
+            if record_kind == STREAM_MESSAGE:
+                self._time_ns = ts
+                self._dispatch(payload)
+            elif record_kind == REQUEST and kind == RESPONSE:
+                # The next request was sent without a reply to this one; it is left for the next execute()
+                self._cursor -= 1
+                raise ConnectionError(f"journal {self.path}: no reply was recorded for this request")
+        raise EOFError(f"journal {self.path} exhausted")
+
+    def execute(self, dictionary):
+        command = dictionary.get('command')
+        request = self._next(REQUEST)
+        while request.get('command') != command and request.get('command') in UNSOLICITED_COMMANDS:
+            self._next(RESPONSE)
+            request = self._next(REQUEST)
+        if self.strict and request.get('command') != command:
+            raise RuntimeError(f"Replay diverged: bot sent {command}, journal has {request.get('command')}")
+        return self._next(RESPONSE)
+
+    def commandExecute(self, commandName, arguments=None):
+        return self.execute(dict(command=commandName, arguments=arguments or {}))
+
+    def drain_stream(self):
+        """Deliver the stream messages left after the last response."""
+        while self._cursor < len(self._records):
+            kind, ts, payload = self._records[self._cursor]
+            self._cursor += 1
+            if kind == STREAM_MESSAGE:
+                self._time_ns = ts
+                self._dispatch(payload)
+
+    def now(self):
+        return datetime.fromtimestamp(self._time_ns / 1e9)
+
+    def disconnect(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncReplayClient:
+    """
+    Stands in for AsyncAPIClient next to a ReplayClient, answering from the ASYNC_REQUEST and
+    ASYNC_RESPONSE records of the same journal. Requests are matched in the order they were sent and
+    each reply is found by the request's customTag, so replies that arrived out of order are paired
+    correctly. Raises ConnectionError for a request that got no reply and EOFError at the end.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.path = client.path
+        self.strict = client.strict
+        # [request, (ts, reply) or None] in send order. Tags restart with every new connection, so a
+        # reply is paired with the latest request sent with its tag that is still unanswered.
+        self._requests = []
+        pending = {}
+        for kind, ts, payload in client._records:
+            if kind == ASYNC_REQUEST:
+                entry = [json.loads(payload), None]
+                self._requests.append(entry)
+                pending[entry[0].get('customTag')] = entry
+            elif kind == ASYNC_RESPONSE:
+                msg = json.loads(payload)
+                entry = pending.pop(msg.get('customTag'), None)
+                if entry is not None:
+                    entry[1] = (ts, msg)
+        self._cursor = 0
+        self.connected = True
+        self.rateLimiter = None
+
+    def _next(self):
+        if self._cursor >= len(self._requests):
+            raise EOFError(f"journal {self.path} exhausted")
+        self._cursor += 1
+        return self._requests[self._cursor - 1]
+
+    async def execute(self, dictionary):
+        command = dictionary.get('command')
+        request, reply = self._next()
+        while request.get('command') != command and request.get('command') in UNSOLICITED_COMMANDS:
+            request, reply = self._next()
+        if self.strict and request.get('command') != command:
+            raise RuntimeError(f"Replay diverged: bot sent {command}, journal has {request.get('command')}")
+        if reply is None:
+            raise ConnectionError(f"journal {self.path}: no reply was recorded for this request")
+        ts, resp = reply
+        self.client._time_ns = max(self.client._time_ns, ts)
+        return resp
+
+    async def commandExecute(self, commandName, arguments=None):
+        return await self.execute(dict(command=commandName, arguments=arguments or {}))
+
+    async def disconnect(self):
+        pass
+
+
+def replay(path, symbol="US500", **bot_kwargs):
+    """
+    Run main.TradingBot's polling cycle against a recorded session until the journal runs out; returns
+    the bot. A session recorded with --async is replayed through an AsyncReplayClient as well.
+    """
+    import asyncio
+    from main import TradingBot
+
+    client = ReplayClient(path)
+    if any(kind == ASYNC_REQUEST for kind, _, _ in client._records):
+        bot_kwargs = dict(bot_kwargs, async_client=AsyncReplayClient(client), event_loop=asyncio.new_event_loop())
+    bot = None
+    cycles = 0
+    try:
+        bot = TradingBot(client, symbol, **bot_kwargs)
+        while True:
+            bot.last_trade_action = 'None'
+            try:
+                if bot.fetch_and_prepare_data():
+                    bot.evaluate_and_trade(client.now())
+                    cycles += 1
+            except ConnectionError as e:
+                # The recorded cycle failed the same way; the session went on with the next one
+                print(f"Recorded cycle failed: {e}")
+    except EOFError:
+        pass
+    finally:
+        if bot_kwargs.get('event_loop') is not None:
+            bot_kwargs['event_loop'].close()
+    print(f"Replayed {cycles} cycles from {path}")
+    return bot
+
+
+if __name__ == "__main__":
+    import sys
+    replay(sys.argv[1], *sys.argv[2:3])
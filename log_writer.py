@@ -0,0 +1,143 @@
+import os
+import csv
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+
+
+class LogWriter:
+    """
+    Append-only row log. write() only appends the row to an in-memory buffer; a background thread
+    writes the buffer out in batches every `flush_interval` seconds, so the cost per row does not
+    depend on how many rows were logged before. If the buffer reaches `max_rows` before the thread
+    gets to it, write() flushes inline instead of dropping rows.
+
+    Files are named <base>-YYYYMMDD[-N]<ext> and rotate when the day changes or a file passes
+    `max_bytes`. With columnar=True batches are written as Parquet row groups (needs pyarrow).
+    Columns are taken from `columns`, or from the keys of the first row.
+    """
+
+    def __init__(self, path=os.path.join('logs', 'trading_log.csv'), columns=None, max_bytes=50 * 1024 * 1024,
+                 rotate_daily=True, flush_interval=5.0, max_rows=10000, columnar=False):
+        base, ext = os.path.splitext(path)
+        self.base = base
+        self.ext = '.parquet' if columnar else (ext or '.csv')
+        self.columns = list(columns) if columns else None
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.columnar = columnar
+        self.path = None
+        self._rows = deque()
+        self._lock = threading.Lock()  # guards _rows
+        self._io_lock = threading.Lock()  # one batch written at a time
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._file = None  # text file for CSV, pyarrow ParquetWriter for columnar
+        self._schema = None
+        self._day = None
+        self._part = 0
+
+    def write(self, row):
+        """Queue one row: a mapping, or a sequence in the order of `columns`."""
+        if not hasattr(row, 'keys'):
+            row = dict(zip(self.columns, row))
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+        if self._thread is None:
+            self._start()
+        if full:
+            self.flush()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Failed to flush log {self.path}: {str(e)}")
+
+    def flush(self):
+        """Write every buffered row now."""
+        with self._io_lock:
+            with self._lock:
+                rows, self._rows = self._rows, deque()
+            if rows:
+                self._write_batch(list(rows))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        with self._io_lock:
+            self._close_file()
+
+    def _file_path(self):
+        suffix = f"-{self._part}" if self._part else ""
+        return f"{self.base}-{self._day:%Y%m%d}{suffix}{self.ext}"
+
+    def _full(self, path):
+        # Parquet files cannot be appended to once closed, so an existing one always counts as full
+        return os.path.exists(path) and (self.columnar or os.path.getsize(path) >= self.max_bytes)
+
+    def _open(self, day):
+        if day != self._day:
+            self._day, self._part = day, 0
+        while self._full(self._file_path()):
+            self._part += 1
+        self.path = self._file_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.columnar:
+            import pyarrow.parquet as pq
+            self._file = pq.ParquetWriter(self.path, self._schema)
+        else:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._file = open(self.path, 'a', newline='')
+            if new_file:
+                csv.writer(self._file).writerow(self.columns)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, rows):
+        if self.columns is None:
+            self.columns = list(rows[0])
+        table = None
+        if self.columnar:
+            import pyarrow as pa
+            table = pa.Table.from_pylist([{name: row.get(name) for name in self.columns} for row in rows],
+                                         schema=self._schema)
+            self._schema = table.schema
+
+        day = datetime.now().date() if self.rotate_daily else (self._day or datetime.now().date())
+        if self._file is not None and (day != self._day or os.path.getsize(self.path) >= self.max_bytes):
+            self._close_file()
+        if self._file is None:
+            self._open(day)
+
+        if self.columnar:
+            self._file.write_table(table)
+        else:
+            csv.writer(self._file).writerows([row.get(name) for name in self.columns] for row in rows)
+            self._file.flush()
@@ -7,11 +7,25 @@ import math
 import csv
 import datetime
 
-def login_to_xtb(userId, password):
-    client = APIClient()
+from async_client import AsyncAPIClient
+
+def login_to_xtb(userId, password, journal=None, **client_kwargs):
+    # client_kwargs go to APIClient, e.g. address/port/encrypt for the simulated server
+    client = APIClient(journal=journal, **client_kwargs)
     response = client.execute(loginCommand(userId=userId, password=password))
     if not response['status']:
         print(f'Login failed. Error code: {response["errorCode"]}')
         return None, None
     ssid = response['streamSessionId']
-    return client, ssid
\ No newline at end of file
+    return client, ssid
+
+
+async def login_to_xtb_async(userId, password, journal=None, **client_kwargs):
+    client = await AsyncAPIClient(journal=journal, **client_kwargs).connect()
+    response = await client.execute(loginCommand(userId=userId, password=password))
+    if not response['status']:
+        print(f'Login failed. Error code: {response["errorCode"]}')
+        await client.disconnect()
+        return None, None
+    ssid = response['streamSessionId']
+    return client, ssid
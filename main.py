@@ -2,6 +2,9 @@ from xAPIConnector import *
 import time
 import os
 import math
+import sys
+import queue
+import asyncio
 import traceback
 import pandas as pd
 import numpy as np
@@ -10,19 +13,55 @@ from datetime import datetime, timedelta
 from collections import deque
 import json
 
-from fetch_data import get_last_period_prices, get_current_positions, seconds_until_next_minute
-from file_ops import write_to_csv
-from indicators import calculate_macd, calculate_atr, calculate_rsi, calculate_vwap, calculate_sma, calculate_supertrend
-from login import login_to_xtb
-from trade import open_trade, close_all_trades, close_trade, partial_close_trade, modify_trade
+from fetch_data import DeltaChartFetcher, get_current_positions, seconds_until_next_minute, fetch_cycle_data_async
+from file_ops import get_log_writer
+from indicators import calculate_macd, calculate_atr, calculate_rsi, calculate_vwap, calculate_sma, calculate_supertrend, \
+    StreamingATR, StreamingRSI, StreamingSupertrend
+from indicator_cache import INDICATOR_CACHE
+from login import login_to_xtb, login_to_xtb_async
+from journal import Journal
+from session import SessionManager
+from metrics import REGISTRY, CYCLE_PHASE_SECONDS, CYCLE_DRIFT_SECONDS
+from bar_stream import BarPipeline
+from position_book import PositionBook
+from trade import close_all_trades, close_trade
+from action_scheduler import ActionScheduler
+
+# Bars per timeframe the strategy's indicators are computed over, in every run mode. Supertrend and
+# ATR depend on where their recursion starts, so the window is part of the strategy.
+INDICATOR_WINDOW = 60
+
+# Seconds per failed attempt to wait before retrying a cycle on a SessionManager, whose standby has
+# already replaced a dropped connection
+SESSION_RETRY_BACKOFF = 1
+
+
+def indicator_windows(bars_1m, bars_5m, window=INDICATOR_WINDOW):
+    """
+    prepare_indicators arguments from 1m and 5m bars (dicts of arrays): the last `window` closes, highs
+    and lows of each timeframe, then their bar times. Slices are views, not copies.
+    """
+    return (bars_1m['close'][-window:], bars_1m['high'][-window:], bars_1m['low'][-window:],
+            bars_5m['close'][-window:], bars_5m['high'][-window:], bars_5m['low'][-window:],
+            bars_1m['ctm'][-window:], bars_5m['ctm'][-window:])
 
 
 class TradingBot:
     def __init__(self, client, symbol, crossover_threshold=0.1, atr_threshold=1, profit_threshold=3,
                  second_profit_threshold=40, loss_threshold=-40, partial_close_volume_profitable=0.01,
-                 partial_close_volume_losing=0.01, volume=0.01):
+                 partial_close_volume_losing=0.01, volume=0.01, async_client=None, event_loop=None,
+                 indicator_cache=INDICATOR_CACHE):
         self.volume = volume
         self.client = client
+        # Optional AsyncAPIClient (and the loop it was connected on) used to fetch each cycle's data concurrently
+        self.async_client = async_client
+        self.event_loop = event_loop
+        # 1m history for INDICATOR_WINDOW 5m bars plus room for a bucket boundary; the 5m bars are
+        # resampled incrementally as 1m bars arrive
+        self.chart_fetcher = DeltaChartFetcher(capacity=INDICATOR_WINDOW * 5 + 5, resample=(5,))
+        # Indicator state per last closed bar, so cycles (and retries) without a new closed bar only
+        # recompute the forming bar; None recomputes every window from scratch
+        self.indicator_cache = indicator_cache
         self.symbol = symbol
         self.crossover_threshold = crossover_threshold
         self.atr_threshold = atr_threshold
@@ -32,14 +71,14 @@ class TradingBot:
         self.partial_close_volume_profitable = partial_close_volume_profitable
         self.partial_close_volume_losing = partial_close_volume_losing
         self.prev_histogram = None
+        self.last_trade_time = datetime.min
         self.trade_just_opened = False
         self.last_trade_action = 'None'
-        self.data_log = pd.DataFrame()
+        # Rows are buffered and written by a background thread; nothing is created until the first row
+        self.data_log = get_log_writer(os.path.join('logs', f'trading_log_{symbol}.csv'))
 
-        # New additions for rate limiting and action queue
-        self.last_action_time = time.time()
+        # Request pacing is handled by the client's rate limiter
         self.action_queue = deque()
-        self.min_action_interval = 5  # Minimum time between actions in seconds
 
         # Initialize these attributes
         self.prices = None
@@ -55,31 +94,43 @@ class TradingBot:
 
         # Initialize profit history tracking
         self.trade_profit_history = {}  # Store the last two profit values for each trade
+        # Closes, SL/TP changes and new orders decided in a cycle, sent together at its end
+        self.action_scheduler = ActionScheduler()
 
         # Fetch initial data
         self.fetch_and_prepare_data()
 
         self.trade_profit_timestamps = {}  # Track profit timestamps for each trade
 
-    def fetch_and_prepare_data(self, print_positions=False):
-        # Fetch 1-minute data
-        response_1m = get_last_period_prices(self.client, self.symbol, period=1)
-        if not response_1m or len(response_1m) != 6:
+    def fetch_and_prepare_data(self, print_positions=False, positions=None):
+        # positions may be passed in when a caller already fetched them (e.g. the multi-symbol orchestrator)
+        # 5m bars are built from the 1m history, so one chart request per cycle is enough. After the first
+        # cycle the request only covers the bars since the last one held.
+        with CYCLE_PHASE_SECONDS.time(self.symbol, 'fetch'):
+            if self.async_client is not None:
+                # 1m chart and open trades in flight together on the async connection
+                bars_1m, positions = self.event_loop.run_until_complete(
+                    fetch_cycle_data_async(self.async_client, self.symbol, self.chart_fetcher))
+            else:
+                bars_1m = self.chart_fetcher.update(self.client, self.symbol, 1)
+
+        if bars_1m is None or len(bars_1m['close']) == 0:
             print("Failed to fetch 1-minute data.")
             return False
 
-        prices_1m, latest_open_1m, latest_close_1m, highs_1m, lows_1m, volume_1m = response_1m
-
-        time.sleep(2)
+        with CYCLE_PHASE_SECONDS.time(self.symbol, 'indicators'):
+            bars_5m = self.chart_fetcher.resampled(self.symbol, 5)
+            # Views into the fetcher's ring buffers, not copies
+            if not self.prepare_indicators(*indicator_windows(bars_1m, bars_5m)):
+                return False
 
-        # Fetch 5-minute data
-        response_5m = get_last_period_prices(self.client, self.symbol, period=5)
-        if not response_5m or len(response_5m) != 6:
-            print("Failed to fetch 5-minute data.")
-            return False
+        self.latest_close = float(bars_1m['close'][-1])
+        with CYCLE_PHASE_SECONDS.time(self.symbol, 'positions'):
+            self.refresh_positions(print_positions, positions)
 
-        prices_5m, _, _, highs_5m, lows_5m, _ = response_5m
+        return True  # Indicate success
 
+    def prepare_indicators(self, prices_1m, highs_1m, lows_1m, prices_5m, highs_5m, lows_5m, ctm_1m=None, ctm_5m=None):
         # Ensure sufficient data
         if len(prices_1m) < 14 or len(highs_1m) < 14 or len(lows_1m) < 14:
             print("Not enough 1-minute data points for calculations.")
@@ -89,6 +140,19 @@ class TradingBot:
             print("Not enough 5-minute data points for calculations.")
             return False
 
+        if self.indicator_cache is not None and ctm_1m is not None and ctm_5m is not None:
+            # The streaming indicators follow the same recursions as the calculate_* functions below
+            cache = self.indicator_cache
+            self.atr_value = cache.get(self.symbol, 1, StreamingATR, (14,), ctm_1m, highs_1m, lows_1m, prices_1m)
+            _, self.supertrend_direction_1m = cache.get(self.symbol, 1, StreamingSupertrend, (14, 3), ctm_1m,
+                                                        highs_1m, lows_1m, prices_1m)
+            self.rsi = cache.get(self.symbol, 1, StreamingRSI, (14,), ctm_1m, prices_1m)
+            _, self.supertrend_direction_5m = cache.get(self.symbol, 5, StreamingSupertrend, (14, 3), ctm_5m,
+                                                        highs_5m, lows_5m, prices_5m)
+            self.highs = highs_1m
+            self.lows = lows_1m
+            return True
+
         # Calculate indicators for 1-minute data
         atr_1m = calculate_atr(highs_1m, lows_1m, prices_1m)
         supertrend_1m, supertrend_direction_1m = calculate_supertrend(highs_1m, lows_1m, prices_1m, atr_1m)
@@ -99,14 +163,16 @@ class TradingBot:
         supertrend_5m, supertrend_direction_5m = calculate_supertrend(highs_5m, lows_5m, prices_5m, atr_5m)
 
         # Store calculated values
-        self.latest_close = latest_close_1m
         self.atr_value = atr_1m.iloc[-1]
         self.supertrend_direction_1m = supertrend_direction_1m[-1]
         self.supertrend_direction_5m = supertrend_direction_5m[-1]
         self.highs = highs_1m
         self.lows = lows_1m
         self.rsi = rsi
-        self.positions = get_current_positions(self.client)
+        return True
+
+    def refresh_positions(self, print_positions=False, positions=None):
+        self.positions = positions if positions is not None else get_current_positions(self.client, self.symbol)
 
         if print_positions:
             print("Current Positions:")
@@ -115,8 +181,6 @@ class TradingBot:
             print(f"Long profits: {self.positions['long_profits']}")
             print(f"Short profits: {self.positions['short_profits']}")
 
-        return True  # Indicate success
-
     def open_position(self, position_type, order_type='market', entry_price=None):
         recent_high, recent_low = max(self.highs[-10:]), min(self.lows[-10:])
         recent_range = recent_high - recent_low
@@ -140,10 +204,8 @@ class TradingBot:
         sl_value = entry_price + (-1.2 if position_type == 'long' else 1.2) * recent_range
         trade_direction = self.volume if position_type == 'long' else -self.volume
 
-        time.sleep(2)
-
-        open_trade(self.client, self.symbol, trade_direction, entry_price, self.latest_close, offset, tp_value, sl_value, order_type)
-        print(f"Opening {position_type} position as {order_type} order with volume {self.volume}, Entry Price: {round(entry_price, 2)}, TP: {round(tp_value, 2)}, SL: {round(sl_value, 2)}")
+        self.action_scheduler.open(self.symbol, trade_direction, entry_price, self.latest_close, offset, tp_value, sl_value, order_type)
+        print(f"Queued opening {position_type} position as {order_type} order with volume {self.volume}, Entry Price: {round(entry_price, 2)}, TP: {round(tp_value, 2)}, SL: {round(sl_value, 2)}")
         self.last_trade_action = f"{position_type.capitalize()} {order_type.capitalize()} Opened"
 
     def close_partial_position(self, direction, reason):
@@ -159,10 +221,9 @@ class TradingBot:
                 # Ensure close_volume is at least min_trade_size and not more than current_volume
                 close_volume = max(min(close_volume, current_volume), min_trade_size)
                 cmd = 0 if direction == 'long' else 1  # 0 for closing long, 1 for closing short
-                response = partial_close_trade(self.client, self.symbol, order_id, close_volume, cmd)
+                self.action_scheduler.close(self.symbol, order_id, close_volume, cmd)
                 print(
-                    f"Attempting to partially close {direction} position with order ID {order_id} due to total {reason}. Close volume: {close_volume}.")
-                print(f"Response: {response}")
+                    f"Queued partial close of {direction} position with order ID {order_id} due to total {reason}. Close volume: {close_volume}.")
             else:
                 print(
                     f"Cannot partially close {direction} trade {order_id}; current volume {current_volume} is less than minimum trade size {min_trade_size}.")
@@ -214,19 +275,12 @@ class TradingBot:
                     new_sl = round(new_sl, 1)
                     current_tp = round(current_tp, 1) if current_tp else 0.0
                     
-                    modify_response = modify_trade(
-                        self.client, 
-                        order_id, 
-                        0,  # offset
-                        new_sl, 
-                        current_tp, 
-                        trade['volume']
-                    )
-                    print(f"Break-even SL modification response: {modify_response}")
+                    # Same arguments modify_trade was called with: the rounded current TP and the trade's volume
+                    self.action_scheduler.modify(order_id, self.symbol, trade['volume'], current_sl, current_tp, sl=new_sl)
+                    print(f"Queued break-even SL {new_sl} for trade {order_id}")
                     
                     # Mark SL as adjusted
                     trade['sl_adjusted'] = True
-                    time.sleep(1)
 
                 # If this is the first time seeing this trade, initialize its profit history
                 if order_id not in self.trade_profit_history:
@@ -241,9 +295,6 @@ class TradingBot:
                     print(f"Trade {order_id}: Profit hasn't increased compared to the last two records.")
                     print(f"Current TP: {current_tp}")
 
-                    # Offset to avoid overloading the server with too many requests at once
-                    time.sleep(2)
-
                     # Adjust only take profit based on direction
                     if direction == 'long_profits':
                         # Decrease TP for long trades
@@ -257,9 +308,10 @@ class TradingBot:
                     # Ensure values are rounded properly
                     new_tp = round(new_tp, 1)  # Round TP to one decimal place
 
-                    # Use modify_trade to update only TP, keeping existing SL
-                    modify_response = modify_trade(self.client, order_id, 0, current_sl, new_tp, 0.01)
-                    print(f"Modified trade {order_id}: adjusted TP to {new_tp}. Response: {modify_response}")
+                    # Update only TP, with the fixed 0.01 volume modify_trade was called with. A break-even SL
+                    # queued above is merged into the same modification, which keeps that one's volume.
+                    self.action_scheduler.modify(order_id, self.symbol, 0.01, current_sl, current_tp, tp=new_tp)
+                    print(f"Queued TP {new_tp} for trade {order_id}")
 
                 # Always update the profit history with the current profit
                 self.trade_profit_history[order_id].append(current_profit)
@@ -293,12 +345,7 @@ class TradingBot:
             'Overall Total Profit': round(total_long_profit + total_short_profit, 2),
             'Trade Executed': self.last_trade_action
         }
-        new_entry = pd.DataFrame([data])
-        self.data_log = pd.concat([self.data_log, new_entry], ignore_index=True)
-        if len(self.data_log) % 5 == 0:
-            self.data_log.to_csv('C:/Users/Asus/OneDrive/Pulpit/Rozne/Python/XTB/_script/excel/trading_log.csv',
-                                 index=False)
-            print("Data log saved to Excel.")
+        self.data_log.write(data)
 
     def manage_positions(self):
         long_profit = sum(trade['profit'] for trade in self.positions['long_profits'])
@@ -307,12 +354,6 @@ class TradingBot:
         print(f"Total Long Profit: {round(long_profit, 2)}")
         print(f"Total Short Profit: {round(short_profit, 2)}")
 
-        current_time = time.time()
-        if current_time - self.last_action_time < self.min_action_interval:
-            print(
-                f"Waiting {self.min_action_interval - (current_time - self.last_action_time):.2f} seconds before next action")
-            return
-
         if long_profit <= -60:
             self.action_queue.append(('long', 'loss'))
         elif long_profit >= 90:
@@ -326,15 +367,77 @@ class TradingBot:
         if self.action_queue:
             direction, reason = self.action_queue.popleft()
             self.close_partial_position(direction, reason)
-            self.last_action_time = time.time()
+
+    def evaluate_and_trade(self, current_time, flush=True):
+        # flush=False leaves the decided actions in action_scheduler for the caller to send
+        print("-" * 50)
+        print(f"Checking conditions at {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Latest Close: {round(self.latest_close, 2)}")
+        print(f"ATR: {round(self.atr_value, 2)}")
+        print(f"RSI: {round(self.rsi, 2)}")
+        print(f"Supertrend 1m Direction: {self.supertrend_direction_1m}")
+        print(f"Supertrend 5m Direction: {self.supertrend_direction_5m}")
+
+        with CYCLE_PHASE_SECONDS.time(self.symbol, 'manage_positions'):
+            self.manage_positions()
+
+        with CYCLE_PHASE_SECONDS.time(self.symbol, 'monitor_and_reduce_tp'):
+            self.monitor_and_reduce_tp()
+
+        # Entry Condition with 5-minute Confirmation and RSI Filter
+        if (current_time - self.last_trade_time).total_seconds() >= 59 and self.atr_value > 0.5:
+            if self.supertrend_direction_1m == 1 and self.supertrend_direction_5m == 1 and self.rsi < 60:
+                self.open_position('long', 'pending')
+                print("Attempted to set long pending order.")
+                self.last_trade_time = current_time
+            elif self.supertrend_direction_1m == -1 and self.supertrend_direction_5m == -1 and self.rsi > 40:
+                self.open_position('short', 'pending')
+                print("Attempted to set short pending order.")
+                self.last_trade_time = current_time
+            else:
+                if self.rsi >= 60:
+                    print("RSI above 60, preventing long position.")
+                elif self.rsi <= 40:
+                    print("RSI below 40, preventing short position.")
+                else:
+                    print("Supertrend directions do not align. No trade executed.")
+
+        if flush:
+            with CYCLE_PHASE_SECONDS.time(self.symbol, 'order_send'):
+                self.action_scheduler.flush(self.client)
+
+    def reconnect_async(self):
+        """
+        Replace an async_client whose connection broke with a new login on event_loop. If that login
+        fails, async_client is dropped and the cycle data is fetched through client instead.
+        """
+        if self.async_client is None or self.async_client.connected:
+            return
+        old = self.async_client
+        self.async_client = None
+        self.event_loop.run_until_complete(old.disconnect())
+        try:
+            self.async_client, _ = self.event_loop.run_until_complete(login_to_xtb_async(
+                userId, password, old.journal, address=old.address, port=old.port, encrypt=old.encrypt))
+        except OSError as e:
+            print(f"Async re-login failed ({e}), fetching through the synchronous client.")
+            return
+        if self.async_client is None:
+            print("Async re-login failed, fetching through the synchronous client.")
 
     def run(self):
-        last_trade_time = datetime.min
         reconnection_attempts = 0
         retry_attempts = 3
 
         while True:
+            failovers = getattr(self.client, 'failovers', 0)
             try:
+                # How late this cycle starts relative to the minute boundary it was scheduled for
+                drift = time.time() % 60
+                CYCLE_DRIFT_SECONDS.set(drift, self.symbol)
+                print(f"Cycle started {drift:.3f} s after the minute boundary.")
+                cycle_start = time.perf_counter()
+
                 self.last_trade_action = 'None'
                 data_ready = self.fetch_and_prepare_data(print_positions=True)
                 if not data_ready:
@@ -342,36 +445,9 @@ class TradingBot:
                     time.sleep(2)
                     continue
 
-                current_time = datetime.now()
-                print("-" * 50)
-                print(f"Checking conditions at {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                print(f"Latest Close: {round(self.latest_close, 2)}")
-                print(f"ATR: {round(self.atr_value, 2)}")
-                print(f"RSI: {round(self.rsi, 2)}")
-                print(f"Supertrend 1m Direction: {self.supertrend_direction_1m}")
-                print(f"Supertrend 5m Direction: {self.supertrend_direction_5m}")
-
-                self.manage_positions()
-
-                self.monitor_and_reduce_tp()
-
-                # Entry Condition with 5-minute Confirmation and RSI Filter
-                if (current_time - last_trade_time).total_seconds() >= 59 and self.atr_value > 0.5:
-                    if self.supertrend_direction_1m == 1 and self.supertrend_direction_5m == 1 and self.rsi < 60:
-                        self.open_position('long', 'pending')
-                        print("Attempted to set long pending order.")
-                        last_trade_time = current_time
-                    elif self.supertrend_direction_1m == -1 and self.supertrend_direction_5m == -1 and self.rsi > 40:
-                        self.open_position('short', 'pending')
-                        print("Attempted to set short pending order.")
-                        last_trade_time = current_time
-                    else:
-                        if self.rsi >= 60:
-                            print("RSI above 60, preventing long position.")
-                        elif self.rsi <= 40:
-                            print("RSI below 40, preventing short position.")
-                        else:
-                            print("Supertrend directions do not align. No trade executed.")
+                self.evaluate_and_trade(datetime.now())
+                CYCLE_PHASE_SECONDS.observe(time.perf_counter() - cycle_start, self.symbol, 'cycle')
+                reconnection_attempts = 0
 
                 sleep_time = seconds_until_next_minute() + 1
                 print(f"Sleeping for {sleep_time} seconds.")
@@ -380,23 +456,143 @@ class TradingBot:
             except Exception as e:
                 print(f"An unexpected error occurred: {str(e)}")
                 traceback.print_exc()
-                reconnection_attempts += 1
+                session = self.client if isinstance(self.client, SessionManager) else None
+                # A failover during the cycle is a recovered connection, not a failed retry
+                if session is None or session.failovers == failovers:
+                    reconnection_attempts += 1
                 if reconnection_attempts > retry_attempts:
                     print("Exceeded retry attempts. Exiting...")
                     break
+                # The async connection is separate from client, so it is rebuilt here whichever one failed
+                self.reconnect_async()
+                if session is not None:
+                    # A dropped connection has already been replaced by the session's standby
+                    time.sleep(SESSION_RETRY_BACKOFF * max(reconnection_attempts, 1))
+                    continue
 
                 print(f"Re-trying connection. Attempt {reconnection_attempts}/{retry_attempts}...")
                 time.sleep(10 * reconnection_attempts)
-                self.client, _ = login_to_xtb(userId, password)
+                self.client, _ = login_to_xtb(userId, password, self.client.journal)
+                if not self.client:
+                    print("Failed to re-login. Exiting...")
+                    break
+
+    def run_streaming(self, ssid):
+        """
+        Event-driven variant of run(): 1m and 5m candles are built from the tick stream and the
+        strategy runs as soon as a 1m bar closes, with positions from a streaming PositionBook. REST
+        is only used to seed the history and positions, and to catch up after the stream was down.
+        """
+        reconnection_attempts = 0
+        retry_attempts = 3
+        bar_events = queue.Queue()
+        pipeline = BarPipeline(self.symbol, periods=(1, 5), on_bar_close=lambda period, bar: bar_events.put(period))
+        pipeline.backfill(self.client)
+        pipeline.start()
+        # Positions come from the trade/profit streams; getTrades is only sent to resync after a (re)connect
+        book = PositionBook(self.symbol)
+        stream_client = None
+        # With a SessionManager the session owns the stream and reopens it itself
+        session = self.client if isinstance(self.client, SessionManager) else None
+        stream_generation = 0
+
+        while True:
+            failovers = session.failovers if session is not None else 0
+            try:
+                if session is not None:
+                    if session.stream is None:
+                        session.start_stream(tickFun=pipeline.on_tick, tradeFun=book.on_trade, profitFun=book.on_profit)
+                        session.subscribe('subscribePrice', self.symbol)
+                        session.subscribe('subscribeTrades')
+                        session.subscribe('subscribeProfits')
+                    if session.stream_generation != stream_generation:
+                        if stream_generation:
+                            print("Stream reopened by the session, backfilling missed bars.")
+                            pipeline.backfill(self.client)
+                        stream_generation = session.stream_generation
+                        book.resync(self.client)
+                elif stream_client is None or not stream_client._t.is_alive():
+                    if stream_client is not None:
+                        print("Stream connection lost, reconnecting and backfilling missed bars.")
+                        stream_client.close()
+                        pipeline.backfill(self.client)
+                    stream_client = APIStreamClient(ssId=ssid, tickFun=pipeline.on_tick,
+                                                    tradeFun=book.on_trade, profitFun=book.on_profit,
+                                                    journal=self.client.journal)
+                    stream_client.subscribePrice(self.symbol)
+                    stream_client.subscribeTrades()
+                    stream_client.subscribeProfits()
+                    book.resync(self.client)
+
+                try:
+                    period = bar_events.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if period != 1:
+                    continue
+                # If we fell behind, only the newest bar matters
+                while not bar_events.empty():
+                    bar_events.get_nowait()
+
+                self.last_trade_action = 'None'
+                # The same windows as the polling cycle, so both modes compute the same signals
+                bars_1m = pipeline.history(1, INDICATOR_WINDOW)
+                bars_5m = pipeline.history(5, INDICATOR_WINDOW)
+                if len(bars_1m['close']) == 0 or not self.prepare_indicators(*indicator_windows(bars_1m, bars_5m)):
+                    continue
+                self.latest_close = float(bars_1m['close'][-1])
+                self.refresh_positions(print_positions=True, positions=book.positions())
+
+                self.evaluate_and_trade(datetime.now())
+                reconnection_attempts = 0
+
+            except Exception as e:
+                print(f"An unexpected error occurred: {str(e)}")
+                traceback.print_exc()
+                if session is None or session.failovers == failovers:
+                    reconnection_attempts += 1
+                if reconnection_attempts > retry_attempts:
+                    print("Exceeded retry attempts. Exiting...")
+                    pipeline.stop()
+                    break
+                if session is not None:
+                    time.sleep(SESSION_RETRY_BACKOFF * max(reconnection_attempts, 1))
+                    continue
+
+                print(f"Re-trying connection. Attempt {reconnection_attempts}/{retry_attempts}...")
+                self.client, ssid = login_to_xtb(userId, password, self.client.journal)
                 if not self.client:
                     print("Failed to re-login. Exiting...")
+                    pipeline.stop()
                     break
+                if stream_client is not None:
+                    stream_client.close()
+                stream_client = None
+                pipeline.backfill(self.client)
 
 
 if __name__ == "__main__":
     userId = os.environ.get("XTB_USERID")
     password = os.environ.get("XTB_PASSWORD")
-    client, ssid = login_to_xtb(userId, password)
+    # --journal records every xAPI message for offline replay (python journal.py <file>)
+    journal = Journal(os.path.join('journals', datetime.now().strftime('xapi-%Y%m%d-%H%M%S.jrn'))) \
+        if "--journal" in sys.argv else None
+    if "--metrics" in sys.argv:
+        # Prometheus scrape endpoint: http://localhost:9108/metrics
+        REGISTRY.serve(9108)
+    if "--session" in sys.argv:
+        # Keepalive pings, a logged-in standby connection and automatic stream resubscription
+        session = SessionManager(userId, password, journal)
+        client, ssid = (session, session.ssid) if session.start() else (None, None)
+    else:
+        client, ssid = login_to_xtb(userId, password, journal)
     if client and ssid:
-        bot = TradingBot(client, "US500", volume=0.01)
-        bot.run()
\ No newline at end of file
+        async_client, event_loop = None, None
+        if "--async" in sys.argv:
+            event_loop = asyncio.new_event_loop()
+            async_client, _ = event_loop.run_until_complete(login_to_xtb_async(userId, password, journal))
+        bot = TradingBot(client, "US500", volume=0.01, async_client=async_client, event_loop=event_loop)
+        if "--stream" in sys.argv:
+            bot.run_streaming(ssid)
+        else:
+            bot.run()
\ No newline at end of file
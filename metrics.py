@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency buckets; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        # Non-cumulative counts; render() accumulates them. No lock: a lost increment under a race
+        # is acceptable for monitoring and keeps an observation well under a microsecond.
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    """Prometheus histogram with optional labels: observe(value, *label_values)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self.labels(*values)
+        child.counts[bisect_left(child.bounds, value)] += 1
+        child.sum += value
+
+    def time(self, *values):
+        return _Timer(self.labels(*values))
+
+    def render(self):
+        lines = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, [('le', le)])} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Counter:
+    """Prometheus counter with optional labels: inc(*label_values, amount=1)."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *values, amount=1):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {value}"
+                for values, value in list(self._values.items())]
+
+
+class Gauge(Counter):
+    """Prometheus gauge: set(value, *label_values)."""
+
+    kind = 'gauge'
+
+    def set(self, value, *values):
+        self._values[values] = value
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        # Re-registering returns the existing metric, so modules can be reloaded
+        return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Write the metrics for node_exporter's textfile collector, replacing the file atomically."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port=9108, address=''):
+        """Serve the metrics at http://<address>:<port>/metrics from a daemon thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((address, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram('xapi_request_seconds', 'Round-trip time of xAPI requests, excluding rate-limit waits',
+                                     ('command',))
+REQUEST_THROTTLE_SECONDS = REGISTRY.histogram('xapi_request_throttle_seconds', 'Time xAPI requests waited for the rate limiter',
+                                              ('command',))
+REQUEST_ERRORS = REGISTRY.counter('xapi_request_errors_total', 'xAPI requests answered with status false or failed',
+                                  ('command', 'code'))
+CYCLE_PHASE_SECONDS = REGISTRY.histogram('bot_cycle_phase_seconds', 'Time spent in each phase of a trading cycle',
+                                         ('symbol', 'phase'))
+CYCLE_DRIFT_SECONDS = REGISTRY.gauge('bot_cycle_drift_seconds', 'Seconds between the minute boundary and the start of the last cycle',
+                                     ('symbol',))
+SESSION_FAILOVERS = REGISTRY.counter('xapi_session_failovers_total', 'Switches from a dead request connection to the standby',
+                                     ('reason',))
+SESSION_FAILOVER_SECONDS = REGISTRY.histogram('xapi_session_failover_seconds', 'Time to make the standby connection active')
+STREAM_RECONNECTS = REGISTRY.counter('xapi_stream_reconnects_total', 'Streaming connections reopened and resubscribed',
+                                     ('reason',))
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import queue
+import itertools
+import traceback
+from datetime import datetime
+
+from fetch_data import OPEN_TRADES_REQUEST, split_positions_by_symbol, seconds_until_next_minute
+from login import login_to_xtb
+from main import TradingBot
+from metrics import CYCLE_PHASE_SECONDS
+
+# Job priorities: lower runs first
+PRIORITY_POSITIONS = 0
+PRIORITY_ORDER_ACTION = 1
+PRIORITY_SYMBOL_CYCLE = 2
+
+
+class Orchestrator:
+    """
+    Runs one main.TradingBot per symbol in a single process over one logged-in APIClient.
+    Every request goes through one job queue drained by one thread, so the client's rate limiter
+    sees the whole load. A symbol's cycle only fetches its data and decides; each trade action it
+    decides is queued as a job of its own, ahead of the symbols still waiting for their data, so an
+    order is never held behind other symbols' chart requests.
+
+    Open trades are fetched once per cycle for all symbols, so a cycle costs 1 + len(symbols)
+    requests plus the trade actions (one 1m chart per symbol, 5m is derived from it). The chart
+    requests still grow linearly with the symbols: xAPI has no request for several symbols' charts.
+    """
+
+    def __init__(self, client, symbols, bot_kwargs=None):
+        self.client = client
+        self.symbols = list(symbols)
+        self.bots = {symbol: TradingBot(client, symbol, **(bot_kwargs or {})) for symbol in self.symbols}
+        self.jobs = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self.positions = {}
+
+    def submit(self, priority, name, fn, *args):
+        # The sequence number keeps FIFO order within a priority and avoids comparing callables
+        self.jobs.put((priority, next(self._seq), name, fn, args))
+
+    def drain(self):
+        while True:
+            try:
+                _, _, name, fn, args = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Job {name} failed: {str(e)}")
+                traceback.print_exc()
+                if isinstance(e, (OSError, RuntimeError)):
+                    raise
+
+    def _refresh_positions(self):
+        trades_response = self.client.execute(OPEN_TRADES_REQUEST)
+        self.positions = split_positions_by_symbol(trades_response, self.symbols)
+
+    def _symbol_cycle(self, symbol):
+        bot = self.bots[symbol]
+        bot.last_trade_action = 'None'
+        if not bot.fetch_and_prepare_data(positions=self.positions.get(symbol)):
+            print(f"{symbol}: data not ready, skipping this cycle.")
+            return
+        bot.evaluate_and_trade(datetime.now(), flush=False)
+        for action in bot.action_scheduler.take():
+            self.submit(PRIORITY_ORDER_ACTION, f"{symbol} {action['kind']}", self._send_action, bot, action)
+
+    def _send_action(self, bot, action):
+        with CYCLE_PHASE_SECONDS.time(bot.symbol, 'order_send'):
+            bot.action_scheduler.send(self.client, action)
+
+    def run_cycle(self):
+        self.submit(PRIORITY_POSITIONS, "positions", self._refresh_positions)
+        for symbol in self.symbols:
+            self.submit(PRIORITY_SYMBOL_CYCLE, f"{symbol} cycle", self._symbol_cycle, symbol)
+        self.drain()
+
+    def run(self, userId, password):
+        reconnection_attempts = 0
+        retry_attempts = 3
+
+        while True:
+            try:
+                self.run_cycle()
+                reconnection_attempts = 0
+
+                sleep_time = seconds_until_next_minute() + 1
+                print(f"Sleeping for {sleep_time} seconds.")
+                time.sleep(sleep_time)
+
+            except Exception as e:
+                print(f"An unexpected error occurred: {str(e)}")
+                reconnection_attempts += 1
+                if reconnection_attempts > retry_attempts:
+                    print("Exceeded retry attempts. Exiting...")
+                    break
+
+                print(f"Re-trying connection. Attempt {reconnection_attempts}/{retry_attempts}...")
+                time.sleep(10 * reconnection_attempts)
+                self.jobs = queue.PriorityQueue()
+                self.client, _ = login_to_xtb(userId, password, self.client.journal)
+                if not self.client:
+                    print("Failed to re-login. Exiting...")
+                    break
+                for bot in self.bots.values():
+                    bot.client = self.client
+
+
+if __name__ == "__main__":
+    userId = os.environ.get("XTB_USERID")
+    password = os.environ.get("XTB_PASSWORD")
+    symbols = sys.argv[1:] or ["US500"]
+    client, ssid = login_to_xtb(userId, password)
+    if client and ssid:
+        Orchestrator(client, symbols, bot_kwargs={'volume': 0.01}).run(userId, password)
@@ -0,0 +1,138 @@
+import threading
+
+from fetch_data import OPEN_TRADES_REQUEST
+
+# cmd values of open market positions (pending orders use 2-5)
+BUY = 0
+SELL = 1
+
+
+class PositionBook:
+    """
+    Open positions kept up to date from the streaming trade and profit channels.
+    Wire on_trade/on_profit to APIStreamClient's tradeFun/profitFun after subscribeTrades() and
+    subscribeProfits(); call resync() with a REST client at start-up and after every reconnect.
+    Records are keyed by position id, which stays the same for the whole life of a position, while
+    the order ids that modifyTrade and positions() use are looked up through an index kept in sync
+    with it. Counts, per-side profit totals and lookups by either id are O(1); positions() rebuilds
+    its snapshot only after the book changed.
+    """
+
+    def __init__(self, symbol=None):
+        self.symbol = symbol
+        self._trades = {}  # position id -> last trade record
+        self._orders = {}  # order id -> position id
+        self._positions = None  # positions() snapshot, None after a change
+        self._counts = {BUY: 0, SELL: 0}
+        self._profit = {BUY: 0.0, SELL: 0.0}
+        self._lock = threading.Lock()
+
+    def _add(self, trade):
+        old = self._trades.get(trade['position'])
+        if old is not None:
+            self._counts[old['cmd']] -= 1
+            self._profit[old['cmd']] -= old.get('profit') or 0.0
+            self._orders.pop(old['order'], None)
+        # Assigning to an existing key keeps its place, so the order matches getTrades
+        self._trades[trade['position']] = trade
+        self._orders[trade['order']] = trade['position']
+        self._counts[trade['cmd']] += 1
+        self._profit[trade['cmd']] += trade.get('profit') or 0.0
+        self._positions = None
+
+    def _remove(self, position):
+        trade = self._trades.pop(position, None)
+        if trade is not None:
+            self._orders.pop(trade['order'], None)
+            self._counts[trade['cmd']] -= 1
+            self._profit[trade['cmd']] -= trade.get('profit') or 0.0
+            self._positions = None
+
+    def _tracked(self, trade):
+        return trade.get('cmd') in (BUY, SELL) and (self.symbol is None or trade.get('symbol') == self.symbol)
+
+    def resync(self, client):
+        """Rebuild the book from a full getTrades request."""
+        trades = client.execute(OPEN_TRADES_REQUEST).get("returnData", [])
+        with self._lock:
+            self._trades = {}
+            self._orders = {}
+            self._positions = None
+            self._counts = {BUY: 0, SELL: 0}
+            self._profit = {BUY: 0.0, SELL: 0.0}
+            for trade in trades:
+                if self._tracked(trade):
+                    self._add(dict(trade))
+
+    def on_trade(self, msg):
+        trade = msg['data']
+        if not self._tracked(trade):
+            return
+        with self._lock:
+            if trade.get('closed') or trade.get('state') == 'Deleted':
+                self._remove(trade['position'])
+            else:
+                self._add(dict(trade))
+
+    def on_profit(self, msg):
+        data = msg['data']
+        with self._lock:
+            trade = self._trades.get(data['position'])
+            if trade is None:
+                return
+            self._profit[trade['cmd']] += data['profit'] - (trade.get('profit') or 0.0)
+            trade['profit'] = data['profit']
+            self._positions = None
+
+    def count(self, cmd):
+        return self._counts[cmd]
+
+    def total_profit(self, cmd):
+        return self._profit[cmd]
+
+    def get(self, position):
+        with self._lock:
+            trade = self._trades.get(position)
+            return dict(trade) if trade is not None else None
+
+    def get_by_order(self, order):
+        """The position opened by `order` (the 'order' of positions() entries), or None."""
+        with self._lock:
+            trade = self._trades.get(self._orders.get(order))
+            return dict(trade) if trade is not None else None
+
+    def open_trades(self):
+        """Raw trade records, in the same shape as getTrades returnData."""
+        with self._lock:
+            return [dict(trade) for trade in self._trades.values()]
+
+    def positions(self):
+        """
+        The same dict fetch_data.get_current_positions builds, without a request. The snapshot is
+        shared between calls until the book changes, so treat it as read-only.
+        """
+        with self._lock:
+            if self._positions is None:
+                self._positions = self._build_positions()
+            return self._positions
+
+    def _build_positions(self):
+        positions = {
+            'long': self._counts[BUY] > 0,
+            'short': self._counts[SELL] > 0,
+            'long_count': self._counts[BUY],
+            'short_count': self._counts[SELL],
+            'long_profits': [],
+            'short_profits': []
+        }
+        for trade in self._trades.values():
+            trade_info = {
+                'order': trade["order"],
+                'profit': trade["profit"],
+                'volume': trade["volume"],
+                'tp': trade["tp"],
+                'sl': trade["sl"],
+                'open_price': trade["open_price"]
+            }
+            positions['long_profits' if trade["cmd"] == BUY else 'short_profits'].append(trade_info)
+        return positions
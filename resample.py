@@ -0,0 +1,120 @@
+import numpy as np
+
+from bars import Bars, BAR_COLUMNS
+
+
+def resample_bars(bars, minutes):
+    """
+    Aggregate 1-minute bars (dict of arrays with the keys of fetch_data.get_historical_bars) into
+    `minutes` bars. Buckets are aligned to multiples of the period since the epoch, like xAPI charts;
+    the last bucket may be partial.
+    """
+    ctm = np.asarray(bars['ctm'], dtype=np.int64)
+    if len(ctm) == 0:
+        return {key: np.asarray(bars[key])[:0] for key in BAR_COLUMNS}
+    period_ms = minutes * 60 * 1000
+    bucket = ctm // period_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ctm)] - 1
+    return {
+        'ctm': bucket[starts] * period_ms,
+        'open': np.asarray(bars['open'], dtype=float)[starts],
+        'high': np.maximum.reduceat(np.asarray(bars['high'], dtype=float), starts),
+        'low': np.minimum.reduceat(np.asarray(bars['low'], dtype=float), starts),
+        'close': np.asarray(bars['close'], dtype=float)[ends],
+        'vol': np.add.reduceat(np.asarray(bars['vol'], dtype=float), starts),
+    }
+
+
+def align_start(bars, minutes):
+    """Drop leading 1-minute bars before the first `minutes` boundary, so the first bucket is complete."""
+    ctm = np.asarray(bars['ctm'], dtype=np.int64)
+    period_ms = minutes * 60 * 1000
+    if len(ctm) == 0 or ctm[0] % period_ms == 0:
+        return bars
+    first = np.searchsorted(ctm, ctm[0] - ctm[0] % period_ms + period_ms)
+    return {key: np.asarray(bars[key])[first:] for key in BAR_COLUMNS}
+
+
+def _rows(bars):
+    # dict of arrays -> list of bar dicts with plain Python values
+    return [dict(zip(BAR_COLUMNS, values)) for values in zip(*(np.asarray(bars[key]).tolist() for key in BAR_COLUMNS))]
+
+
+class Resampler:
+    """
+    Incremental version of resample_bars for one target period. Bars go to a bars.Bars ring buffer
+    whose last entry is the partial bar; it is rebuilt from its (at most `minutes`) 1-minute bars on
+    every update, so the still-forming 1-minute bar can be sent again with new values and simply
+    replaces itself. arrays() returns views of the buffer, so reading costs nothing per bar held.
+    """
+
+    def __init__(self, minutes, maxlen=1000):
+        self.minutes = minutes
+        self.period_ms = minutes * 60 * 1000
+        self.bars = Bars(maxlen)
+        self.partial = None
+        self._members = []
+
+    def update(self, bar):
+        """Add or replace one 1-minute bar (dict with BAR_COLUMNS). Returns the completed bar, if any."""
+        start = bar['ctm'] - bar['ctm'] % self.period_ms
+        completed = None
+        if self._members and bar['ctm'] == self._members[-1]['ctm']:
+            self._members[-1] = bar
+        elif self._members and bar['ctm'] < self._members[-1]['ctm']:
+            return None  # older than what we already have
+        else:
+            if self.partial is not None and start != self.partial['ctm']:
+                completed = self.partial
+                self._members = []
+            self._members.append(bar)
+        members = self._members
+        self.partial = {
+            'ctm': start,
+            'open': members[0]['open'],
+            'high': max(member['high'] for member in members),
+            'low': min(member['low'] for member in members),
+            'close': members[-1]['close'],
+            'vol': sum(member['vol'] for member in members),
+        }
+        # Replaces the previous partial bar while the bucket is the same, appends after a completed one
+        self.bars.update(self.partial)
+        return completed
+
+    def seed(self, bars):
+        """Bulk-load 1-minute bars (dict of arrays) with the vectorized path."""
+        resampled = resample_bars(bars, self.minutes)
+        self.bars = Bars(self.bars.capacity)
+        self.bars.extend(resampled)
+        self.partial = None
+        self._members = []
+        if len(resampled['ctm']) == 0:
+            return
+        self.partial = _rows({key: resampled[key][-1:] for key in BAR_COLUMNS})[0]
+        first = np.searchsorted(np.asarray(bars['ctm']), self.partial['ctm'])
+        self._members = _rows({key: np.asarray(bars[key])[first:] for key in BAR_COLUMNS})
+
+    def arrays(self, include_partial=True):
+        """Completed bars (plus the partial one) as a dict of array views, oldest first."""
+        arrays = self.bars.arrays()
+        if include_partial or self.partial is None:
+            return arrays
+        return {key: values[:-1] for key, values in arrays.items()}
+
+
+class MultiTimeframeResampler:
+    """Keeps one Resampler per target period (5m, 15m, 1h by default) fed from the same 1-minute bars."""
+
+    def __init__(self, periods=(5, 15, 60), maxlen=1000):
+        self.resamplers = {minutes: Resampler(minutes, maxlen) for minutes in periods}
+
+    def update(self, bar):
+        return {minutes: resampler.update(bar) for minutes, resampler in self.resamplers.items()}
+
+    def seed(self, bars):
+        for resampler in self.resamplers.values():
+            resampler.seed(bars)
+
+    def arrays(self, minutes, include_partial=True):
+        return self.resamplers[minutes].arrays(include_partial)
@@ -0,0 +1,274 @@
+import time
+import threading
+import traceback
+
+from xAPIConnector import APIStreamClient, baseCommand, DEFAULT_XAPI_ADDRESS, DEFUALT_XAPI_STREAMING_PORT
+from login import login_to_xtb
+from metrics import SESSION_FAILOVERS, SESSION_FAILOVER_SECONDS, STREAM_RECONNECTS
+
+# A lost reply leaves the outcome of these unknown, so they are never resent on the standby
+NON_RETRYABLE_COMMANDS = frozenset(['tradeTransaction'])
+
+# What a dead connection raises: OSError (including socket.timeout and the ConnectionError of a failed
+# connect) or "socket connection broken"
+CONNECTION_ERRORS = (OSError, RuntimeError)
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except OSError:
+        pass
+
+
+class SessionManager:
+    """
+    Keeps an xAPI session usable across dropped connections.
+
+    Besides the active APIClient, a second one is logged in ahead of time as a standby. A monitor
+    thread pings each of them once it has been idle for `ping_interval` seconds; when the active
+    connection fails a ping (no reply within `ping_timeout`) or a request sent through execute(),
+    the standby is swapped in, which takes no network round trip, and a new standby is logged in in
+    the background. The stream connection opened with start_stream() is pinged as well and watched
+    through keepAlive messages; when it closes or stays silent for `stream_timeout` seconds, or the
+    session it belongs to fails over, it is reopened and every subscribe() call is replayed.
+    stream_generation counts the stream connections, so callers can resync after a reopen.
+    A standby login that fails is retried after `login_backoff` seconds, doubling up to 30.
+
+    execute() has the APIClient signature and other attributes are read from the active client,
+    so a SessionManager can be passed wherever an APIClient is. A request that failed with its
+    connection is resent once on the new one, except tradeTransaction, whose error is raised.
+
+    Only the active connection writes to `journal`, and keepalive pings are left out of it, so the
+    journal holds the bot's requests in the order it sent them.
+    """
+
+    def __init__(self, userId, password, journal=None, ping_interval=1.0, ping_timeout=0.5, stream_timeout=10.0,
+                 standby=True, stream_port=DEFUALT_XAPI_STREAMING_PORT, login_backoff=1.0, **client_kwargs):
+        self.client = None
+        self.ssid = None
+        self.userId = userId
+        self.password = password
+        self.journal = journal
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.stream_timeout = stream_timeout
+        self.use_standby = standby
+        self.login_backoff = login_backoff
+        # address/port/encrypt for every APIClient; the stream connects to the same address
+        self.client_kwargs = client_kwargs
+        self.stream_port = stream_port
+        self.failovers = 0
+        self._standby = None  # (client, ssid)
+        self._refilling = False
+        self._lock = threading.RLock()
+
+        self.stream = None
+        self.stream_generation = 0
+        self.subscriptions = []  # (APIStreamClient method name, args)
+        self._stream_handlers = None
+        self._stream_lock = threading.RLock()
+
+        self._running = False
+        self._thread = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes the manager does not have itself, e.g. lastThrottle
+        return getattr(self.__dict__.get('client'), name)
+
+    def _login(self):
+        # Logged in without the journal: the connection is given it once it becomes the active one
+        try:
+            return login_to_xtb(self.userId, self.password, None, **self.client_kwargs)
+        except CONNECTION_ERRORS as e:
+            print(f"xAPI login failed: {e}")
+            return None, None
+
+    def _activate(self, client, ssid):
+        client.journal = self.journal
+        self.client, self.ssid = client, ssid
+
+    def start(self):
+        """Log in the active and standby connections and start the monitor; False if the login failed."""
+        client, ssid = self._login()
+        if client is None:
+            return False
+        self._activate(client, ssid)
+        self._running = True
+        if self.use_standby:
+            self._standby = self._login()
+            if self._standby[0] is None:
+                self._standby = None
+                self._refill_standby()
+        self._thread = threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+        return True
+
+    def disconnect(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        with self._stream_lock:
+            if self.stream is not None:
+                self.stream._running = False
+                _close_quietly(self.stream)
+            self._stream_handlers = None
+        with self._lock:
+            standby, self._standby = self._standby, None
+        for client, _ in [standby] if standby else []:
+            _close_quietly(client)
+        _close_quietly(self.client)
+
+    # Requests
+
+    def execute(self, dictionary, timeout=None):
+        client = self.client
+        try:
+            return client.execute(dictionary, timeout)
+        except CONNECTION_ERRORS:
+            if not self.failover(client, 'request') or dictionary.get('command') in NON_RETRYABLE_COMMANDS:
+                raise
+            return self.client.execute(dictionary, timeout)
+
+    def commandExecute(self, commandName, arguments=None):
+        return self.execute(baseCommand(commandName, arguments))
+
+    def failover(self, failed, reason):
+        """
+        Replace `failed` (the active client when it failed) with the standby. Returns False if no
+        connection could be made; True if it was replaced, here or already by another thread.
+        """
+        with self._lock:
+            if failed is not self.client:
+                return True
+            start = time.perf_counter()
+            standby, self._standby = self._standby, None
+            if standby is None:
+                # No standby ready: the slow path, a fresh login
+                standby = self._login()
+                if standby[0] is None:
+                    return False
+            self._activate(*standby)
+            self.failovers += 1
+            SESSION_FAILOVERS.inc(reason)
+            SESSION_FAILOVER_SECONDS.observe(time.perf_counter() - start)
+        print(f"xAPI connection lost ({reason}), switched to the standby connection.")
+        _close_quietly(failed)
+        # The stream session belongs to the login that was just dropped
+        if self._stream_handlers is not None:
+            self._reopen_stream('failover')
+        self._refill_standby()
+        return True
+
+    def _refill_standby(self):
+        if not self.use_standby:
+            return
+        with self._lock:
+            if self._refilling or self._standby is not None:
+                return
+            self._refilling = True
+        threading.Thread(target=self._login_standby, daemon=True).start()
+
+    def _login_standby(self):
+        delay = self.login_backoff
+        try:
+            while self._running:
+                client, ssid = self._login()
+                if client is not None:
+                    if not self._running:
+                        _close_quietly(client)
+                        return
+                    with self._lock:
+                        self._standby = (client, ssid)
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+        finally:
+            self._refilling = False
+
+    # Stream
+
+    def start_stream(self, **handlers):
+        """Open the stream connection with APIStreamClient handlers (tickFun=..., tradeFun=..., ...)."""
+        with self._stream_lock:
+            self._stream_handlers = handlers
+            self._open_stream()
+
+    def subscribe(self, name, *args):
+        """Call APIStreamClient.<name>(*args), e.g. subscribe('subscribePrice', 'US500'), now and after every reopen."""
+        with self._stream_lock:
+            self.subscriptions.append((name, args))
+            if self.stream is not None:
+                getattr(self.stream, name)(*args)
+
+    def _open_stream(self):
+        stream = APIStreamClient(self.client_kwargs.get('address', DEFAULT_XAPI_ADDRESS), self.stream_port,
+                                 self.client_kwargs.get('encrypt', True), ssId=self.ssid, journal=self.journal,
+                                 **self._stream_handlers)
+        stream.subscribeKeepAlive()
+        for name, args in self.subscriptions:
+            getattr(stream, name)(*args)
+        self.stream = stream
+        self.stream_generation += 1
+
+    def _reopen_stream(self, reason):
+        with self._stream_lock:
+            if self._stream_handlers is None:
+                return
+            if self.stream is not None:
+                self.stream._running = False
+                _close_quietly(self.stream)
+            STREAM_RECONNECTS.inc(reason)
+            try:
+                self._open_stream()
+            except CONNECTION_ERRORS as e:
+                # The closed stream stays in place, so the next monitor pass tries again
+                print(f"Failed to reopen the stream connection: {e}")
+
+    # Keepalive
+
+    def _ping(self, client):
+        """False if `client` did not answer a ping (skipped while it is busy or was active recently)."""
+        if time.monotonic() - client.lastReceived < self.ping_interval:
+            return True
+        try:
+            response = client.ping(self.ping_timeout)
+        except CONNECTION_ERRORS:
+            return False
+        return response is None or response.get('status', False)
+
+    def _monitor(self):
+        last_stream_ping = 0.0
+        while self._running:
+            # A quarter interval between checks, so an idle connection is pinged within 1.25 intervals
+            time.sleep(self.ping_interval / 4)
+            try:
+                client = self.client
+                if not self._ping(client):
+                    self.failover(client, 'ping')
+
+                standby = self._standby
+                if standby is not None and not self._ping(standby[0]):
+                    with self._lock:
+                        if self._standby is standby:
+                            self._standby = None
+                    _close_quietly(standby[0])
+                    self._refill_standby()
+
+                stream = self.stream
+                if self._stream_handlers is None or stream is None:
+                    continue
+                now = time.monotonic()
+                if not stream._t.is_alive():
+                    self._reopen_stream('closed')
+                elif now - stream.lastReceived > self.stream_timeout:
+                    self._reopen_stream('silent')
+                elif now - last_stream_ping >= self.ping_interval:
+                    last_stream_ping = now
+                    try:
+                        stream.ping()
+                    except CONNECTION_ERRORS:
+                        self._reopen_stream('ping')
+            except Exception:
+                # The monitor must outlive any single failure
+                traceback.print_exc()
@@ -0,0 +1,384 @@
+import sys
+import json
+import math
+import time
+import random
+import zlib
+import itertools
+import threading
+import socketserver
+
+from xAPIConnector import API_MESSAGE_TERMINATOR
+
+DIGITS = 2
+SPREAD = 0.5
+# Seconds between keepAlive messages on the streaming port, as on the real xAPI
+KEEP_ALIVE_INTERVAL = 3
+
+
+class MarketModel:
+    """
+    Deterministic synthetic prices: the same (symbol, time) always gives the same price, so chart
+    replies for overlapping ranges agree with each other and with the tick stream.
+    """
+
+    def __init__(self, base=5000.0, seed=0):
+        self.base = base
+        self.seed = seed
+
+    def price(self, symbol, ms):
+        t = ms / 60000.0
+        phase = (zlib.crc32(symbol.encode('utf-8')) ^ self.seed) % 1000
+        return round(self.base + 15 * math.sin((t + phase) / 45) + 4 * math.sin((t + phase) / 7)
+                     + 1.5 * math.sin(t * 1.7 + phase), DIGITS)
+
+    def bar(self, symbol, ctm, period_ms):
+        # Sample the price curve inside the bar; close of one bar is the open of the next
+        samples = [self.price(symbol, ctm + period_ms * k // 4) for k in range(5)]
+        return {'ctm': ctm, 'open': samples[0], 'high': max(samples), 'low': min(samples), 'close': samples[-1],
+                'vol': float(10 + (ctm // period_ms) % 90)}
+
+    def rate_infos(self, symbol, period, start, end):
+        period_ms = period * 60000
+        first = start - start % period_ms
+        if first < start:
+            first += period_ms
+        scale = 10 ** DIGITS
+        rate_infos = []
+        for ctm in range(first, end + 1, period_ms):
+            bar = self.bar(symbol, ctm, period_ms)
+            open_ = round(bar['open'] * scale)
+            rate_infos.append({'ctm': ctm, 'ctmString': '', 'open': open_,
+                               'close': round(bar['close'] * scale) - open_,
+                               'high': round(bar['high'] * scale) - open_,
+                               'low': round(bar['low'] * scale) - open_, 'vol': bar['vol']})
+        return rate_infos
+
+
+class SimulatedXAPIServer:
+    """
+    Local stand-in for the xAPI request and streaming ports, speaking the same JSON-over-TCP
+    protocol (requests are bare JSON, replies end with a blank line, customTag is echoed).
+
+    Request port: login, logout, ping, getChartLastRequest, getChartRangeRequest, getTrades,
+    tradeTransaction. Streaming port: getTickPrices, getTrades, getProfits, getKeepAlive, ping and
+    their stop* counterparts. Every request reply is delayed by `latency` +- `jitter` seconds; `error_rate`
+    of requests get an error reply and `disconnect_rate` of them drop the connection instead.
+    `chart_bars` fixes the number of bars in every chart reply, to control payload size.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, stream_port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 disconnect_rate=0.0, chart_bars=None, tick_interval=0.1, point_value=1.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.chart_bars = chart_bars
+        self.tick_interval = tick_interval
+        self.point_value = point_value
+        self.market = MarketModel(seed=seed)
+        self.random = random.Random(seed)
+        self.trades = {}  # position -> trade record, in the shape getTrades returns
+        self.lock = threading.Lock()
+        self.orders = itertools.count(1000)
+        self.sessions = set()
+        self.stream_clients = set()
+        self.stats = {}  # command -> number of requests
+        self._running = False
+        self._threads = []
+        self.server = self._listen(host, port, RequestHandler)
+        self.stream_server = self._listen(host, stream_port, StreamHandler)
+
+    def _listen(self, host, port, handler):
+        server = socketserver.ThreadingTCPServer((host, port), handler, bind_and_activate=False)
+        server.allow_reuse_address = True
+        server.daemon_threads = True
+        server.server_bind()
+        server.server_activate()
+        server.sim = self
+        return server
+
+    @property
+    def address(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def stream_port(self):
+        return self.stream_server.server_address[1]
+
+    def start(self):
+        self._running = True
+        for target in (self.server.serve_forever, self.stream_server.serve_forever, self._run_ticks):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._running = False
+        for server in (self.server, self.stream_server):
+            server.shutdown()
+            server.server_close()
+        for client in list(self.stream_clients):
+            client.close()
+
+    # Request port
+
+    def delay(self):
+        wait = self.latency + self.random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if wait > 0:
+            time.sleep(wait)
+
+    def handle(self, request, session):
+        """Reply dict for one request, or None to drop the connection."""
+        command = request.get('command')
+        self.stats[command] = self.stats.get(command, 0) + 1
+        self.delay()
+        if self.disconnect_rate and self.random.random() < self.disconnect_rate:
+            return None
+        if self.error_rate and self.random.random() < self.error_rate:
+            return error('SIM001', 'Simulated error')
+        arguments = request.get('arguments') or {}
+        if command == 'login':
+            session['ssid'] = f"sim-{next(self.orders)}"
+            self.sessions.add(session['ssid'])
+            return {'status': True, 'streamSessionId': session['ssid']}
+        if command == 'ping':
+            return {'status': True}
+        if 'ssid' not in session:
+            return error('BE103', 'User is not logged')
+        if command == 'logout':
+            self.sessions.discard(session.pop('ssid'))
+            return {'status': True}
+        if command in ('getChartLastRequest', 'getChartRangeRequest'):
+            return self.chart(command, arguments.get('info', {}))
+        if command == 'getTrades':
+            with self.lock:
+                return {'status': True, 'returnData': [dict(trade) for trade in self.trades.values()]}
+        if command == 'tradeTransaction':
+            return self.transaction(arguments.get('tradeTransInfo', {}))
+        return error('EX000', f'Invalid command {command}')
+
+    def chart(self, command, info):
+        now = int(time.time() * 1000)
+        period_ms = info.get('period', 1) * 60000
+        if self.chart_bars is not None:
+            start, end = now - self.chart_bars * period_ms, now
+        else:
+            start = info.get('start', now)
+            end = info.get('end', now) if command == 'getChartRangeRequest' else now
+            end = min(end, now)
+        rate_infos = self.market.rate_infos(info.get('symbol'), info.get('period', 1), start, end)
+        return {'status': True, 'returnData': {'digits': DIGITS, 'rateInfos': rate_infos}}
+
+    def quote(self, symbol):
+        bid = self.market.price(symbol, int(time.time() * 1000))
+        return bid, round(bid + SPREAD, DIGITS)
+
+    def transaction(self, info):
+        kind = info.get('type', 0)
+        with self.lock:
+            if kind == 0:
+                order = next(self.orders)
+                bid, ask = self.quote(info.get('symbol'))
+                cmd = info.get('cmd', 0)
+                trade = {'order': order, 'order2': order, 'position': order, 'symbol': info.get('symbol'),
+                         'cmd': cmd, 'volume': info.get('volume', 0.0), 'sl': info.get('sl', 0.0),
+                         'tp': info.get('tp', 0.0), 'open_price': ask if cmd == 0 else bid if cmd == 1 else info.get('price'),
+                         'close_price': bid if cmd == 0 else ask, 'profit': 0.0 if cmd in (0, 1) else None,
+                         'expiration': info.get('expiration') or None, 'closed': False,
+                         'open_time': int(time.time() * 1000), 'customComment': info.get('customComment', '')}
+                self.trades[order] = trade
+            else:
+                order = info.get('order')
+                trade = self.trades.get(order)
+                if trade is None:
+                    return error('BE9', f'Order {order} not found')
+                if kind == 2:
+                    trade['volume'] = round(trade['volume'] - info.get('volume', trade['volume']), 2)
+                    if trade['volume'] <= 0:
+                        trade['closed'] = True
+                        del self.trades[order]
+                elif kind == 3:
+                    trade['sl'] = info.get('sl', trade['sl'])
+                    trade['tp'] = info.get('tp', trade['tp'])
+                elif kind == 4:
+                    trade['closed'] = True
+                    del self.trades[order]
+            update = dict(trade)
+        self.broadcast('trades', {'command': 'trade', 'data': update})
+        return {'status': True, 'returnData': {'order': order}}
+
+    # Streaming port
+
+    def broadcast(self, channel, msg, symbol=None):
+        for client in list(self.stream_clients):
+            client.push(channel, msg, symbol)
+
+    def _run_ticks(self):
+        last_keep_alive = 0
+        while self._running:
+            now = int(time.time() * 1000)
+            if now - last_keep_alive >= KEEP_ALIVE_INTERVAL * 1000:
+                self.broadcast('keepAlive', {'command': 'keepAlive', 'data': {'timestamp': now}})
+                last_keep_alive = now
+            symbols = set()
+            for client in list(self.stream_clients):
+                symbols.update(client.symbols)
+            for symbol in symbols:
+                bid, ask = self.quote(symbol)
+                self.broadcast('ticks', {'command': 'tickPrices', 'data': {
+                    'symbol': symbol, 'bid': bid, 'ask': ask, 'high': ask, 'low': bid, 'level': 0,
+                    'timestamp': now, 'spreadRaw': SPREAD, 'quoteId': 1}}, symbol)
+            with self.lock:
+                updates = self._fill_pending(now)
+                for trade in self.trades.values():
+                    if trade['cmd'] not in (0, 1):
+                        continue
+                    bid, ask = self.quote(trade['symbol'])
+                    trade['close_price'] = bid if trade['cmd'] == 0 else ask
+                    sign = 1 if trade['cmd'] == 0 else -1
+                    trade['profit'] = round(sign * (trade['close_price'] - trade['open_price'])
+                                            * trade['volume'] * self.point_value, 2)
+                profits = [{'order': trade['order'], 'order2': trade['order2'], 'position': trade['position'],
+                            'profit': trade['profit']} for trade in self.trades.values() if trade['cmd'] in (0, 1)]
+            for update in updates:
+                self.broadcast('trades', {'command': 'trade', 'data': update})
+            for data in profits:
+                self.broadcast('profits', {'command': 'profit', 'data': data})
+            time.sleep(self.tick_interval)
+
+
+    def _fill_pending(self, now):
+        # Called with the lock held: fill limit/stop orders whose price was reached, drop expired ones
+        updates = []
+        for order, trade in list(self.trades.items()):
+            cmd = trade['cmd']
+            if cmd in (0, 1):
+                continue
+            if trade['expiration'] and now >= trade['expiration']:
+                trade['closed'] = True
+                del self.trades[order]
+                updates.append(dict(trade))
+                continue
+            bid, ask = self.quote(trade['symbol'])
+            price = trade['open_price']
+            if (cmd == 2 and ask <= price) or (cmd == 3 and bid >= price) or (cmd == 4 and ask >= price) \
+                    or (cmd == 5 and bid <= price):
+                trade['cmd'] = 0 if cmd in (2, 4) else 1
+                trade['profit'] = 0.0
+                updates.append(dict(trade))
+        return updates
+
+
+def error(code, description):
+    return {'status': False, 'errorCode': code, 'errorDescr': description}
+
+
+def read_requests(rfile):
+    """Yield JSON requests from a socket file; xAPI clients send them back to back without separators."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        chunk = rfile.read1(65536)
+        if not chunk:
+            return
+        buffer += chunk.decode('utf-8')
+        while True:
+            buffer = buffer.lstrip()
+            if not buffer:
+                break
+            try:
+                request, end = decoder.raw_decode(buffer)
+            except ValueError:
+                break
+            buffer = buffer[end:]
+            yield request
+
+
+def frame(msg):
+    return json.dumps(msg).encode('utf-8') + API_MESSAGE_TERMINATOR
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        sim = self.server.sim
+        session = {}
+        for request in read_requests(self.rfile):
+            reply = sim.handle(request, session)
+            if reply is None:
+                return
+            if 'customTag' in request:
+                reply['customTag'] = request['customTag']
+            self.wfile.write(frame(reply))
+
+
+class StreamHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super().setup()
+        self.channels = set()
+        self.symbols = set()
+        self.send_lock = threading.Lock()
+
+    def push(self, channel, msg, symbol=None):
+        if channel not in self.channels or (symbol is not None and symbol not in self.symbols):
+            return
+        try:
+            with self.send_lock:
+                self.wfile.write(frame(msg))
+        except OSError:
+            self.close()
+
+    def close(self):
+        self.server.sim.stream_clients.discard(self)
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def handle(self):
+        sim = self.server.sim
+        sim.stream_clients.add(self)
+        try:
+            for request in read_requests(self.rfile):
+                command = request.get('command')
+                if request.get('streamSessionId') not in sim.sessions:
+                    continue
+                if command == 'getTickPrices':
+                    self.symbols.add(request.get('symbol'))
+                    self.channels.add('ticks')
+                elif command == 'stopTickPrices':
+                    self.symbols.discard(request.get('symbol'))
+                elif command == 'getTrades':
+                    self.channels.add('trades')
+                elif command == 'stopTrades':
+                    self.channels.discard('trades')
+                elif command == 'getProfits':
+                    self.channels.add('profits')
+                elif command == 'stopProfits':
+                    self.channels.discard('profits')
+                elif command == 'getKeepAlive':
+                    self.channels.add('keepAlive')
+                elif command == 'stopKeepAlive':
+                    self.channels.discard('keepAlive')
+        except OSError:
+            pass
+        finally:
+            sim.stream_clients.discard(self)
+
+
+if __name__ == "__main__":
+    # python sim_server.py [port] [stream_port] [latency_seconds]
+    args = sys.argv[1:]
+    sim = SimulatedXAPIServer(port=int(args[0]) if len(args) > 0 else 5124,
+                              stream_port=int(args[1]) if len(args) > 1 else 5125,
+                              latency=float(args[2]) if len(args) > 2 else 0.0).start()
+    print(f"Simulated xAPI on {sim.address}:{sim.port} (stream {sim.stream_port})")
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,105 @@
+import os
+import sys
+import csv
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backtesting import TradingBot
+from bar_store import BarStore
+
+RESULT_COLUMNS = ['total_profit', 'num_trades', 'win_trades', 'loss_trades', 'win_rate', 'max_drawdown']
+
+# Bars of the sweep, loaded once per worker process by _init_worker
+_worker_bars = None
+_worker_symbol = None
+_worker_timestamps = None
+
+
+def parameter_grid(grid):
+    """{'atr_threshold': [0.5, 1], 'trailing_multiplier': [1.5, 2.0]} -> list of parameter dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def params_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def _init_worker(bars, symbol, timestamps=None):
+    global _worker_bars, _worker_symbol, _worker_timestamps
+    _worker_bars = bars
+    _worker_symbol = symbol
+    _worker_timestamps = timestamps
+    # The backtester prints every simulated order; thousands of runs would mostly measure the terminal
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _run_one(params):
+    bot = TradingBot(None, _worker_symbol, **params)
+    results = bot.run_backtest(*_worker_bars, timestamps=_worker_timestamps)
+    return params, results
+
+
+def load_finished(results_path):
+    if not os.path.isfile(results_path):
+        return set()
+    with open(results_path, newline='') as f:
+        return {row['params'] for row in csv.DictReader(f)}
+
+
+def run_sweep(bars, grid, symbol='US500', results_path='sweep_results.csv', processes=None, sort_by='total_profit',
+              timestamps=None):
+    """
+    Backtest every combination in `grid` on `bars` (close, open, high, low, volume arrays, with the
+    bar times in ms as `timestamps` for order expiry) over a process pool. Each finished run is
+    appended to results_path straight away, so an interrupted sweep resumes where it stopped when
+    called again with the same path. Returns all results ranked by sort_by.
+    """
+    combos = parameter_grid(grid)
+    finished = load_finished(results_path)
+    todo = [params for params in combos if params_key(params) not in finished]
+    print(f"Sweep: {len(combos)} combinations, {len(combos) - len(todo)} already done, {len(todo)} to run")
+
+    bars = tuple(np.ascontiguousarray(column, dtype=float) for column in bars)
+    fieldnames = ['params'] + list(grid) + RESULT_COLUMNS
+    write_header = not os.path.isfile(results_path)
+
+    with open(results_path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+        if todo:
+            with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), initializer=_init_worker,
+                                     initargs=(bars, symbol, timestamps)) as pool:
+                futures = [pool.submit(_run_one, params) for params in todo]
+                for count, future in enumerate(as_completed(futures), 1):
+                    params, results = future.result()
+                    writer.writerow({'params': params_key(params), **params, **results})
+                    f.flush()
+                    if count % 50 == 0 or count == len(todo):
+                        print(f"Sweep: {count}/{len(todo)} done")
+
+    table = pd.read_csv(results_path)
+    return table.sort_values(sort_by, ascending=False).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # Bars come from the local bar store, so the sweep runs offline once the range has been fetched
+    start_time = int(datetime(2024, 5, 17, 15, 30).timestamp() * 1000)
+    end_time = int(datetime(2024, 5, 17, 21, 17).timestamp() * 1000)
+    stored = BarStore().get_range(None, "US500", 1, start_time, end_time)
+    grid = {
+        'atr_threshold': [0.5, 1, 1.5],
+        'trailing_multiplier': [1.0, 1.5, 2.0, 2.5],
+        'histogram_delta': [0.005, 0.01, 0.02],
+        'tp_atr_multiple': [0.5, 1.0, 1.5],
+        'sl_atr_multiple': [1.0, 2.0, 3.0],
+    }
+    table = run_sweep((stored['close'], stored['open'], stored['high'], stored['low'], stored['vol']), grid,
+                      timestamps=np.asarray(stored['ctm']))
+    print(table.head(20).to_string())
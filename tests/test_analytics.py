@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import analytics
+from analytics import (DAY_MS, daily_pnl, drawdowns, equity_curve, exposure, max_drawdown, monte_carlo_drawdowns,
+                       sharpe_ratio)
+
+MONDAY = 19723  # 2024-01-01, in days since the epoch
+
+
+def test_drawdowns_from_the_running_peak():
+    profits = [10, -4, -3, 5, 8, -12]
+    # equity 10 6 3 8 16 4, peaks 10 10 10 10 16 16
+    np.testing.assert_array_equal(drawdowns(equity_curve(profits)), [0, 4, 7, 2, 0, 12])
+    assert max_drawdown(profits) == 12
+    # The starting equity is the first peak, so an opening loss is a drawdown
+    assert max_drawdown([-5, 2]) == 5
+    assert max_drawdown([]) == 0.0
+
+
+def test_exposure_merges_overlapping_trades():
+    open_ms = [20, 0, 5, 25]
+    close_ms = [30, 10, 15, 26]
+    # Merged: [0, 15] and [20, 30] of [0, 30]
+    assert exposure(open_ms, close_ms) == 25 / 30
+    assert exposure(open_ms, close_ms, 0, 40) == 25 / 40
+    # Clipped to the span: [10, 15] and [20, 30] of [10, 30]
+    assert exposure(open_ms, close_ms, 10, 30) == 15 / 20
+    assert exposure([], []) == 0.0
+
+
+def test_daily_pnl_leaves_out_weekends_without_trades():
+    def ms(day, hour):
+        return (MONDAY + day) * DAY_MS + hour * 3_600_000
+
+    # Friday, the next Monday (two trades) and Wednesday
+    close_ms = [ms(4, 15), ms(7, 14), ms(7, 20), ms(9, 16)]
+    np.testing.assert_array_equal(daily_pnl(close_ms, [3.0, -2.0, 1.0, 2.0]), [3.0, -1.0, 0.0, 2.0])
+    # A trade closed on the Saturday keeps its day
+    np.testing.assert_array_equal(daily_pnl([ms(4, 15), ms(5, 10), ms(7, 14)], [3.0, 4.0, -1.0]), [3.0, 4.0, -1.0])
+    assert len(daily_pnl([], [])) == 0
+    # mean 2, sample std sqrt(2)
+    assert sharpe_ratio([1.0, 3.0]) == pytest.approx(np.sqrt(2 * 252))
+
+
+@pytest.mark.parametrize('replace', [True, False])
+def test_monte_carlo_drawdowns_across_chunks(monkeypatch, replace):
+    # Two resamples per chunk, and a last chunk of one
+    monkeypatch.setattr(analytics, 'MONTE_CARLO_CHUNK_ELEMENTS', 7)
+    result = monte_carlo_drawdowns([2.0, -1.0, -1.0], resamples=1001, replace=replace, seed=0)
+    assert result.shape == (1001,)
+    if replace:
+        # Any draw of three from {2, -1, -1}: from 0 (2 2 2) to 3 (-1 -1 -1)
+        assert set(result.tolist()) <= {0.0, 1.0, 2.0, 3.0}
+    else:
+        # (-1, 2, -1) falls 1 from its peak of 1; the other two orders fall 2
+        assert set(result.tolist()) == {1.0, 2.0}
+        assert np.mean(result == 1.0) == pytest.approx(1 / 3, abs=0.05)
+    np.testing.assert_array_equal(monte_carlo_drawdowns([], resamples=5), np.zeros(5))
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from async_client import AsyncAPIClient
+from sim_server import SimulatedXAPIServer
+from xAPIConnector import TokenBucket
+
+
+@pytest.fixture
+def sim():
+    server = SimulatedXAPIServer().start()
+    yield server
+    server.stop()
+
+
+def test_failed_and_cancelled_requests_leave_no_pending_tag(sim):
+    async def run():
+        # One request a minute, so the second one is still waiting for the rate limiter when cancelled
+        client = await AsyncAPIClient(sim.address, sim.port, encrypt=False, rateLimiter=TokenBucket(rate=1 / 60)).connect()
+        try:
+            assert (await client.commandExecute('ping'))['status']
+            waiting = asyncio.ensure_future(client.commandExecute('ping'))
+            await asyncio.sleep(0.05)
+            assert len(client._pending) == 1
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert client._pending == {}
+
+            client.rateLimiter = TokenBucket()
+            client._writer.close()
+            # The write fails after the tag was registered
+            with pytest.raises(ConnectionError):
+                await client.commandExecute('ping')
+            assert client._pending == {}
+        finally:
+            await client.disconnect()
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+import numpy as np
+
+from bar_stream import BarPipeline
+from fetch_data import DeltaChartFetcher
+from main import INDICATOR_WINDOW, indicator_windows
+
+START_MS = 28_333_335 * 60_000  # a 5-minute boundary
+
+
+def tick(price, timestamp):
+    return {'data': {'symbol': 'US500', 'level': 0, 'bid': price, 'timestamp': timestamp}}
+
+
+def chart_reply(bars):
+    # getChartLastRequest reply with digits 0: close/high/low are offsets from open
+    rows = [dict(ctm=int(ctm), open=o, close=c - o, high=h - o, low=l - o, vol=v)
+            for ctm, o, h, l, c, v in zip(*(bars[name].tolist() for name in ('ctm', 'open', 'high', 'low', 'close', 'vol')))]
+    return dict(status=True, returnData=dict(digits=0, rateInfos=rows))
+
+
+def test_stream_and_polling_modes_see_the_same_indicator_inputs():
+    rng = np.random.default_rng(0)
+    pipeline = BarPipeline('US500', periods=(1, 5))
+    minutes = 400
+    # Whole-number prices, so the chart reply encodes them exactly
+    for ms in sorted(rng.integers(START_MS, START_MS + minutes * 60_000, 5000).tolist()):
+        pipeline.on_tick(tick(float(rng.integers(4900, 5100)), ms))
+    # The first tick of the next 5m bucket closes the last 1m and 5m bars: the moment both modes decide
+    pipeline.on_tick(tick(5000.0, START_MS + minutes * 60_000))
+
+    # Polling mode gets the same closed 1m bars from getChartLastRequest and resamples 5m itself
+    fetcher = DeltaChartFetcher(capacity=INDICATOR_WINDOW * 5 + 5, resample=(5,))
+    bars_1m = fetcher.apply('US500', 1, chart_reply(pipeline.history(1)))
+    polling = indicator_windows(bars_1m, fetcher.resampled('US500', 5))
+    streaming = indicator_windows(pipeline.history(1, INDICATOR_WINDOW), pipeline.history(5, INDICATOR_WINDOW))
+
+    assert len(streaming[0]) == len(streaming[3]) == INDICATOR_WINDOW
+    for polled, streamed in zip(polling, streaming):
+        np.testing.assert_array_equal(streamed, polled)
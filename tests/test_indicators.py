@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from indicators import (StreamingSMA, StreamingBollingerBands, StreamingATR, StreamingRSI, calculate_sma,
+                        calculate_bollinger_bands, calculate_atr, calculate_rsi_series)
+
+
+def price_series(n=20000, seed=0):
+    # Log random walk that drifts far from its first price, followed by a flat stretch
+    rng = np.random.default_rng(seed)
+    prices = 5000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    return np.concatenate([prices, np.full(100, prices[-1])]).tolist()
+
+
+@pytest.mark.parametrize('period', [2, 20, 200])
+def test_streaming_sma_matches_calculate_sma(period):
+    prices = price_series()
+    sma = StreamingSMA(period)
+    for i, price in enumerate(prices):
+        value = sma.update(price)
+        if i < period - 1:
+            assert value is None
+        else:
+            assert value == pytest.approx(calculate_sma(prices[:i + 1], period), rel=1e-13, abs=1e-9)
+
+
+@pytest.mark.parametrize('period', [2, 20, 200])
+def test_streaming_bollinger_bands_match_calculate_bollinger_bands(period):
+    prices = price_series()
+    bands = StreamingBollingerBands(period)
+    for i, price in enumerate(prices):
+        value = bands.update(price)
+        if i < period - 1:
+            assert value is None
+        else:
+            # A flat window's variance comes out as rounding noise (~1e-15) rather than exactly 0, and its
+            # square root moves the bands by ~1e-7
+            assert value == pytest.approx(calculate_bollinger_bands(prices[:i + 1], period), rel=1e-13, abs=1e-6)
+
+
+def bar_series(n=20000, seed=0):
+    # Highs and lows around price_series; the flat stretch has no range at all
+    prices = price_series(n, seed)
+    rng = np.random.default_rng(seed + 1)
+    spread = np.abs(rng.normal(0, 5, (2, len(prices))))
+    spread[:, n:] = 0.0
+    return (prices + spread[0]).tolist(), (prices - spread[1]).tolist(), prices
+
+
+@pytest.mark.parametrize('period', [2, 14, 100])
+def test_streaming_atr_matches_calculate_atr(period):
+    highs, lows, closes = bar_series()
+    # calculate_atr is causal, so each value of the full series is the one computed on the prefix
+    expected = calculate_atr(highs, lows, closes, period).to_numpy()
+    atr = StreamingATR(period)
+    for i, bar in enumerate(zip(highs, lows, closes)):
+        assert atr.update(*bar) == pytest.approx(expected[i], rel=1e-13, abs=1e-9)
+    assert atr.value == 0.0
+
+
+@pytest.mark.parametrize('window', [2, 14, 100])
+def test_streaming_rsi_matches_calculate_rsi(window):
+    prices = price_series()
+    expected = calculate_rsi_series(prices, window).to_numpy()
+    rsi = StreamingRSI(window)
+    for i, price in enumerate(prices):
+        # Windows without gains or losses are NaN in both
+        assert rsi.update(price) == pytest.approx(expected[i], rel=1e-13, abs=1e-9, nan_ok=True)
+    assert np.isnan(rsi.value)
+
+
+def test_seed_matches_update():
+    prices = price_series(500)
+    seeded, updated = StreamingBollingerBands(20), StreamingBollingerBands(20)
+    for price in prices:
+        updated.update(price)
+    assert seeded.seed(prices) == pytest.approx(updated.value, rel=1e-13)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from journal import (Journal, ReplayClient, AsyncReplayClient, replay, REQUEST, RESPONSE, ASYNC_REQUEST,
+                     ASYNC_RESPONSE)
+from login import login_to_xtb, login_to_xtb_async
+from main import TradingBot
+from sim_server import SimulatedXAPIServer
+
+CYCLES = 3
+
+
+@pytest.fixture
+def sim(monkeypatch, tmp_path):
+    # The bot writes its trading log under the working directory
+    monkeypatch.chdir(tmp_path)
+    server = SimulatedXAPIServer().start()
+    yield server
+    server.stop()
+
+
+def record_session(sim, path, use_async):
+    journal = Journal(str(path))
+    kwargs = dict(address=sim.address, port=sim.port, encrypt=False)
+    client, _ = login_to_xtb('user', 'password', journal, **kwargs)
+    event_loop = asyncio.new_event_loop() if use_async else None
+    async_client = None
+    if use_async:
+        async_client, _ = event_loop.run_until_complete(login_to_xtb_async('user', 'password', journal, **kwargs))
+    try:
+        bot = TradingBot(client, 'US500', async_client=async_client, event_loop=event_loop, indicator_cache=None)
+        for _ in range(CYCLES):
+            bot.last_trade_action = 'None'
+            assert bot.fetch_and_prepare_data()
+            bot.evaluate_and_trade(datetime.now())
+    finally:
+        if use_async:
+            event_loop.run_until_complete(async_client.disconnect())
+            event_loop.close()
+        client.close()
+        journal.close()
+    return bot
+
+
+def bot_state(bot):
+    return bot.latest_close, bot.atr_value, bot.supertrend_direction_1m, bot.supertrend_direction_5m
+
+
+@pytest.mark.parametrize('use_async', [False, True], ids=['sync', 'async'])
+def test_recorded_session_replays_to_the_same_state(sim, tmp_path, use_async):
+    path = tmp_path / 'session.jrn'
+    live = record_session(sim, path, use_async)
+    replayed = replay(str(path), 'US500', indicator_cache=None)
+    assert replayed is not None
+    if use_async:
+        assert isinstance(replayed.async_client, AsyncReplayClient)
+        assert replayed.async_client._cursor == len(replayed.async_client._requests)
+    assert bot_state(replayed) == bot_state(live)
+    live_bars, replayed_bars = live.chart_fetcher.arrays('US500', 1), replayed.chart_fetcher.arrays('US500', 1)
+    for name in live_bars:
+        np.testing.assert_array_equal(replayed_bars[name], live_bars[name])
+
+
+def write_journal(path, records):
+    journal = Journal(str(path))
+    for kind, msg in records:
+        journal.record(kind, json.dumps(msg).encode('utf-8'))
+    journal.close()
+
+
+def test_async_replies_are_paired_by_custom_tag(tmp_path):
+    path = tmp_path / 'async.jrn'
+    write_journal(path, [
+        (ASYNC_REQUEST, dict(command='getChartRangeRequest', customTag='1')),
+        (ASYNC_REQUEST, dict(command='getTrades', customTag='2')),
+        # Replies in the opposite order
+        (ASYNC_RESPONSE, dict(status=True, returnData='trades', customTag='2')),
+        (ASYNC_RESPONSE, dict(status=True, returnData='chart', customTag='1')),
+        # A new connection starts its tags again; this request lost its reply
+        (ASYNC_REQUEST, dict(command='getTrades', customTag='1')),
+    ])
+    client = AsyncReplayClient(ReplayClient(str(path)))
+
+    async def cycle():
+        return await asyncio.gather(client.commandExecute('getChartRangeRequest'), client.commandExecute('getTrades'))
+
+    chart, trades = asyncio.run(cycle())
+    assert chart['returnData'] == 'chart'
+    assert trades['returnData'] == 'trades'
+    with pytest.raises(ConnectionError):
+        asyncio.run(client.commandExecute('getTrades'))
+    with pytest.raises(EOFError):
+        asyncio.run(client.commandExecute('getTrades'))
+
+
+def test_sync_request_without_reply_raises_connection_error(tmp_path):
+    path = tmp_path / 'sync.jrn'
+    write_journal(path, [
+        (REQUEST, dict(command='getTrades')),
+        (REQUEST, dict(command='getChartRangeRequest')),
+        (RESPONSE, dict(status=True, returnData='chart')),
+    ])
+    client = ReplayClient(str(path))
+    with pytest.raises(ConnectionError):
+        client.commandExecute('getTrades')
+    assert client.commandExecute('getChartRangeRequest')['returnData'] == 'chart'
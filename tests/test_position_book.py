@@ -0,0 +1,62 @@
+import pytest
+
+from position_book import PositionBook, BUY, SELL
+
+
+def trade(position, order, cmd, profit, symbol='US500', **fields):
+    return dict(position=position, order=order, cmd=cmd, profit=profit, symbol=symbol, volume=0.01, tp=0.0, sl=0.0,
+                open_price=5000.0, **fields)
+
+
+class TradesClient:
+    def __init__(self, trades):
+        self.trades = trades
+
+    def execute(self, request):
+        return dict(status=True, returnData=[dict(trade) for trade in self.trades])
+
+
+def test_stream_updates_keep_counts_and_totals():
+    book = PositionBook('US500')
+    book.resync(TradesClient([trade(1, 11, BUY, 2.0), trade(2, 12, SELL, -1.0), trade(3, 13, BUY, 0.5, symbol='DE30'),
+                              trade(4, 14, 2, 0.0)]))
+    assert (book.count(BUY), book.count(SELL)) == (1, 1)
+
+    book.on_trade(dict(data=trade(5, 15, BUY, 0.0)))
+    book.on_profit(dict(data=dict(position=5, profit=3.0)))
+    book.on_profit(dict(data=dict(position=1, profit=1.0)))
+    assert book.count(BUY) == 2
+    assert book.total_profit(BUY) == pytest.approx(4.0)
+
+    # Closing position 2 streams a record with the closing order id but the same position id
+    book.on_trade(dict(data=trade(2, 22, SELL, -1.5, closed=True)))
+    assert book.count(SELL) == 0
+    assert book.total_profit(SELL) == 0.0
+    assert book.get_by_order(12) is None
+
+    positions = book.positions()
+    assert (positions['long'], positions['short'], positions['long_count'], positions['short_count']) == (True, False, 2, 0)
+    assert [(info['order'], info['profit']) for info in positions['long_profits']] == [(11, 1.0), (15, 3.0)]
+    assert positions['short_profits'] == []
+    assert book.positions() is positions
+    book.on_profit(dict(data=dict(position=1, profit=1.5)))
+    assert book.positions()['long_profits'][0]['profit'] == 1.5
+
+
+def test_order_index_follows_modifications_and_resync():
+    book = PositionBook()
+    book.on_trade(dict(data=trade(7, 70, SELL, 0.0)))
+    assert book.get_by_order(70)['position'] == 7
+    # A record of the same position with a new order id moves the index entry
+    book.on_trade(dict(data=trade(7, 71, SELL, 0.0)))
+    assert book.get_by_order(70) is None
+    assert book.get_by_order(71)['position'] == 7
+    assert book.count(SELL) == 1
+
+    # A resync drops whatever the stream missed
+    book.resync(TradesClient([trade(8, 80, BUY, -2.0)]))
+    assert book.get_by_order(71) is None
+    assert book.get_by_order(80)['profit'] == -2.0
+    assert (book.count(BUY), book.count(SELL)) == (1, 0)
+    assert (book.total_profit(BUY), book.total_profit(SELL)) == (-2.0, 0.0)
+    assert book.positions()['long_count'] == 1
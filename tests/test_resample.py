@@ -0,0 +1,53 @@
+import numpy as np
+
+from fetch_data import DeltaChartFetcher
+from resample import Resampler, resample_bars, align_start
+
+
+def chart_reply(rng, ctm, forming=False):
+    # getChartLastRequest reply with digits 0: close/high/low are offsets from open
+    rows = []
+    for value in ctm:
+        close = int(rng.integers(-5, 6))
+        rows.append(dict(ctm=int(value), open=int(rng.integers(5000, 5100)), close=close,
+                         high=max(close, 0) + int(rng.integers(0, 4)), low=min(close, 0) - int(rng.integers(0, 4)),
+                         vol=float(rng.integers(0, 20))))
+    return dict(status=True, returnData=dict(digits=0, rateInfos=rows))
+
+
+def minutes(rng, n):
+    # 1m bar times with gaps (missing minutes and longer breaks)
+    return (28_333_333 + np.cumsum(rng.choice([1, 1, 1, 2, 7], n))) * 60_000
+
+
+def test_update_matches_resample_bars():
+    rng = np.random.default_rng(0)
+    ctm = minutes(rng, 500)
+    fetcher = DeltaChartFetcher(capacity=500)
+    bars = fetcher.apply('X', 1, chart_reply(rng, ctm))
+    resampler = Resampler(15)
+    resampler.seed({key: values[:100] for key, values in bars.items()})
+    for i in range(100, len(ctm)):
+        resampler.update({key: values[i].item() for key, values in bars.items()})
+    expected = resample_bars(bars, 15)
+    for key, values in resampler.arrays().items():
+        np.testing.assert_array_equal(values, expected[key])
+    for key, values in resampler.arrays(include_partial=False).items():
+        np.testing.assert_array_equal(values, expected[key][:-1])
+
+
+def test_delta_chart_fetcher_resamples_incrementally():
+    rng = np.random.default_rng(1)
+    ctm = minutes(rng, 3000)
+    fetcher = DeltaChartFetcher(capacity=305, resample=(5,))
+    fetcher.apply('X', 1, chart_reply(rng, ctm[:400]))
+    i = 400
+    while i < len(ctm):
+        # Each delta reply starts with the last bar held, which may have changed while it was forming
+        step = int(rng.integers(0, 4))
+        bars_1m = fetcher.apply('X', 1, chart_reply(rng, ctm[i - 1:i + step]))
+        i += step
+        expected = resample_bars(align_start(bars_1m, 5), 5)
+        resampled = fetcher.resampled('X', 5)
+        for key, values in resampled.items():
+            np.testing.assert_array_equal(values[-60:], expected[key][-60:])
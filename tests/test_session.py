@@ -0,0 +1,99 @@
+import json
+import time
+
+import pytest
+
+from journal import Journal, read_journal, REQUEST, RESPONSE
+from session import SessionManager
+from sim_server import SimulatedXAPIServer
+from xAPIConnector import APIClient
+
+
+@pytest.fixture
+def sim():
+    server = SimulatedXAPIServer().start()
+    yield server
+    if server._running:
+        server.stop()
+
+
+def wait_until(condition, timeout=10.0):
+    # Polls instead of sleeping for a fixed time, so slow machines wait longer and fast ones less
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def make_session(sim, **kwargs):
+    return SessionManager('user', 'password', address=sim.address, port=sim.port, encrypt=False,
+                          stream_port=sim.stream_port, **kwargs)
+
+
+def test_connect_to_stopped_server_raises_connection_error(sim):
+    sim.stop()
+    with pytest.raises(ConnectionError):
+        APIClient(sim.address, sim.port, encrypt=False)
+
+
+def test_start_returns_false_when_server_is_stopped(sim):
+    session = make_session(sim)
+    sim.stop()
+    assert session.start() is False
+    assert session.client is None
+
+
+def test_failover_without_standby_returns_false_when_server_is_stopped(sim):
+    session = make_session(sim, standby=False)
+    assert session.start()
+    try:
+        sim.stop()
+        client = session.client
+        assert session.failover(client, 'request') is False
+        assert session.client is client
+        assert session.failovers == 0
+    finally:
+        session.disconnect()
+
+
+def test_standby_login_keeps_retrying_while_server_is_stopped(sim):
+    session = make_session(sim, login_backoff=0.05)
+    assert session.start()
+    try:
+        sim.stop()
+        with session._lock:
+            standby, session._standby = session._standby, None
+        standby[0].close()
+        logins = []
+        login = session._login
+        session._login = lambda: logins.append(None) or login()
+        session._refill_standby()
+        # A second attempt means the first one failed and the backoff after it was waited out
+        assert wait_until(lambda: len(logins) >= 2)
+        assert session._refilling
+        assert session._standby is None
+    finally:
+        session.disconnect()
+
+
+def test_journal_holds_only_the_active_connections_requests(sim, tmp_path):
+    journal = Journal(str(tmp_path / 'session.jrn'))
+    session = make_session(sim, journal=journal, ping_interval=0.05)
+    assert session.start()
+    try:
+        assert wait_until(lambda: session._standby is not None)
+        for _ in range(3):
+            session.commandExecute('getTrades', dict(openedOnly=True))
+            # The monitor pings both connections before the next request
+            replied = session.client.lastReceived
+            assert wait_until(lambda: min(session.client.lastReceived, session._standby[0].lastReceived) > replied)
+        session.failover(session.client, 'request')
+        session.commandExecute('getTrades', dict(openedOnly=True))
+    finally:
+        session.disconnect()
+        journal.close()
+    records = [(kind, json.loads(payload)) for kind, _, payload in read_journal(journal.path)]
+    assert [kind for kind, _ in records] == [REQUEST, RESPONSE] * 4
+    assert all(msg['command'] == 'getTrades' for kind, msg in records if kind == REQUEST)
@@ -76,7 +76,7 @@ def open_trade(client, symbol, volume, price, latest_close, offset, tp_value=0.0
     }
 
 
-def modify_trade(client, order_id, offset, sl_value, tp_value, volume):
+def modify_trade(client, order_id, offset, sl_value, tp_value, volume, symbol="US500"):
     """
     Modify an existing trade's SL/TP values.
     """
@@ -92,7 +92,7 @@ def modify_trade(client, order_id, offset, sl_value, tp_value, volume):
         "price": 1.0,
         "sl": sl_value,
         "tp": tp_value,
-        "symbol": "US500",
+        "symbol": symbol,
         "type": 3,  # This stays as 3 for modifications
         "volume": volume
     }
@@ -110,10 +110,11 @@ def modify_trade(client, order_id, offset, sl_value, tp_value, volume):
     response = client.execute(request)
     return response
 
-def close_all_trades(client):
-    # Get all open trades
-    trades_response = client.execute({"command": "getTrades", "arguments": {"openedOnly": True}})
-    trades = trades_response.get("returnData", [])
+def close_all_trades(client, trades=None):
+    # Get all open trades, unless the caller already has them (e.g. from a PositionBook)
+    if trades is None:
+        trades_response = client.execute({"command": "getTrades", "arguments": {"openedOnly": True}})
+        trades = trades_response.get("returnData", [])
 
     if not trades:
         print("No trades to close.")
@@ -150,11 +151,12 @@ def close_all_trades(client):
             print(f"Failed to close trade with order ID {order}. Error: {response.get('errorCode')} - {response.get('errorDescr')}")
 
 
-def close_trade(client, position_type, volume_per_trade, min_profit=None, max_loss=None):
+def close_trade(client, position_type, volume_per_trade, min_profit=None, max_loss=None, trades=None):
     print(
         f"Attempting to close trade: Type {position_type}, Volume {volume_per_trade}, Min Profit {min_profit}, Max Loss {max_loss}")
-    trades_response = client.execute({"command": "getTrades", "arguments": {"openedOnly": True}})
-    trades = trades_response.get("returnData", [])
+    if trades is None:
+        trades_response = client.execute({"command": "getTrades", "arguments": {"openedOnly": True}})
+        trades = trades_response.get("returnData", [])
 
     if not trades:
         print("No trades to close.")
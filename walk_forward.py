@@ -0,0 +1,177 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtesting import TradingBot
+from bar_store import BarStore
+from bars import BAR_COLUMNS
+from sweep import parameter_grid, params_key
+
+# Bars attached from shared memory once per worker process by _init_worker
+_worker_blocks = None
+_worker_bars = None
+_worker_symbol = None
+
+
+class SharedBars:
+    """
+    Bar columns copied once into shared memory, one block per column. Workers attach to the blocks by
+    name (see attach_bars), so every process reads the same pages and adding workers adds no copies.
+    """
+
+    def __init__(self, bars):
+        self._blocks = []
+        self.spec = {}
+        for name in BAR_COLUMNS:
+            column = np.ascontiguousarray(bars[name], dtype=np.int64 if name == 'ctm' else np.float64)
+            block = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+            np.ndarray(column.shape, dtype=column.dtype, buffer=block.buf)[:] = column
+            self._blocks.append(block)
+            self.spec[name] = (block.name, column.dtype.str, len(column))
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def attach_bars(spec):
+    """Read-only views of the columns of a SharedBars, plus the blocks, which must stay referenced."""
+    blocks, bars = [], {}
+    for name, (block_name, dtype, length) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        view = np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        blocks.append(block)
+        bars[name] = view
+    return blocks, bars
+
+
+def walk_forward_windows(n, train_bars, test_bars, anchored=False):
+    """(train_start, test_start, test_end) bar indices; each test segment follows its training segment."""
+    windows = []
+    test_start = train_bars
+    while test_start + test_bars <= n:
+        windows.append((0 if anchored else test_start - train_bars, test_start, test_start + test_bars))
+        test_start += test_bars
+    return windows
+
+
+def _init_worker(spec, symbol):
+    global _worker_blocks, _worker_bars, _worker_symbol
+    _worker_blocks, _worker_bars = attach_bars(spec)
+    _worker_symbol = symbol
+    # The backtester prints every simulated order
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _run_segment(params, start, end, warmup):
+    """
+    Backtest bars [start, end) with `warmup` earlier bars fed to the indicators first. Only trades
+    whose order was placed inside the segment count (so they also filled inside it); trades still
+    open at the last bar are closed there at its close. Returns a summary and the trades' close
+    times and profits.
+    """
+    bars = _worker_bars
+    first = max(start - warmup, 0)
+    bot = TradingBot(None, _worker_symbol, **params)
+    # Slices of the shared views: the backtest reads the shared pages directly
+    bot.run_backtest(bars['close'][first:end], bars['open'][first:end], bars['high'][first:end],
+                     bars['low'][first:end], bars['vol'][first:end], timestamps=bars['ctm'][first:end])
+    bot.clock.set_ms(bars['ctm'][end - 1])
+    bot.mark_to_market(float(bars['close'][end - 1]))
+    # Orders placed during the warmup were decided on indicators that had not warmed up yet
+    trades = [trade for trade in bot.trade_history if trade['placed_bar'] >= start - first]
+    close_ms = np.array([trade['close_ms'] for trade in trades], dtype=np.int64)
+    profits = np.array([trade['profit'] for trade in trades], dtype=float)
+    summary = {
+        'total_profit': float(profits.sum()),
+        'num_trades': len(trades),
+        'win_rate': float((profits > 0).mean()) if len(trades) else 0.0,
+    }
+    return summary, close_ms, profits
+
+
+def walk_forward(bars, grid, train_bars, test_bars, symbol='US500', processes=None, metric='total_profit',
+                 warmup=100, anchored=False):
+    """
+    Walk-forward analysis over `bars` (dict of arrays with BAR_COLUMNS keys, e.g. BarStore.get_range).
+    For every window the grid is backtested on the training segment, the best combination by
+    `metric` is backtested on the following test segment, and the out-of-sample trades of all test
+    segments are stitched into one equity curve. Train runs of all windows go to the pool together,
+    then all test runs. Returns (per-window DataFrame, dict with the stitched 'ctm' and 'equity').
+    """
+    n = len(bars['close'])
+    windows = walk_forward_windows(n, train_bars, test_bars, anchored)
+    combos = parameter_grid(grid)
+    print(f"Walk-forward: {len(windows)} windows x {len(combos)} combinations on {n} bars")
+    if not windows:
+        return pd.DataFrame(), {'ctm': np.array([], dtype=np.int64), 'equity': np.array([])}
+
+    ctm = np.asarray(bars['ctm'], dtype=np.int64)
+    with SharedBars(bars) as shared, ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                                         initializer=_init_worker, initargs=(shared.spec, symbol)) as pool:
+        train = {(k, i): pool.submit(_run_segment, params, train_start, test_start, warmup)
+                 for k, (train_start, test_start, _) in enumerate(windows) for i, params in enumerate(combos)}
+        best = []
+        for k in range(len(windows)):
+            # Ties go to the earlier combination, so the choice does not depend on completion order
+            scores = [train[k, i].result()[0][metric] for i in range(len(combos))]
+            i = int(np.argmax(scores))
+            best.append((combos[i], train[k, i].result()[0]))
+        test = [pool.submit(_run_segment, params, test_start, test_end, warmup)
+                for (params, _), (_, test_start, test_end) in zip(best, windows)]
+        test = [future.result() for future in test]
+
+    rows = []
+    for k, ((train_start, test_start, test_end), (params, train_summary), (test_summary, _, _)) in \
+            enumerate(zip(windows, best, test)):
+        rows.append({
+            'window': k,
+            'train_start': datetime.fromtimestamp(ctm[train_start] / 1000),
+            'test_start': datetime.fromtimestamp(ctm[test_start] / 1000),
+            'test_end': datetime.fromtimestamp(ctm[test_end - 1] / 1000),
+            'params': params_key(params),
+            f'train_{metric}': train_summary[metric],
+            'test_total_profit': test_summary['total_profit'],
+            'test_num_trades': test_summary['num_trades'],
+            'test_win_rate': test_summary['win_rate'],
+        })
+
+    # Test segments do not overlap, so concatenating them in window order keeps close times sorted
+    close_ms = np.concatenate([close for _, close, _ in test])
+    profits = np.concatenate([profit for _, _, profit in test])
+    order = np.argsort(close_ms, kind='stable')
+    equity = {'ctm': close_ms[order], 'equity': np.cumsum(profits[order])}
+    table = pd.DataFrame(rows)
+    print(f"Walk-forward out-of-sample profit: {equity['equity'][-1] if len(profits) else 0.0:.2f} "
+          f"over {len(profits)} trades")
+    return table, equity
+
+
+if __name__ == "__main__":
+    # Bars come from the local bar store, so the analysis runs offline once the range has been fetched
+    start_time = int(datetime(2024, 3, 1).timestamp() * 1000)
+    end_time = int(datetime(2024, 6, 1).timestamp() * 1000)
+    stored = BarStore().get_range(None, "US500", 1, start_time, end_time)
+    grid = {
+        'atr_threshold': [0.5, 1, 1.5],
+        'trailing_multiplier': [1.5, 2.0, 2.5],
+        'tp_atr_multiple': [0.5, 1.0, 1.5],
+    }
+    # Train on two weeks of 1m bars, test on the next week
+    table, equity = walk_forward(stored, grid, train_bars=14 * 1380, test_bars=7 * 1380)
+    print(table.to_string())
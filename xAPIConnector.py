@@ -4,7 +4,11 @@ import socket
 import logging
 import time
 import ssl
-from threading import Thread
+from collections import deque
+from threading import Thread, Lock
+
+from journal import REQUEST, RESPONSE, STREAM_SENT, STREAM_MESSAGE
+from metrics import REQUEST_SECONDS, REQUEST_THROTTLE_SECONDS, REQUEST_ERRORS
 
 # set to true on debug environment only
 DEBUG = False
@@ -18,12 +22,16 @@ DEFUALT_XAPI_STREAMING_PORT = 5125
 WRAPPER_NAME    = 'python'
 WRAPPER_VERSION = '2.5.0'
 
-# API inter-command timeout (in ms)
-API_SEND_TIMEOUT = 100
+# API request rate limit: xAPI allows one request per 200 ms on a connection
+API_RATE_LIMIT = 5   # requests per second
+API_RATE_BURST = 1   # requests that may be sent back to back
 
 # max connection tries
 API_MAX_CONN_TRIES = 3
 
+# every xAPI message (response or stream record) ends with this
+API_MESSAGE_TERMINATOR = b'\n\n'
+
 # logger properties
 logger = logging.getLogger("jsonSocket")
 FORMAT = '[%(asctime)-15s][%(funcName)s:%(lineno)d] %(message)s'
@@ -49,6 +57,37 @@ class TransactionType(object):
     ORDER_MODIFY = 3
     ORDER_DELETE = 4
 
+class TokenBucket(object):
+    """
+    Token bucket rate limiter: `rate` tokens per second, at most `burst` stored.
+    acquire() returns at once while a token is available, otherwise sleeps just long enough;
+    reserve() only computes that wait, for callers that sleep themselves (e.g. asyncio).
+    """
+    def __init__(self, rate=API_RATE_LIMIT, burst=API_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self):
+        """Take one token and return how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        """Take one token and return the number of seconds spent waiting for it."""
+        # Sleeping outside the lock; the token is already reserved, so concurrent callers queue up behind it
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
 class JsonSocket(object):
     def __init__(self, address, port, encrypt = False):
         self._ssl = encrypt 
@@ -61,8 +100,18 @@ class JsonSocket(object):
         self._timeout = None
         self._address = address
         self._port = port
-        self._decoder = json.JSONDecoder()
-        self._receivedData = ''
+        self._receivedData = bytearray()
+        self._recvBuffer = None
+        self._scanFrom = 0
+        self._frames = deque()
+        # time.monotonic() of the last bytes received, so idle connections can be told from busy ones
+        self.lastReceived = time.monotonic()
+        # optional journal.Journal, and the record kinds for what this socket sends and receives
+        self.journal = None
+        self._sentKind = REQUEST
+        self._receivedKind = RESPONSE
+        # False while the reply to an unjournaled request (a keepalive ping) is read
+        self._recordReplies = True
 
     def connect(self):
         for i in range(API_MAX_CONN_TRIES):
@@ -83,8 +132,10 @@ class JsonSocket(object):
             return True
         return False
 
-    def _sendObj(self, obj):
+    def _sendObj(self, obj, record=True):
         msg = json.dumps(obj)
+        if self.journal is not None and record:
+            self.journal.record_sent(self._sentKind, obj, msg.encode('utf-8'))
         self._waitingSend(msg)
 
     def _waitingSend(self, msg):
@@ -94,27 +145,42 @@ class JsonSocket(object):
             while sent < len(msg):
                 sent += self.conn.send(msg[sent:])
                 logger.info('Sent: ' + str(msg))
-                time.sleep(API_SEND_TIMEOUT/1000)
 
     def _read(self, bytesSize=4096):
         if not self.socket:
             raise RuntimeError("socket connection broken")
-        while True:
-            char = self.conn.recv(bytesSize).decode()
-            self._receivedData += char
-            try:
-                (resp, size) = self._decoder.raw_decode(self._receivedData)
-                if size == len(self._receivedData):
-                    self._receivedData = ''
-                    break
-                elif size < len(self._receivedData):
-                    self._receivedData = self._receivedData[size:].strip()
-                    break
-            except ValueError as e:
-                continue
+        # Bytes are only scanned once for the terminator and each frame is decoded once, so a reply
+        # of any size is read in linear time; frames that arrive together are queued for later calls
+        if self._recvBuffer is None or len(self._recvBuffer) != bytesSize:
+            self._recvBuffer = memoryview(bytearray(bytesSize))
+        while not self._frames:
+            size = self.conn.recv_into(self._recvBuffer)
+            if size == 0:
+                raise RuntimeError("socket connection broken")
+            self.lastReceived = time.monotonic()
+            self._receivedData += self._recvBuffer[:size]
+            self._splitFrames()
+        resp = self._frames.popleft()
         logger.info('Received: ' + str(resp))
         return resp
 
+    def _splitFrames(self):
+        start = 0
+        while True:
+            end = self._receivedData.find(API_MESSAGE_TERMINATOR, max(self._scanFrom, start))
+            if end < 0:
+                break
+            frame = bytes(self._receivedData[start:end]).strip()
+            if frame:
+                if self.journal is not None and self._recordReplies:
+                    self.journal.record(self._receivedKind, frame)
+                self._frames.append(json.loads(frame.decode('utf-8')))
+            start = end + len(API_MESSAGE_TERMINATOR)
+        if start:
+            del self._receivedData[:start]
+        # The terminator may straddle the next chunk, so rescan its first byte
+        self._scanFrom = max(len(self._receivedData) - len(API_MESSAGE_TERMINATOR) + 1, 0)
+
     def _readObj(self):
         msg = self._read()
         return msg
@@ -164,14 +230,57 @@ class JsonSocket(object):
     
     
 class APIClient(JsonSocket):
-    def __init__(self, address=DEFAULT_XAPI_ADDRESS, port=DEFAULT_XAPI_PORT, encrypt=True):
+    def __init__(self, address=DEFAULT_XAPI_ADDRESS, port=DEFAULT_XAPI_PORT, encrypt=True, rateLimiter=None, journal=None):
         super(APIClient, self).__init__(address, port, encrypt)
+        self.journal = journal
+        self.rateLimiter = rateLimiter if rateLimiter is not None else TokenBucket()
+        # seconds the last request waited for the rate limiter, and the running total
+        self.lastThrottle = 0.0
+        self.totalThrottle = 0.0
+        # One request/reply pair at a time, so a keepalive thread can share the connection
+        self._lock = Lock()
         if(not self.connect()):
-            raise Exception("Cannot connect to " + address + ":" + str(port) + " after " + str(API_MAX_CONN_TRIES) + " retries")
+            self.socket.close()
+            raise ConnectionError("Cannot connect to " + address + ":" + str(port) + " after " + str(API_MAX_CONN_TRIES) + " retries")
+
+    def execute(self, dictionary, timeout=None, record=True):
+        # timeout (seconds) applies to this request only; when it expires socket.timeout is raised and
+        # the connection should be dropped, since a late reply would be read by the next request.
+        # record=False keeps the request and its reply out of the journal.
+        command = dictionary.get('command')
+        self.lastThrottle = self.rateLimiter.acquire()
+        self.totalThrottle += self.lastThrottle
+        REQUEST_THROTTLE_SECONDS.observe(self.lastThrottle, command)
+        if self.lastThrottle > 0:
+            logger.info("Throttled %s for %.3f s" % (command, self.lastThrottle))
+        # Started after the rate limiter, so REQUEST_SECONDS measures the server rather than our own throttling
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                if timeout is not None:
+                    self.socket.settimeout(timeout)
+                self._recordReplies = record
+                try:
+                    self._sendObj(dictionary, record)
+                    resp = self._readObj()
+                finally:
+                    self._recordReplies = True
+                    if timeout is not None:
+                        self.socket.settimeout(self._timeout)
+        except Exception as e:
+            REQUEST_ERRORS.inc(command, type(e).__name__)
+            raise
+        REQUEST_SECONDS.observe(time.perf_counter() - start, command)
+        if not resp.get('status', True):
+            REQUEST_ERRORS.inc(command, resp.get('errorCode'))
+        return resp
 
-    def execute(self, dictionary):
-        self._sendObj(dictionary)
-        return self._readObj()    
+    def ping(self, timeout=None):
+        # Returns None without sending while another request is in flight; its reply shows the connection is alive.
+        # Keepalive pings are not journaled.
+        if self._lock.locked():
+            return None
+        return self.execute(baseCommand('ping'), timeout, record=False)
 
     def disconnect(self):
         self.close()
@@ -181,9 +290,12 @@ class APIClient(JsonSocket):
 
 class APIStreamClient(JsonSocket):
     def __init__(self, address=DEFAULT_XAPI_ADDRESS, port=DEFUALT_XAPI_STREAMING_PORT, encrypt=True, ssId=None, 
-                 tickFun=None, tradeFun=None, balanceFun=None, tradeStatusFun=None, profitFun=None, newsFun=None):
+                 tickFun=None, tradeFun=None, balanceFun=None, tradeStatusFun=None, profitFun=None, newsFun=None, keepAliveFun=None, journal=None):
         super(APIStreamClient, self).__init__(address, port, encrypt)
         self._ssId = ssId
+        self.journal = journal
+        self._sentKind = STREAM_SENT
+        self._receivedKind = STREAM_MESSAGE
 
         self._tickFun = tickFun
         self._tradeFun = tradeFun
@@ -191,9 +303,13 @@ class APIStreamClient(JsonSocket):
         self._tradeStatusFun = tradeStatusFun
         self._profitFun = profitFun
         self._newsFun = newsFun
+        self._keepAliveFun = keepAliveFun
+        # Subscriptions may be sent from another thread than the one reading the stream
+        self._sendLock = Lock()
         
         if(not self.connect()):
-            raise Exception("Cannot connect to streaming on " + address + ":" + str(port) + " after " + str(API_MAX_CONN_TRIES) + " retries")
+            self.socket.close()
+            raise ConnectionError("Cannot connect to streaming on " + address + ":" + str(port) + " after " + str(API_MAX_CONN_TRIES) + " retries")
 
         self._running = True
         self._t = Thread(target=self._readStream, args=())
@@ -202,7 +318,13 @@ class APIStreamClient(JsonSocket):
 
     def _readStream(self):
         while (self._running):
-                msg = self._readObj()
+                try:
+                    msg = self._readObj()
+                except (OSError, RuntimeError):
+                    # Closed on purpose (see disconnect); any other loss still ends the thread with the error
+                    if not self._running:
+                        return
+                    raise
                 logger.info("Stream received: " + str(msg))
                 if (msg["command"]=='tickPrices'):
                     self._tickFun(msg)
@@ -216,14 +338,21 @@ class APIStreamClient(JsonSocket):
                     self._profitFun(msg)
                 elif (msg["command"]=="news"):
                     self._newsFun(msg)
+                elif (msg["command"]=="keepAlive"):
+                    if self._keepAliveFun is not None:
+                        self._keepAliveFun(msg)
     
     def disconnect(self):
         self._running = False
         self._t.join()
         self.close()
 
-    def execute(self, dictionary):
-        self._sendObj(dictionary)
+    def execute(self, dictionary, record=True):
+        with self._sendLock:
+            self._sendObj(dictionary, record)
+
+    def ping(self):
+        self.execute(dict(command='ping', streamSessionId=self._ssId), record=False)
 
     def subscribePrice(self, symbol):
         self.execute(dict(command='getTickPrices', symbol=symbol, streamSessionId=self._ssId))
@@ -247,6 +376,9 @@ class APIStreamClient(JsonSocket):
     def subscribeNews(self):
         self.execute(dict(command='getNews', streamSessionId=self._ssId))
 
+    def subscribeKeepAlive(self):
+        self.execute(dict(command='getKeepAlive', streamSessionId=self._ssId))
+
 
     def unsubscribePrice(self, symbol):
         self.execute(dict(command='stopTickPrices', symbol=symbol, streamSessionId=self._ssId))
@@ -270,6 +402,9 @@ class APIStreamClient(JsonSocket):
     def unsubscribeNews(self):
         self.execute(dict(command='stopNews', streamSessionId=self._ssId))
 
+    def unsubscribeKeepAlive(self):
+        self.execute(dict(command='stopKeepAlive', streamSessionId=self._ssId))
+
 
 # Command templates
 def baseCommand(commandName, arguments=None):